@@ -4,42 +4,348 @@
 
 import sys
 import os
+import io
+import csv
 import json
 import re
-import secrets
+import math
+import time
+import queue
+import atexit
+import threading
+import traceback
+import itertools
 from datetime import datetime
 from functools import wraps
+from html.parser import HTMLParser
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+import click
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, g, has_request_context, current_app, abort, Response, stream_with_context
+from flask.cli import AppGroup
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate, stamp as stamp_migrations, upgrade as upgrade_migrations
+from sqlalchemy import event, table, column
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session as OrmSession, joinedload, selectinload, object_session
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
+from werkzeug.datastructures import MultiDict
+from werkzeug.local import LocalProxy
 from werkzeug.security import generate_password_hash, check_password_hash
-from markupsafe import Markup
+from markupsafe import escape
+
+from config import config_by_name
 
 # =============================================================================
 # تهيئة التطبيق
 # =============================================================================
-app = Flask(__name__, 
-            template_folder='templates',
-            static_folder='static')
-
-app.config['SECRET_KEY'] = secrets.token_hex(32)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///adaptive_learning.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['TEMPLATES_AUTO_RELOAD'] = True
-app.config['UPLOAD_FOLDER'] = 'static/uploads'
-app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB
-
-db = SQLAlchemy(app)
-login_manager = LoginManager(app)
+db = SQLAlchemy()
+migrate = Migrate()
+login_manager = LoginManager()
 login_manager.login_view = 'login'
 login_manager.login_message = '⚠️ يرجى تسجيل الدخول للوصول إلى هذه الصفحة'
 login_manager.login_message_category = 'warning'
 
+# المسارات وفلاتر القوالب وأوامر CLI تُجمع هنا عند تعريفها، وتضيفها
+# create_app إلى كل تطبيق تبنيه، فلا يرتبط أي منها بتطبيق واحد
+url_rules = []
+template_filters = {}
+cli = AppGroup('adaptive-learning')
+
+def route(rule, **options):
+    def decorator(view):
+        url_rules.append((rule, view, options))
+        return view
+    return decorator
+
+def template_filter(name):
+    def decorator(function):
+        template_filters[name] = function
+        return function
+    return decorator
+
+def app_service(name):
+    """خدمة التطبيق الحالي (تجزئة كلمات المرور، الكتابة المؤجلة، الذاكرات المؤقتة...)"""
+    return LocalProxy(lambda: current_app.extensions[name])
+
+def sqlite_pragma_listener(pragmas):
+    """مستمع لحدث connect يضبط إعدادات SQLite على كل اتصال جديد"""
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+    return apply_pragmas
+
+# تطبيع النص العربي للبحث: حذف التشكيل والتطويل وتوحيد أشكال الألف والياء
+# والتاء المربوطة والأرقام، مع بقاء كل حرف آخر في مكانه (للتظليل على النص الأصلي)
+ARABIC_MARKS = [*range(0x0610, 0x061B), *range(0x064B, 0x0660), 0x0640, 0x0670, *range(0x06D6, 0x06EE)]
+SEARCH_TRANSLATION = str.maketrans({
+    **{mark: None for mark in ARABIC_MARKS},
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+})
+SEARCH_TAG_RE = re.compile(r'<[^>]*>')
+
+# السوابق الملتصقة بالكلمة: "والكسور" و"للطالب" و"وقسمة" تُفهرس بجذعها أيضاً
+ARABIC_PREFIXES = ('وال', 'بال', 'كال', 'فال', 'لل', 'ال')
+SEARCH_WORD_RE = re.compile(r'\w+')
+
+def normalize_search_text(text):
+    """النص بعد التطبيع، بنفس طوله تقريباً (حالة الأحرف يتكفل بها FTS5)"""
+    if not text:
+        return ''
+    return SEARCH_TAG_RE.sub(' ', text).translate(SEARCH_TRANSLATION)
+
+def light_stem(word):
+    """حذف أداة التعريف وحروف العطف والجر الملتصقة بالكلمة"""
+    for prefix in ARABIC_PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) >= 2:
+            return word[len(prefix):]
+    if word.startswith('و') and len(word) > 3:
+        return word[1:]
+    return word
+
+def search_index_text(text):
+    """النص كما يُفهرس: كل كلمة ومعها جذعها إن اختلف عنها"""
+    def expand(match):
+        word = match.group()
+        stem = light_stem(word)
+        return word if stem == word else f'{word} {stem}'
+    return SEARCH_WORD_RE.sub(expand, normalize_search_text(text))
+
+def register_sqlite_functions(dbapi_connection, connection_record):
+    """دوال Python المتاحة داخل SQL، ليُبنى فهرس البحث بعبارات INSERT ... SELECT"""
+    dbapi_connection.create_function('search_normalize', 1, search_index_text, deterministic=True)
+
+# =============================================================================
+# قياس الأداء لكل طلب
+# =============================================================================
+
+class RequestMetrics:
+    """
+    مقاييس الطلبات لكل نقطة نهاية: مدرج زمن الاستجابة وعدد الطلبات حسب الحالة
+    وعدد استعلامات SQL وزمنها وعدد عمليات التثبيت
+    
+    المقاييس في ذاكرة العملية، فكل عملية عاملة تعرض مقاييسها الخاصة.
+    """
+    
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.latency = {}     # endpoint -> [عدادات الحاويات..., المجموع، العدد]
+        self.requests = {}    # (endpoint, status) -> العدد
+        self.sql = {}         # endpoint -> [الاستعلامات، الزمن، التثبيتات]
+    
+    def observe(self, endpoint, status, seconds, statements, sql_seconds, commits):
+        with self.lock:
+            histogram = self.latency.setdefault(endpoint, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+            
+            key = (endpoint, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            
+            totals = self.sql.setdefault(endpoint, [0, 0.0, 0])
+            totals[0] += statements
+            totals[1] += sql_seconds
+            totals[2] += commits
+    
+    def render(self):
+        """المقاييس بصيغة Prometheus النصية"""
+        with self.lock:
+            latency = {k: list(v) for k, v in self.latency.items()}
+            requests = dict(self.requests)
+            sql = {k: list(v) for k, v in self.sql.items()}
+        
+        lines = [
+            '# HELP app_request_duration_seconds Request latency by endpoint.',
+            '# TYPE app_request_duration_seconds histogram',
+        ]
+        for endpoint, histogram in sorted(latency.items()):
+            label = f'endpoint="{endpoint}"'
+            for bound, count in zip(self.buckets, histogram):
+                lines.append(f'app_request_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'app_request_duration_seconds_bucket{{{label},le="+Inf"}} {histogram[-1]}')
+            lines.append(f'app_request_duration_seconds_sum{{{label}}} {histogram[-2]:.6f}')
+            lines.append(f'app_request_duration_seconds_count{{{label}}} {histogram[-1]}')
+        
+        lines += [
+            '# HELP app_requests_total Requests by endpoint and status code.',
+            '# TYPE app_requests_total counter',
+        ]
+        for (endpoint, status), count in sorted(requests.items()):
+            lines.append(f'app_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+        
+        for index, name, help_text in (
+            (0, 'app_sql_statements_total', 'SQL statements executed by endpoint.'),
+            (1, 'app_sql_duration_seconds_total', 'Time spent in SQL statements by endpoint.'),
+            (2, 'app_sql_commits_total', 'Database commits by endpoint.'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for endpoint, totals in sorted(sql.items()):
+                value = f'{totals[index]:.6f}' if index == 1 else totals[index]
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {value}')
+        
+        return '\n'.join(lines) + '\n'
+
+class QueryBudgetExceeded(RuntimeError):
+    """تجاوز الطلب الحد الأقصى لعدد الاستعلامات المحدد لنقطة النهاية"""
+
+def load_query_budgets(path):
+    """قراءة ملف حدود الاستعلامات: {"endpoint": الحد الأقصى}"""
+    with open(path, encoding='utf-8') as f:
+        return {name: limit for name, limit in json.load(f).items() if not name.startswith('_')}
+
+def query_budget_exceeded(statement):
+    """يُستدعى عند الاستعلام الذي يتجاوز الحد، فيشير تتبع المكدس إلى مصدره"""
+    message = (f'{request.endpoint}: تجاوز حد الاستعلامات ({g.query_budget}) '
+               f'عند الاستعلام رقم {g.sql_count + 1}: {statement[:200]}')
+    if current_app.config.get('QUERY_BUDGET_MODE') == 'raise':
+        raise QueryBudgetExceeded(message)
+    current_app.logger.warning('%s\n%s', message, ''.join(traceback.format_stack(limit=30)))
+    g.query_budget = None  # تسجيل أول تجاوز فقط في كل طلب
+
+def before_sql(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_count' in g:
+        if g.query_budget is not None and g.sql_count >= g.query_budget:
+            query_budget_exceeded(statement)
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def after_sql(conn, cursor, statement, parameters, context, executemany):
+    if not (has_request_context() and 'sql_count' in g):
+        return
+    started = conn.info.get('query_started')
+    elapsed = time.perf_counter() - started.pop() if started else 0.0
+    g.sql_count += 1
+    g.sql_time += elapsed
+    if g.sql_statements is not None:
+        g.sql_statements.append((elapsed, statement))
+
+def on_commit(conn):
+    if has_request_context() and 'sql_count' in g:
+        g.sql_commits += 1
+
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.sql_count = 0
+    g.sql_time = 0.0
+    g.sql_commits = 0
+    # نص الاستعلامات يُحفظ فقط عند تفعيل سجل الطلبات البطيئة
+    g.sql_statements = [] if current_app.config.get('SLOW_REQUEST_MS') else None
+    g.query_budget = None
+    if current_app.config.get('QUERY_BUDGET_MODE', 'off') != 'off':
+        g.query_budget = current_app.config['QUERY_BUDGETS'].get(request.endpoint)
+
+def record_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+def finish_request_metrics(exc=None):
+    if 'request_started' not in g:
+        return
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.endpoint or 'unmatched'
+    status = g.get('response_status', 500)
+    
+    request_metrics.observe(endpoint, status, elapsed, g.sql_count, g.sql_time, g.sql_commits)
+    
+    threshold = current_app.config.get('SLOW_REQUEST_MS')
+    if threshold and elapsed * 1000 >= threshold:
+        statements = '\n'.join(f'  {ms * 1000:8.2f}ms  {sql}' for ms, sql in g.sql_statements)
+        current_app.logger.warning(
+            'طلب بطيء %s %s (%s): %.1fms، %d استعلام في %.1fms، %d تثبيت\n%s',
+            request.method, request.path, endpoint, elapsed * 1000,
+            g.sql_count, g.sql_time * 1000, g.sql_commits, statements)
+
+def create_app(config_name=None):
+    """
+    بناء التطبيق من فئة الإعدادات المناسبة للبيئة
+    
+    config_name: development | production | testing، وافتراضياً متغير البيئة
+    APP_ENV. التطبيق على مستوى الوحدة (app) مبني بهذه الدالة وهو نقطة الدخول
+    لخوادم WSGI، مثل: APP_ENV=production gunicorn -w 4 app:app
+    
+    كل تطبيق يحصل على مساراته وأوامره ونسخه الخاصة من الخدمات والذاكرات
+    المؤقتة، ويُتحقق من مخطط قاعدة بياناته عند بنائه.
+    """
+    config_name = config_name or os.environ.get('APP_ENV', 'development')
+    
+    app = Flask(__name__, 
+                template_folder='templates',
+                static_folder='static')
+    app.config.from_object(config_by_name[config_name])
+    
+    if not app.config.get('SECRET_KEY'):
+        raise RuntimeError('يجب ضبط متغير البيئة SECRET_KEY في بيئة الإنتاج')
+    
+    db.init_app(app)
+    migrate.init_app(app, db, render_as_batch=True,
+                     directory=os.path.join(os.path.dirname(__file__), 'migrations'))
+    login_manager.init_app(app)
+    
+    if app.config.get('QUERY_BUDGET_MODE', 'off') != 'off':
+        app.config['QUERY_BUDGETS'] = load_query_budgets(app.config['QUERY_BUDGET_FILE'])
+    instrumented = app.config.get('METRICS_ENABLED') or 'QUERY_BUDGETS' in app.config
+    
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', register_sqlite_functions)
+        if db.engine.dialect.name == 'sqlite' and app.config.get('SQLITE_PRAGMAS'):
+            event.listen(db.engine, 'connect',
+                         sqlite_pragma_listener(app.config['SQLITE_PRAGMAS']))
+        
+        if instrumented:
+            event.listen(db.engine, 'before_cursor_execute', before_sql)
+            event.listen(db.engine, 'after_cursor_execute', after_sql)
+            event.listen(db.engine, 'commit', on_commit)
+    
+    if instrumented:
+        app.before_request(start_request_metrics)
+        app.after_request(record_response_status)
+        app.teardown_request(finish_request_metrics)
+    
+    app.extensions.update({
+        'request_metrics': RequestMetrics(app.config['METRICS_LATENCY_BUCKETS']),
+        'password_hasher': PasswordHasher(app),
+        'result_writer': ResultWriter(app),
+        'answer_keys': LRUCache(app.config['ANSWER_KEY_CACHE_SIZE']),
+        'section_cache': LRUCache(app.config['SECTION_CACHE_SIZE']),
+        'section_versions': {},
+        'principal_cache': LRUCache(app.config['PRINCIPAL_CACHE_SIZE']),
+    })
+    
+    for rule, view, options in url_rules:
+        app.add_url_rule(rule, view_func=view, **options)
+    for name, function in template_filters.items():
+        app.add_template_filter(function, name)
+    for command in cli.commands.values():
+        app.cli.add_command(command)
+    
+    with app.app_context():
+        ensure_schema()
+    
+    return app
+
+request_metrics = app_service('request_metrics')
+
 # =============================================================================
 # نماذج قاعدة البيانات
 # =============================================================================
 
+# يُرفع عند كل تغيير في الجداول ليعاد تطبيق المخطط عند بدء التشغيل التالي
+SCHEMA_VERSION = 8
+
+# معرفات محتوى الفقرات لا يُعاد استخدامها بعد الحذف (AUTOINCREMENT في SQLite)،
+# فلا يصل مفتاح ذاكرة مؤقتة أو ETag قديم إلى صف جديد يحمل المعرف نفسه
+NO_ID_REUSE = {'sqlite_autoincrement': True}
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
     
@@ -55,10 +361,10 @@ class User(UserMixin, db.Model):
     created_lessons = db.relationship('Lesson', backref='teacher', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
     
     def is_teacher(self):
         return self.user_type == 'teacher'
@@ -69,6 +375,10 @@ class User(UserMixin, db.Model):
 
 class Lesson(db.Model):
     __tablename__ = 'lessons'
+    __table_args__ = (
+        db.Index('ix_lessons_published_order', 'is_published', 'order'),
+        db.Index('ix_lessons_teacher_order', 'teacher_id', 'order'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     title = db.Column(db.String(200), nullable=False)
@@ -86,12 +396,22 @@ class Lesson(db.Model):
 
 class Section(db.Model):
     __tablename__ = 'sections'
+    __table_args__ = (
+        # فقرات الدرس بترتيبها دون فرز مؤقت
+        db.Index('ix_sections_lesson_order', 'lesson_id', 'order'),
+        NO_ID_REUSE,
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
     lesson_id = db.Column(db.Integer, db.ForeignKey('lessons.id'), nullable=False, index=True)
     order = db.Column(db.Integer, default=0)
+    # نسختان محسوبتان عند الحفظ: HTML منقّى للعرض ونص عادي للمعاينة والبحث
+    content_html = db.Column(db.Text)
+    content_text = db.Column(db.Text)
+    # يزداد مع كل تعديل من المعلم على محتوى الفقرة
+    content_version = db.Column(db.Integer, nullable=False, default=1)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     diagnostics = db.relationship('Diagnostic', backref='section', lazy=True, 
@@ -100,10 +420,15 @@ class Section(db.Model):
                                 cascade='all, delete-orphan')
     exercises = db.relationship('Exercise', backref='section', lazy=True, 
                                 cascade='all, delete-orphan')
+    progress = db.relationship('StudentSectionProgress', backref='section', lazy=True, 
+                               cascade='all, delete-orphan')
+    stats = db.relationship('SectionStatsRollup', lazy=True, uselist=False,
+                            cascade='all, delete-orphan')
 
 
 class Diagnostic(db.Model):
     __tablename__ = 'diagnostics'
+    __table_args__ = NO_ID_REUSE
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     question = db.Column(db.Text, nullable=False)
@@ -113,6 +438,8 @@ class Diagnostic(db.Model):
     explanation = db.Column(db.Text)
     points = db.Column(db.Integer, default=10)
     section_id = db.Column(db.Integer, db.ForeignKey('sections.id'), nullable=False, index=True)
+    # صعوبة السؤال في نموذج Rasch (تُحسب بـ flask calibrate-mastery)
+    difficulty = db.Column(db.Float)
     
     def get_options_list(self):
         if not self.options:
@@ -136,6 +463,7 @@ class Diagnostic(db.Model):
 
 class Reminder(db.Model):
     __tablename__ = 'reminders'
+    __table_args__ = NO_ID_REUSE
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     reminder_type = db.Column(db.Integer, nullable=False)
@@ -149,6 +477,7 @@ class Reminder(db.Model):
 
 class Exercise(db.Model):
     __tablename__ = 'exercises'
+    __table_args__ = NO_ID_REUSE
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     title = db.Column(db.String(200))
@@ -166,21 +495,78 @@ class Result(db.Model):
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
-    exercise_id = db.Column(db.Integer, db.ForeignKey('exercises.id'), nullable=False, index=True)
+    exercise_id = db.Column(db.Integer, db.ForeignKey('exercises.id'), index=True)
     diagnostic_id = db.Column(db.Integer, db.ForeignKey('diagnostics.id'), index=True)
     is_correct = db.Column(db.Boolean, nullable=False)
     answer = db.Column(db.Text)
     score = db.Column(db.Integer, default=0)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+
+class StudentSectionProgress(db.Model):
+    """مجموع نتائج التشخيص لكل طالب في كل فقرة، يُحدَّث مع كل إجابة"""
+    __tablename__ = 'student_section_progress'
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'section_id', name='uq_progress_student_section'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    section_id = db.Column(db.Integer, db.ForeignKey('sections.id'), nullable=False, index=True)
+    earned_points = db.Column(db.Integer, nullable=False, default=0)
+    possible_points = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    level = db.Column(db.Integer)
+    # قدرة الطالب في الفقرة واحتمال إجابته على سؤال متوسط الصعوبة (نموذج Rasch)
+    ability = db.Column(db.Float)
+    mastery = db.Column(db.Float)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @property
+    def percentage(self):
+        if not self.possible_points:
+            return 0
+        return round(self.earned_points / self.possible_points * 100, 2)
+
+
+class SectionStatsRollup(db.Model):
+    """إحصائيات مجمعة لكل فقرة، تُحدَّث تدريجياً من النتائج الجديدة فقط"""
+    __tablename__ = 'section_stats_rollup'
+    
+    section_id = db.Column(db.Integer, db.ForeignKey('sections.id'), primary_key=True)
+    diagnostic_attempts = db.Column(db.Integer, nullable=False, default=0)
+    diagnostic_correct = db.Column(db.Integer, nullable=False, default=0)
+    exercise_attempts = db.Column(db.Integer, nullable=False, default=0)
+    exercise_correct = db.Column(db.Integer, nullable=False, default=0)
+    students = db.Column(db.Integer, nullable=False, default=0)
+    advanced_students = db.Column(db.Integer, nullable=False, default=0)
+    basic_students = db.Column(db.Integer, nullable=False, default=0)
+    average_percentage = db.Column(db.Float)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SchemaVersion(db.Model):
+    """إصدار مخطط قاعدة البيانات وحالة البيانات التجريبية (صف واحد)"""
+    __tablename__ = 'schema_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    seeded = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class StatsRollupState(db.Model):
+    """آخر نتيجة تمت معالجتها في الإحصائيات المجمعة (صف واحد)"""
+    __tablename__ = 'stats_rollup_state'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    last_result_id = db.Column(db.Integer, nullable=False, default=0)
+    refreshed_at = db.Column(db.DateTime)
+
 # =============================================================================
 # دوال المساعدة والتحقق
 # =============================================================================
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
 def teacher_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -237,45 +623,643 @@ def validate_diagnostic_form(data, question_type):
     
     return errors
 
-def calculate_percentage_score(diagnostics, answers):
-    """حساب النسبة المئوية للطالب"""
+def diagnostic_fields(form):
+    """
+    تحويل نموذج السؤال التشخيصي إلى قيم أعمدته
+    
+    يعيد (القيم، الأخطاء). يُستخدم لإضافة سؤال من صفحة الفقرة وللاستيراد الجماعي.
+    """
+    question_type = form.get('question_type', 'single_choice')
+    errors = validate_diagnostic_form(form, question_type)
+    if errors:
+        return None, errors
+    
+    fields = {
+        'question': form.get('question', '').strip(),
+        'question_type': question_type,
+        'explanation': form.get('explanation', '').strip(),
+        'points': form.get('points', 10, type=int),
+    }
+    
+    if question_type == 'single_choice':
+        # جمع الخيارات (حتى 6 خيارات)
+        options = [form.get(f'option{i}', '').strip() for i in range(1, 7)]
+        options = [option for option in options if option]
+        correct_answer = form.get('correct_answer_single', '').strip()
+    
+        if not correct_answer or correct_answer not in options:
+            return None, ['الإجابة الصحيحة غير صالحة']
+    
+        fields.update(options=json.dumps(options), correct_answer=correct_answer)
+    
+    elif question_type == 'multiple_choice':
+        # جمع الخيارات والإجابات الصحيحة
+        options = []
+        correct_answers = []
+        for i in range(1, 7):
+            option = form.get(f'option{i}', '').strip()
+            if option:
+                options.append(option)
+                if form.get(f'correct{i}', 'off') == 'on':
+                    correct_answers.append(option)
+    
+        if not correct_answers:
+            return None, ['يجب اختيار إجابة صحيحة واحدة على الأقل']
+    
+        fields.update(options=json.dumps(options), correct_answer=json.dumps(correct_answers))
+    
+    elif question_type == 'fill_blank':
+        fields.update(options=json.dumps([]),  # لا توجد خيارات
+                      correct_answer=form.get('correct_answer_fill', '').strip())
+    
+    else:
+        return None, ['نوع السؤال غير صالح']
+    
+    return fields, []
+
+def calculate_percentage_score(diagnostics, answers, verdicts=None):
+    """
+    حساب النسبة المئوية للطالب
+    
+    إذا مُرِّر القاموس verdicts يُملأ بنتيجة كل سؤال مُجاب: {diagnostic_id: is_correct}
+    """
     total_points = 0
     earned_points = 0
-    
+
     for diagnostic in diagnostics:
         total_points += diagnostic.points if diagnostic.points else 10
-        
+
         if str(diagnostic.id) in answers:
             user_answer = answers[str(diagnostic.id)]
-            
-            if diagnostic.question_type == 'single_choice':
-                if user_answer == diagnostic.correct_answer:
-                    earned_points += diagnostic.points if diagnostic.points else 10
-            elif diagnostic.question_type == 'multiple_choice':
-                try:
-                    correct_answers = json.loads(diagnostic.correct_answer)
-                    user_answers = user_answer if isinstance(user_answer, list) else [user_answer]
-                    
-                    if set(user_answers) == set(correct_answers):
-                        earned_points += diagnostic.points if diagnostic.points else 10
-                except:
-                    pass
-            elif diagnostic.question_type == 'fill_blank':
-                correct_answers = [a.strip() for a in diagnostic.correct_answer.split(',')]
-                if user_answer.strip() in correct_answers:
-                    earned_points += diagnostic.points if diagnostic.points else 10
-    
+            is_correct = get_diagnostic_key(diagnostic).matches(user_answer)
+
+            if is_correct:
+                earned_points += diagnostic.points if diagnostic.points else 10
+
+            if verdicts is not None:
+                verdicts[diagnostic.id] = is_correct
+
     if total_points == 0:
         return 0
-    
+
     percentage = (earned_points / total_points) * 100
     return round(percentage, 2)
 
+def level_for_percentage(percentage):
+    """تحديد مستوى الطالب: 1 متقدم، 2 أساسي"""
+    return 1 if percentage >= 80 else 2
+
+def level_for_progress(progress):
+    """
+    المستوى من الإتقان المعاير إن وُجد، وإلا من النسبة المئوية في الفقرة
+    
+    الإتقان يبدأ من آخر تشغيل لـ calibrate-mastery ثم يُحدَّث مع كل إجابة
+    جديدة (rasch_step في record_section_progress).
+    """
+    if progress.mastery is not None:
+        return 1 if progress.mastery >= current_app.config['MASTERY_THRESHOLD'] else 2
+    return level_for_percentage(progress.percentage)
+
+def mastery_of(ability):
+    """احتمال الإجابة على سؤال متوسط الصعوبة: sigmoid(القدرة)"""
+    return 1 / (1 + math.exp(-ability))
+
+def rasch_step(ability, responses, previous_attempts):
+    """
+    تحديث قدرة معايرة بخطوة نيوتن واحدة من إجابات جديدة (صحيحة؟، صعوبة السؤال)
+    
+    احتمال الإجابة الصحيحة p = sigmoid(القدرة - الصعوبة) كما في calibrate_mastery،
+    والسؤال الذي لم تُعايَر صعوبته بعد يُعامل كسؤال متوسط (صعوبة 0). معلومات
+    الإجابات السابقة التي تحملها القدرة تُقرَّب بعددها مضروباً في متوسط p(1-p)
+    للإجابات الجديدة، مع التوزيع المسبق، فتصغر الخطوة كلما كثرت الإجابات.
+    """
+    if not responses:
+        return ability
+    
+    gradient = information = 0.0
+    for is_correct, difficulty in responses:
+        p = 1 / (1 + math.exp((difficulty or 0.0) - ability))
+        gradient += is_correct - p
+        information += p * (1 - p)
+    
+    prior = 1 + previous_attempts * information / len(responses)
+    return ability + gradient / (prior + information)
+
+def record_section_progress(student_id, section_id, earned, possible, attempts=1, responses=()):
+    """
+    إضافة نتيجة إجابة (أو دفعة إجابات) إلى تقدم الطالب في الفقرة
+    
+    النسبة المئوية تراكمية: مجموع النقاط المكتسبة على مجموع النقاط الممكنة
+    في كل محاولات الطالب، لا في محاولته الأخيرة وحدها (الدفعة تعيد نسبة
+    المحاولة نفسها في attempt_percentage).
+    
+    الإنشاء والتحديث عبارة INSERT ... ON CONFLICT DO UPDATE واحدة تعيد الصف،
+    فلا تتسابق إجابتان أوليان على إنشاء الصف نفسه. لا يُثبَّت هنا: على
+    المستدعي تنفيذ commit مع إدراج النتائج نفسها.
+    
+    إذا كانت قدرة الطالب معايرة تُحدَّث بالإجابات responses (أزواج صحيحة؟
+    وصعوبة السؤال) ويُحسب الإتقان منها، فيتبع المستوى الإتقان لا النسبة. الصف
+    مقفل منذ التحديث حتى التثبيت، فلا تضيع خطوة إجابة متزامنة.
+    """
+    insert = postgresql.insert if db.session.get_bind().dialect.name == 'postgresql' else sqlite.insert
+    statement = insert(StudentSectionProgress).values(
+        student_id=student_id,
+        section_id=section_id,
+        earned_points=earned,
+        possible_points=possible,
+        attempts=attempts,
+        updated_at=datetime.utcnow()
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=['student_id', 'section_id'],
+        set_={
+            'earned_points': StudentSectionProgress.earned_points + statement.excluded.earned_points,
+            'possible_points': StudentSectionProgress.possible_points + statement.excluded.possible_points,
+            'attempts': StudentSectionProgress.attempts + statement.excluded.attempts,
+            'updated_at': statement.excluded.updated_at,
+        }
+    )
+    progress = db.session.scalars(
+        statement.returning(StudentSectionProgress),
+        execution_options={'populate_existing': True}
+    ).one()
+    if progress.ability is not None and responses:
+        progress.ability = rasch_step(progress.ability, responses, progress.attempts - attempts)
+        progress.mastery = mastery_of(progress.ability)
+    progress.level = level_for_progress(progress)
+    
+    return progress
+
+# =============================================================================
+# تجزئة كلمات المرور
+# =============================================================================
+
+class PasswordHasherBusy(RuntimeError):
+    """امتلأ طابور التجزئة أو انتهت مهلة الانتظار"""
+
+class PasswordHasher:
+    """
+    تجزئة كلمات المرور والتحقق منها في مجمع خيوط محدود
+    
+    pbkdf2 و scrypt في hashlib تحرر GIL، فيعمل PASSWORD_HASH_WORKERS خيطاً
+    بالتوازي دون أن تنشغل كل خيوط الخادم بالتجزئة عند موجة تسجيل دخول.
+    إذا تجاوز عدد العمليات المنتظرة PASSWORD_HASH_QUEUE_LIMIT يُرفض الطلب
+    فوراً بـ PasswordHasherBusy بدلاً من تراكم الانتظار.
+    """
+    
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.counts = {'hash': 0, 'verify': 0, 'rehash': 0, 'rejected': 0, 'timeout': 0}
+        self.seconds = {'wait': 0.0, 'work': 0.0}
+        self._method_prefix = None
+        
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 4)
+        self.queue_limit = app.config.get('PASSWORD_HASH_QUEUE_LIMIT', 64)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers,
+                                           thread_name_prefix='password-hasher')
+    
+    def _run(self, kind, function, *args):
+        with self.lock:
+            if self.in_flight >= self.workers + self.queue_limit:
+                self.counts['rejected'] += 1
+                raise PasswordHasherBusy(kind)
+            self.in_flight += 1
+        
+        submitted = time.perf_counter()
+        
+        def timed():
+            started = time.perf_counter()
+            result = function(*args)
+            return result, started - submitted, time.perf_counter() - started
+        
+        try:
+            future = self.executor.submit(timed)
+        except RuntimeError:
+            self._finished(None)
+            raise PasswordHasherBusy(kind)
+        # العملية تبقى محسوبة حتى تنتهي فعلاً، لا حتى تنتهي مهلة انتظارها
+        future.add_done_callback(self._finished)
+        
+        try:
+            result, wait, work = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # إن لم تبدأ بعد فلا داعي لتنفيذها
+            future.cancel()
+            with self.lock:
+                self.counts['timeout'] += 1
+            raise PasswordHasherBusy(kind)
+        
+        with self.lock:
+            self.counts[kind] += 1
+            self.seconds['wait'] += wait
+            self.seconds['work'] += work
+        return result
+    
+    def _finished(self, future):
+        with self.lock:
+            self.in_flight -= 1
+    
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, self.method)
+    
+    def verify(self, password_hash, password):
+        return self._run('verify', check_password_hash, password_hash, password)
+    
+    def needs_rehash(self, password_hash):
+        """هل التجزئة المخزنة بخوارزمية أو تكلفة غير المضبوطة حالياً؟"""
+        if self._method_prefix is None:
+            # صيغة Werkzeug: method$salt$hash، والطريقة بعد إكمال قيمها الافتراضية
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._method_prefix
+    
+    def record_rehash(self):
+        with self.lock:
+            self.counts['rehash'] += 1
+    
+    def render(self):
+        """المقاييس بصيغة Prometheus النصية"""
+        with self.lock:
+            counts = dict(self.counts)
+            seconds = dict(self.seconds)
+            in_flight = self.in_flight
+        
+        lines = [
+            '# HELP app_password_hash_operations_total Password hash operations by kind.',
+            '# TYPE app_password_hash_operations_total counter',
+        ]
+        for kind, count in counts.items():
+            lines.append(f'app_password_hash_operations_total{{kind="{kind}"}} {count}')
+        lines += [
+            '# HELP app_password_hash_seconds_total Time waiting for a worker and hashing.',
+            '# TYPE app_password_hash_seconds_total counter',
+        ]
+        for phase, value in seconds.items():
+            lines.append(f'app_password_hash_seconds_total{{phase="{phase}"}} {value:.6f}')
+        lines += [
+            '# HELP app_password_hash_in_flight Operations queued or running.',
+            '# TYPE app_password_hash_in_flight gauge',
+            f'app_password_hash_in_flight {in_flight}',
+            '# HELP app_password_hash_workers Size of the hashing pool.',
+            '# TYPE app_password_hash_workers gauge',
+            f'app_password_hash_workers {self.workers}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+password_hasher = app_service('password_hasher')
+
+# =============================================================================
+# الكتابة المؤجلة للنتائج
+# =============================================================================
+
+class ResultWriter:
+    """
+    كتابة مؤجلة لسجلات Result
+    
+    تُوضع النتائج في طابور محدود داخل العملية، ويقوم خيط خلفي بإدراجها
+    دفعة واحدة كل RESULT_FLUSH_INTERVAL_MS أو عند بلوغ RESULT_FLUSH_MAX_ROWS،
+    مع تحديث تقدم الطلاب في نفس المعاملة. إذا امتلأ الطابور يُرجع enqueue
+    القيمة False ويحفظ المستدعي النتيجة مباشرة.
+    
+    إذا تعذر الوصول إلى القاعدة تُكتب الدفعة في ملف احتياطي يُعاد تشغيله عند
+    بدء الخيط التالي، وإذا رفضت القاعدة الدفعة نفسها تُعاد صفاً صفاً ويُعزل
+    الصف المرفوض وحده في ملف العزل، فلا يُسقط صف تالف بقية الدفعة.
+    """
+    
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self._queue = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+        # يحمي التقدم المعلق؛ التثبيت نفسه يتم خارجه ويُعلَن عنه بـ _committing
+        # و _generation حتى يعيد progress_snapshot القراءة إذا تزامن معه
+        self._lock = threading.Lock()
+        self._settled = threading.Condition(self._lock)
+        self._committing = False
+        self._generation = 0
+        self._pending_progress = {}
+        
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('RESULT_WRITE_BEHIND', False)
+        self.interval = app.config.get('RESULT_FLUSH_INTERVAL_MS', 200) / 1000
+        self.max_rows = app.config.get('RESULT_FLUSH_MAX_ROWS', 500)
+        self.spool_path = app.config.get('RESULT_SPOOL_PATH') or \
+            os.path.join(app.instance_path, 'results_spool.jsonl')
+        self.quarantine_path = app.config.get('RESULT_QUARANTINE_PATH') or \
+            os.path.join(app.instance_path, 'results_quarantine.jsonl')
+        
+        if self.enabled:
+            self._queue = queue.Queue(maxsize=app.config.get('RESULT_QUEUE_SIZE', 10000))
+            atexit.register(self.stop)
+    
+    def enqueue(self, row, progress_key=None, progress_delta=None):
+        """إضافة نتيجة للطابور، وإرجاع False إذا وجب حفظها مباشرة"""
+        if not self.enabled or self._stopping.is_set():
+            return False
+        
+        self._ensure_started()
+        
+        # الإجابة نص دائماً، فلا تصل قيمة لا يقبلها الإدراج إلى الدفعة
+        row = dict(row, answer=str(row['answer']))
+        
+        with self._lock:
+            try:
+                self._queue.put_nowait((row, progress_key, progress_delta))
+            except queue.Full:
+                return False
+            
+            if progress_key is not None:
+                pending = self._pending_progress.setdefault(progress_key, [0, 0, 0])
+                for i, value in enumerate(progress_delta):
+                    pending[i] += value
+        
+        return True
+    
+    def progress_snapshot(self, student_id, section_id, responses=()):
+        """
+        تقدم الطالب المحفوظ مضافاً إليه ما زال في الطابور
+        
+        الاستعلام خارج القفل؛ إذا ثبّت الخيط الخلفي دفعة أثناءه تُعاد القراءة
+        حتى لا تُحسب الدفعة مرتين أو لا تُحسب أبداً. الإتقان المعاير يُحدَّث
+        بإجابات المستدعي responses فقط، كما سيحدّثه الحفظ.
+        """
+        for _ in range(3):
+            with self._lock:
+                while self._committing:
+                    self._settled.wait()
+                generation = self._generation
+            
+            progress = StudentSectionProgress.query.filter_by(
+                student_id=student_id,
+                section_id=section_id
+            ).populate_existing().first()
+            
+            with self._lock:
+                earned, possible, attempts = self._pending_progress.get(
+                    (student_id, section_id), (0, 0, 0))
+                if generation == self._generation and not self._committing:
+                    break
+        
+        snapshot = StudentSectionProgress(
+            earned_points=earned + (progress.earned_points if progress else 0),
+            possible_points=possible + (progress.possible_points if progress else 0),
+            attempts=attempts + (progress.attempts if progress else 0)
+        )
+        if progress is not None and progress.ability is not None:
+            snapshot.ability = rasch_step(progress.ability, responses,
+                                          snapshot.attempts - len(responses))
+            snapshot.mastery = mastery_of(snapshot.ability)
+        snapshot.level = level_for_progress(snapshot)
+        return progress_to_dict(snapshot)
+    
+    def stop(self):
+        """إيقاف الخيط بعد تفريغ الطابور بالكامل"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+    
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='result-writer',
+                                                daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        self._replay_spool()
+        
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._take_batch()
+            if batch:
+                self._flush(batch)
+    
+    def _take_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.interval)]
+        except queue.Empty:
+            return []
+        
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        return batch
+    
+    def _flush(self, batch):
+        with self.app.app_context():
+            try:
+                self._write(batch)
+            except OperationalError:
+                # القاعدة غير متاحة: تُحفظ الدفعة كاملة لإعادتها لاحقاً
+                db.session.rollback()
+                self.app.logger.exception('فشل إدراج دفعة من %d نتيجة، سيتم حفظها احتياطياً',
+                                          len(batch))
+                self._spool(batch, self.spool_path)
+                self._settle(self._progress_of(batch))
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception('رُفضت دفعة من %d نتيجة، إعادة إدراجها صفاً صفاً',
+                                          len(batch))
+                for item in batch:
+                    self._flush_one(item)
+            finally:
+                db.session.remove()
+    
+    def _flush_one(self, item):
+        try:
+            self._write([item])
+        except OperationalError:
+            db.session.rollback()
+            self._spool([item], self.spool_path)
+            self._settle(self._progress_of([item]))
+        except Exception:
+            db.session.rollback()
+            self.app.logger.exception('عزل نتيجة مرفوضة في %s', self.quarantine_path)
+            self._spool([item], self.quarantine_path)
+            self._settle(self._progress_of([item]))
+    
+    def _write(self, batch):
+        """إدراج الدفعة وتحديث التقدم وتثبيتهما، ثم تحرير تقدمها المعلق"""
+        progress = self._progress_of(batch)
+        responses = self._responses_of(batch)
+        db.session.execute(db.insert(Result), [row for row, _, _ in batch])
+        for key, delta in progress.items():
+            record_section_progress(*key, *delta, responses=responses.get(key, ()))
+        
+        with self._lock:
+            self._committing = True
+        try:
+            db.session.commit()
+        except Exception:
+            self._settle({})
+            raise
+        self._settle(progress)
+    
+    @staticmethod
+    def _progress_of(batch):
+        progress = {}
+        for _, key, delta in batch:
+            if key is not None:
+                totals = progress.setdefault(key, [0, 0, 0])
+                for i, value in enumerate(delta):
+                    totals[i] += value
+        return progress
+    
+    @staticmethod
+    def _responses_of(batch):
+        """إجابات التشخيص في الدفعة لكل تقدم مع صعوبة أسئلتها (استعلام واحد)"""
+        diagnostic_ids = {row['diagnostic_id'] for row, key, _ in batch
+                          if key is not None and row.get('diagnostic_id')}
+        if not diagnostic_ids:
+            return {}
+        
+        difficulties = dict(db.session.execute(
+            db.select(Diagnostic.id, Diagnostic.difficulty).where(Diagnostic.id.in_(diagnostic_ids))
+        ).all())
+        responses = {}
+        for row, key, _ in batch:
+            if key is not None and row.get('diagnostic_id') in difficulties:
+                responses.setdefault(key, []).append(
+                    (row['is_correct'], difficulties[row['diagnostic_id']]))
+        return responses
+    
+    def _settle(self, progress):
+        """تحرير التقدم المعلق لدفعة ثُبتت أو حُفظت خارج القاعدة"""
+        with self._lock:
+            self._release_pending(progress)
+            self._committing = False
+            self._generation += 1
+            self._settled.notify_all()
+    
+    def _release_pending(self, progress):
+        for key, delta in progress.items():
+            pending = self._pending_progress.get(key)
+            if pending is None:
+                continue
+            for i, value in enumerate(delta):
+                pending[i] -= value
+            if not any(pending):
+                del self._pending_progress[key]
+    
+    def _spool(self, batch, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as spool:
+            for row, key, delta in batch:
+                item = dict(row, timestamp=row['timestamp'].isoformat())
+                spool.write(json.dumps({'row': item, 'progress_key': key,
+                                        'progress_delta': delta}, default=str) + '\n')
+    
+    def _replay_spool(self):
+        if not os.path.exists(self.spool_path):
+            return
+        
+        replaying = self.spool_path + '.replay'
+        os.replace(self.spool_path, replaying)
+        
+        batch = []
+        with open(replaying, encoding='utf-8') as spool:
+            for line in spool:
+                item = json.loads(line)
+                row = dict(item['row'],
+                           timestamp=datetime.fromisoformat(item['row']['timestamp']))
+                key = tuple(item['progress_key']) if item['progress_key'] else None
+                batch.append((row, key, item['progress_delta']))
+        
+        if batch:
+            self.app.logger.warning('إعادة إدراج %d نتيجة من الملف الاحتياطي', len(batch))
+            self._flush(batch)
+        os.remove(replaying)
+
+result_writer = app_service('result_writer')
+
+# =============================================================================
+# ذاكرة مفاتيح الإجابات المترجمة
+# =============================================================================
+
+class AnswerKey:
+    """مفتاح إجابة مترجم مسبقاً: التصحيح مقارنة مباشرة دون أي تحليل"""
+
+    __slots__ = ('question_type', 'accepted')
+
+    def __init__(self, question_type, accepted):
+        self.question_type = question_type
+        self.accepted = accepted
+
+    def matches(self, user_answer):
+        if self.accepted is None:
+            return False
+
+        if self.question_type == 'multiple_choice':
+            user_answers = user_answer if isinstance(user_answer, list) else [user_answer]
+            try:
+                return frozenset(user_answers) == self.accepted
+            except TypeError:
+                return False
+
+        if self.question_type == 'fill_blank':
+            return isinstance(user_answer, str) and user_answer.strip() in self.accepted
+
+        return user_answer == self.accepted
+
+def compile_answer_key(question_type, correct_answer):
+    """تحويل الإجابة الصحيحة المخزنة إلى مفتاح جاهز للمقارنة"""
+    if question_type == 'multiple_choice':
+        try:
+            return AnswerKey(question_type, frozenset(json.loads(correct_answer)))
+        except (json.JSONDecodeError, TypeError):
+            return AnswerKey(question_type, None)
+
+    if question_type == 'fill_blank':
+        return AnswerKey(question_type,
+                         frozenset(a.strip() for a in (correct_answer or '').split(',')))
+
+    return AnswerKey(question_type, correct_answer)
+
+# مفاتيح الإجابات لكل عملية في ذاكرة LRU محدودة بـ ANSWER_KEY_CACHE_SIZE:
+# (نوع السؤال، الإجابة الصحيحة) -> AnswerKey. المفتاح هو الإجابة نفسها لا معرف
+# السؤال، فتعديل الإجابة أو حذف السؤال (ولو بالتتابع مع تذكيره أو فقرته) ثم
+# إعادة استخدام معرفه لا يترك مفتاحاً قديماً في أي عملية، ولا يحتاج إلى إبطال.
+_answer_keys = app_service('answer_keys')
+
+def get_answer_key(question_type, correct_answer):
+    key = _answer_keys.get((question_type, correct_answer))
+    if key is None:
+        key = compile_answer_key(question_type, correct_answer)
+        _answer_keys.set((question_type, correct_answer), key)
+    return key
+
+def get_diagnostic_key(diagnostic):
+    return get_answer_key(diagnostic.question_type, diagnostic.correct_answer)
+
+def get_exercise_key(exercise):
+    # التمارين تقارن الإجابة حرفياً مثل أسئلة الاختيار الواحد
+    return get_answer_key('single_choice', exercise.correct_answer)
+
 # =============================================================================
 # فلاتر Jinja2
 # =============================================================================
 
-@app.template_filter('from_json')
+@template_filter('from_json')
 def from_json_filter(value):
     if not value:
         return []
@@ -284,15 +1268,147 @@ def from_json_filter(value):
     except (json.JSONDecodeError, TypeError):
         return value
 
-@app.template_filter('striptags')
+TAG_RE = re.compile(r'<[^>]*>')
+
+@template_filter('striptags')
 def striptags_filter(value):
     if not value:
         return ''
-    return re.sub(r'<[^>]*>', '', str(value))
+    return TAG_RE.sub('', str(value))
+
+# =============================================================================
+# تنقية محتوى الفقرات
+# =============================================================================
 
-@app.template_filter('safe')
-def safe_filter(value):
-    return Markup(value)
+# الوسوم المسموح بها في محتوى المعلم وسماتها، وكل ما عداها يُحذف ويبقى نصه
+ALLOWED_TAGS = {
+    'p': (), 'br': (), 'hr': (), 'div': (), 'span': (),
+    'h1': (), 'h2': (), 'h3': (), 'h4': (), 'h5': (), 'h6': (),
+    'strong': (), 'b': (), 'em': (), 'i': (), 'u': (), 's': (), 'sub': (), 'sup': (),
+    'ul': (), 'ol': (), 'li': (), 'blockquote': (), 'pre': (), 'code': (),
+    'table': (), 'thead': (), 'tbody': (), 'tr': (), 'th': ('colspan', 'rowspan'),
+    'td': ('colspan', 'rowspan'), 'figure': (), 'figcaption': (),
+    'a': ('href', 'title'), 'img': ('src', 'alt', 'width', 'height'),
+}
+ALLOWED_GLOBAL_ATTRIBUTES = ('class', 'dir')
+URL_ATTRIBUTES = ('href', 'src')
+ALLOWED_URL_SCHEMES = ('http', 'https', 'mailto')
+VOID_TAGS = {'br', 'hr', 'img'}
+# وسوم يُحذف محتواها أيضاً وليس الوسم فقط
+DROPPED_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript'}
+BLOCK_TAGS = {'p', 'br', 'hr', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'li',
+              'blockquote', 'pre', 'table', 'tr', 'th', 'td', 'figure', 'figcaption'}
+WHITESPACE_RE = re.compile(r'\s+')
+
+class ContentSanitizer(HTMLParser):
+    """
+    تحويل HTML المعلم إلى نسخة آمنة للعرض ونسخة نصية للمعاينة والبحث
+    
+    يمر على المحتوى مرة واحدة: الوسوم والسمات خارج القائمة تُحذف، والروابط
+    تُقبل بالمخططات المسموحة أو نسبية فقط، والوسوم المفتوحة تُغلق في النهاية.
+    """
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html = []
+        self.text = []
+        self.open_tags = []
+        self.dropping = 0
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if tag not in ALLOWED_TAGS:
+            return
+        
+        allowed = ALLOWED_TAGS[tag] + ALLOWED_GLOBAL_ATTRIBUTES
+        rendered = []
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRIBUTES and not self.safe_url(value):
+                continue
+            rendered.append(f' {name}="{escape(value)}"')
+        if tag == 'a' and any(part.startswith(' href=') for part in rendered):
+            rendered.append(' rel="noopener noreferrer"')
+        
+        self.html.append(f'<{tag}{"".join(rendered)}>')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+    
+    def handle_startendtag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            return  # لا محتوى له ولا وسم إغلاق، فلا يبدأ الحذف
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+    
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropping = max(0, self.dropping - 1)
+            return
+        if self.dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if tag not in self.open_tags:
+            return
+        # إغلاق ما فُتح بعده ولم يُغلق حتى يبقى الناتج متوازناً
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.html.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+    
+    def handle_data(self, data):
+        if self.dropping:
+            return
+        self.html.append(str(escape(data)))
+        self.text.append(data)
+    
+    @staticmethod
+    def safe_url(value):
+        value = value.strip()
+        scheme = value.split(':', 1)[0].lower() if ':' in value.split('/', 1)[0] else None
+        return scheme is None or scheme in ALLOWED_URL_SCHEMES
+    
+    def result(self):
+        self.close()
+        self.html.extend(f'</{tag}>' for tag in reversed(self.open_tags))
+        self.open_tags = []
+        return ''.join(self.html), WHITESPACE_RE.sub(' ', ''.join(self.text)).strip()
+
+def render_section_content(content):
+    """(HTML آمن للعرض، نص عادي) من محتوى الفقرة كما أدخله المعلم"""
+    sanitizer = ContentSanitizer()
+    sanitizer.feed(content or '')
+    return sanitizer.result()
+
+@event.listens_for(Section.content, 'set')
+def render_section_on_set(target, value, oldvalue, initiator):
+    """كل تعيين للمحتوى عبر ORM يحدّث النسختين، فلا يعمل مسار العرض أي تنقية"""
+    target.content_html, target.content_text = render_section_content(value)
+
+def render_missing_section_content(batch_size=500):
+    """حساب النسختين للفقرات التي لم تُحسب لها بعد (بعد الترقية من مخطط أقدم)"""
+    rendered = 0
+    while True:
+        rows = db.session.execute(
+            db.select(Section.id, Section.content).where(Section.content_html.is_(None))
+            .limit(batch_size)).all()
+        if not rows:
+            return rendered
+        updates = []
+        for row in rows:
+            content_html, content_text = render_section_content(row.content)
+            updates.append({'id': row.id, 'content_html': content_html, 'content_text': content_text})
+        db.session.execute(db.update(Section), updates)
+        rendered += len(updates)
 
 # =============================================================================
 # دوال تحويل النماذج
@@ -318,6 +1434,26 @@ def reminder_to_dict(reminder):
         'exercises': [exercise_to_dict(ex) for ex in reminder.exercises]
     }
 
+def public_diagnostic_dict(diagnostic):
+    """بيانات السؤال التشخيصي كما تُرسل للطالب، دون الإجابات أو الشرح"""
+    return {
+        'id': diagnostic.id,
+        'question': diagnostic.question,
+        'question_type': diagnostic.question_type,
+        'options': diagnostic.get_options_list(),
+        'points': diagnostic.points or 10
+    }
+
+def progress_to_dict(progress):
+    return {
+        'percentage': progress.percentage,
+        'level': progress.level,
+        'earned_points': progress.earned_points,
+        'possible_points': progress.possible_points,
+        'attempts': progress.attempts,
+        'mastery': progress.mastery
+    }
+
 def diagnostic_to_dict(diagnostic):
     return {
         'id': diagnostic.id,
@@ -330,42 +1466,908 @@ def diagnostic_to_dict(diagnostic):
         'points': diagnostic.points or 10
     }
 
+def build_section_payload(section):
+    """تحويل محتوى الفقرة إلى البيانات التي تحتاجها صفحة الطالب"""
+    return {
+        'diagnostics': [public_diagnostic_dict(d) for d in section.diagnostics],
+        'exercises': group_by_level(section.exercises, lambda ex: ex.level,
+                                    exercise_to_dict, levels=(0, 1, 2)),
+        'reminders': group_by_level(section.reminders, lambda r: r.reminder_type,
+                                    reminder_to_dict)
+    }
+
+def build_section_bundle(section_id, version, progress):
+    """حزمة الفقرة للطالب: الأسئلة دون إجابات، والتذكيرات والتمارين لكل المستويات، وتقدمه"""
+    payload = get_section_payload(section_id, version)
+    return {
+        'section_id': section_id,
+        'version': version,
+        'diagnostics': payload['diagnostics'],
+        'exercises': payload['exercises'],
+        'reminders': payload['reminders'],
+        'progress': progress_to_dict(progress) if progress else None
+    }
+
+def load_section_tree(section_id):
+    """
+    تحميل الفقرة مع درسها وأسئلتها وتمارينها وتذكيراتها (وتمارين التذكيرات)
+    بعدد ثابت من الاستعلامات مهما كان حجم المحتوى
+    """
+    return Section.query.options(
+        joinedload(Section.lesson),
+        selectinload(Section.diagnostics),
+        selectinload(Section.exercises),
+        selectinload(Section.reminders).selectinload(Reminder.exercises)
+    ).filter_by(id=section_id).first_or_404()
+
+def group_by_level(items, level_of, to_dict, levels=()):
+    """توزيع العناصر على المستويات في مرور واحد"""
+    groups = {level: [] for level in levels}
+    for item in items:
+        groups.setdefault(level_of(item), []).append(to_dict(item))
+    return groups
+
 # =============================================================================
-# المسارات الرئيسية
+# ذاكرة المحتوى المؤقتة
 # =============================================================================
 
-@app.route('/')
-def index():
-    if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
-    return render_template('index.html')
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+class LRUCache:
+    """ذاكرة مؤقتة محدودة الحجم تحذف العنصر الأقدم استخداماً"""
     
-    if request.method == 'POST':
-        email = request.form.get('email', '').strip()
-        password = request.form.get('password', '')
-        
-        user = User.query.filter_by(email=email).first()
-        
-        if user and user.check_password(password):
-            login_user(user)
-            flash(f'✅ مرحباً بعودتك، {user.name}!', 'success')
-            return redirect(url_for('dashboard'))
-        else:
-            flash('❌ البريد الإلكتروني أو كلمة المرور غير صحيحة', 'danger')
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
     
-    return render_template('login.html')
-
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
     
-    if request.method == 'POST':
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+    
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+    
+    def delete_where(self, predicate):
+        with self._lock:
+            for key in [key for key in self._items if predicate(key)]:
+                del self._items[key]
+
+section_cache = app_service('section_cache')
+
+def section_version(content_version, created_at):
+    """
+    إصدار الفقرة في مفاتيح الذاكرة المؤقتة وفي ETag: رقم الإصدار مع وقت
+    الإنشاء، فلا تطابق فقرةٌ جديدة أخذت معرف فقرة محذوفة إصدارَها القديم
+    """
+    created = created_at.strftime('%Y%m%d%H%M%S%f') if created_at else '0'
+    return f'{content_version}.{created}'
+
+def get_section_payload(section_id, version):
+    """
+    بيانات الفقرة المسلسلة من الذاكرة المؤقتة
+    
+    المفتاح (section_id, section_version)، لذا يكفي رفع رقم الإصدار
+    ليصبح المحتوى القديم غير قابل للوصول في جميع العمليات.
+    """
+    key = (section_id, version)
+    payload = section_cache.get(key)
+    
+    if payload is None:
+        payload = build_section_payload(load_section_tree(section_id))
+        section_cache.set(key, payload)
+    
+    return payload
+
+# أرقام الإصدارات المقروءة مؤخراً: section_id -> (version, وقت القراءة)
+_section_versions = app_service('section_versions')
+
+def get_section_version(section_id):
+    """إصدار الفقرة (section_version)، من الذاكرة المحلية إن لم تتجاوز SECTION_VERSION_TTL"""
+    cached = _section_versions.get(section_id)
+    now = time.monotonic()
+    
+    if cached is not None and now - cached[1] < current_app.config['SECTION_VERSION_TTL']:
+        return cached[0]
+    
+    row = db.session.execute(
+        db.select(Section.content_version, Section.created_at).where(Section.id == section_id)
+    ).first()
+    
+    if row is None:
+        return None
+    version = section_version(*row)
+    _section_versions[section_id] = (version, now)
+    return version
+
+def bump_section_version(section_id):
+    """رفع إصدار محتوى الفقرة ضمن المعاملة الحالية"""
+    db.session.execute(
+        db.update(Section)
+        .where(Section.id == section_id)
+        .values(content_version=Section.content_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.info.setdefault('bumped_sections', set()).add(section_id)
+
+def forget_deleted_sections(section_ids):
+    """إخراج الفقرات المحذوفة من ذاكرتي المحتوى والإصدارات بعد تثبيت الحذف"""
+    db.session.info.setdefault('deleted_sections', set()).update(section_ids)
+
+@event.listens_for(OrmSession, 'after_commit')
+def forget_bumped_versions(session):
+    # بعد التثبيت فقط، حتى لا يُعاد حفظ الإصدار القديم من طلب متزامن
+    for section_id in session.info.pop('bumped_sections', ()):
+        _section_versions.pop(section_id, None)
+    
+    deleted = session.info.pop('deleted_sections', None)
+    if deleted:
+        for section_id in deleted:
+            _section_versions.pop(section_id, None)
+        section_cache.delete_where(lambda key: key[0] in deleted)
+
+@event.listens_for(OrmSession, 'after_rollback')
+def discard_bumped_versions(session):
+    session.info.pop('bumped_sections', None)
+    session.info.pop('deleted_sections', None)
+
+def versioned_json(etag, build):
+    """
+    استجابة JSON مع ETag قوي مشتق من إصدار المحتوى
+    
+    إذا طابق If-None-Match تُرجع 304 دون بناء المحتوى.
+    """
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def lesson_rows_query(*criteria, order_by=(), limit=None):
+    """استعلام صفوف الدروس الخفيفة (يُستخدم أيضاً في فحص خطط الاستعلامات)"""
+    # عدد الفقرات باستعلام فرعي مرتبط (عبر فهرس sections.lesson_id) بدلاً من
+    # JOIN و GROUP BY، فتُقرأ الدروس بترتيب الفهرس دون فرز مؤقت
+    section_count = db.select(db.func.count(Section.id))\
+        .where(Section.lesson_id == Lesson.id)\
+        .scalar_subquery()
+    query = db.select(
+        Lesson.id, Lesson.title, Lesson.description, Lesson.level_id, Lesson.order,
+        Lesson.is_published, Lesson.created_at,
+        section_count.label('section_count')
+    ).where(*criteria)\
+     .order_by(*order_by)
+    
+    if limit is not None:
+        query = query.limit(limit)
+    
+    return query
+
+def lesson_rows(*criteria, order_by=(), limit=None):
+    """
+    صفوف دروس خفيفة (دون كائنات ORM أو علاقات) مع عدد فقرات كل درس
+    في استعلام مجمع واحد
+    """
+    return db.session.execute(lesson_rows_query(*criteria, order_by=order_by, limit=limit)).all()
+
+# =============================================================================
+# هوية المستخدم المحفوظة
+# =============================================================================
+
+class UserPrincipal(UserMixin):
+    """
+    نسخة خفيفة من المستخدم تغذي current_user دون استعلام في كل طلب
+    
+    تحتوي الحقول التي تستخدمها المسارات والقوالب فقط. المسار الذي يعدل
+    المستخدم يحمل كائن ORM الكامل بـ db.session.get(User, current_user.id).
+    """
+    __slots__ = ('id', 'name', 'email', 'user_type', 'level')
+    
+    def __init__(self, id, name, email, user_type, level):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.user_type = user_type
+        self.level = level
+    
+    def is_teacher(self):
+        return self.user_type == 'teacher'
+    
+    def __repr__(self):
+        return f'<UserPrincipal {self.id}: {self.name} ({self.user_type})>'
+
+principal_cache = app_service('principal_cache')
+
+@login_manager.user_loader
+def load_user(user_id):
+    """
+    تحميل هوية المستخدم من الذاكرة المؤقتة، أو بأعمدتها فقط من القاعدة
+    
+    تُحذف الهوية عند تثبيت تعديل المستخدم أو حذفه عبر ORM في هذه العملية، وتنتهي
+    صلاحيتها بعد PRINCIPAL_CACHE_TTL ثانية لتصل التعديلات من العمليات الأخرى.
+    """
+    user_id = int(user_id)
+    now = time.monotonic()
+    cached = principal_cache.get(user_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    
+    row = db.session.execute(
+        db.select(User.id, User.name, User.email, User.user_type, User.level)
+        .where(User.id == user_id)
+    ).first()
+    if row is None:
+        return None
+    
+    principal = UserPrincipal(*row)
+    principal_cache.set(user_id, (now + current_app.config['PRINCIPAL_CACHE_TTL'], principal))
+    return principal
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_principal(mapper, connection, target):
+    # تُحذف الهوية بعد تثبيت المعاملة فقط، فلا يعيد طلب متزامن حفظ القيم القديمة
+    object_session(target).info.setdefault('changed_users', set()).add(target.id)
+
+@event.listens_for(OrmSession, 'after_commit')
+def forget_changed_principals(session):
+    for user_id in session.info.pop('changed_users', ()):
+        principal_cache.delete(user_id)
+
+@event.listens_for(OrmSession, 'after_rollback')
+def discard_changed_principals(session):
+    session.info.pop('changed_users', None)
+
+# =============================================================================
+# فهرس البحث
+# =============================================================================
+
+# جدول FTS5 افتراضي: الأعمدة الأصلية للعرض فقط، والبحث في النسخ المطبّعة
+SEARCH_INDEX_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+    "kind UNINDEXED, item_id UNINDEXED, lesson_id UNINDEXED, section_id UNINDEXED, "
+    "title UNINDEXED, body UNINDEXED, title_norm, body_norm, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+event.listen(db.metadata, 'after_create', db.DDL(SEARCH_INDEX_DDL).execute_if(dialect='sqlite'))
+
+search_table = table('search_index', column('rowid'), column('kind'), column('item_id'),
+                     column('lesson_id'), column('section_id'), column('title'), column('body'),
+                     column('title_norm'), column('body_norm'))
+
+# rowid = المعرف * 4 + رقم النوع، فيُحذف كل عنصر من الفهرس مباشرة بمعرفه
+SEARCH_KINDS = ('lesson', 'section', 'diagnostic', 'exercise')
+# الأعمدة التي يعني تغييرها إعادة فهرسة العنصر
+SEARCH_FIELDS = {
+    Lesson: ('lesson', ('title', 'description')),
+    Section: ('section', ('title', 'content_text', 'lesson_id')),
+    Diagnostic: ('diagnostic', ('question', 'section_id')),
+    Exercise: ('exercise', ('title', 'content', 'section_id', 'reminder_id')),
+}
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+SEARCH_MAX_TERMS = 8
+SEARCH_SNIPPET_CHARS = 160
+
+def search_enabled(connection=None):
+    return (connection or db.engine).dialect.name == 'sqlite'
+
+def search_rowid(kind, item_id):
+    return item_id * len(SEARCH_KINDS) + SEARCH_KINDS.index(kind)
+
+def search_source(kind, *criteria):
+    """صفوف الفهرس لنوع واحد من جداول المحتوى، بالترتيب الذي يتوقعه search_table"""
+    code = SEARCH_KINDS.index(kind)
+    
+    def row(item_id, lesson_id, section_id, title, body):
+        return db.select(
+            item_id * len(SEARCH_KINDS) + code, db.literal(kind), item_id, lesson_id, section_id,
+            title, body, db.func.search_normalize(title), db.func.search_normalize(body))
+    
+    if kind == 'lesson':
+        query = row(Lesson.id, Lesson.id, db.null(), Lesson.title, Lesson.description)
+    elif kind == 'section':
+        query = row(Section.id, Section.lesson_id, Section.id, Section.title, Section.content_text)
+    elif kind == 'diagnostic':
+        query = row(Diagnostic.id, Section.lesson_id, Section.id, db.null(), Diagnostic.question)\
+            .join(Section, Section.id == Diagnostic.section_id)
+    else:
+        # تمارين التذكيرات تتبع فقرة تذكيرها
+        section_id = db.func.coalesce(Exercise.section_id, Reminder.section_id)
+        query = row(Exercise.id, Section.lesson_id, Section.id, Exercise.title, Exercise.content)\
+            .outerjoin(Reminder, Reminder.id == Exercise.reminder_id)\
+            .join(Section, Section.id == section_id)
+    return query.where(*criteria)
+
+def index_rows(connection, sources):
+    """إدراج صفوف الفهرس من عدة مصادر (search_source) بعبارة INSERT ... SELECT واحدة"""
+    if sources:
+        connection.execute(search_table.insert().from_select(
+            [c.name for c in search_table.columns], db.union_all(*sources)))
+
+def unindex_search_items(items, connection=None):
+    """حذف عناصر من الفهرس بعبارة واحدة: items قاموس {النوع: المعرفات}"""
+    connection = connection or db.session.connection()
+    rowids = [search_rowid(kind, item_id) for kind, ids in items.items() for item_id in ids]
+    if rowids and search_enabled(connection):
+        connection.execute(search_table.delete().where(search_table.c.rowid.in_(rowids)))
+
+def reindex_search_items(items, connection=None, removed=None):
+    """
+    إعادة فهرسة عناصر محددة بعبارتين مهما تعددت الأنواع: حذف صفوفها القديمة
+    (ومعها عناصر removed المحذوفة من جداولها) ثم إدراجها من جداول المحتوى
+    """
+    connection = connection or db.session.connection()
+    if not search_enabled(connection):
+        return
+    stale = {kind: set(ids) for kind, ids in (removed or {}).items()}
+    for kind, ids in items.items():
+        stale.setdefault(kind, set()).update(ids)
+    unindex_search_items(stale, connection)
+    models = {kind: model for model, (kind, _) in SEARCH_FIELDS.items()}
+    index_rows(connection, [search_source(kind, models[kind].id.in_(ids))
+                            for kind, ids in items.items() if ids])
+
+def index_new_lesson(lesson_id):
+    """فهرسة درس جديد كامل أُدرج بعبارات جماعية (الاستيراد والنسخ) لا تمر بأحداث ORM"""
+    connection = db.session.connection()
+    if not search_enabled(connection):
+        return
+    index_rows(connection, [search_source('lesson', Lesson.id == lesson_id)] +
+               [search_source(kind, Section.lesson_id == lesson_id) for kind in SEARCH_KINDS[1:]])
+
+def rebuild_search_index():
+    """إعادة بناء الفهرس كله من جداول المحتوى (بعد الترقية أو الإدراج المباشر في القاعدة)"""
+    connection = db.session.connection()
+    if not search_enabled(connection):
+        return 0
+    connection.execute(search_table.delete())
+    index_rows(connection, [search_source(kind) for kind in SEARCH_KINDS])
+    connection.execute(db.text("INSERT INTO search_index(search_index) VALUES ('optimize')"))
+    return connection.execute(db.select(db.func.count()).select_from(search_table)).scalar()
+
+def track_search_item(key, mapper, target):
+    kind, _ = SEARCH_FIELDS[mapper.class_]
+    object_session(target).info.setdefault(key, {}).setdefault(kind, set()).add(target.id)
+
+def track_search_insert(mapper, connection, target):
+    track_search_item('search_changed', mapper, target)
+
+def track_search_update(mapper, connection, target):
+    _, fields = SEARCH_FIELDS[mapper.class_]
+    state = db.inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in fields):
+        track_search_item('search_changed', mapper, target)
+
+def track_search_delete(mapper, connection, target):
+    track_search_item('search_removed', mapper, target)
+
+# العناصر المتغيرة تُجمع أثناء الحفظ ثم تُحدَّث في الفهرس دفعة واحدة بعده
+for searchable in SEARCH_FIELDS:
+    event.listen(searchable, 'after_insert', track_search_insert)
+    event.listen(searchable, 'after_update', track_search_update)
+    event.listen(searchable, 'after_delete', track_search_delete)
+
+@event.listens_for(OrmSession, 'after_flush')
+def sync_search_index(session, flush_context):
+    removed = session.info.pop('search_removed', None)
+    changed = session.info.pop('search_changed', None)
+    if removed or changed:
+        reindex_search_items(changed or {}, session.connection(), removed)
+
+def search_terms(query):
+    """جذوع كلمات الاستعلام بعد التطبيع (كل كلمة بحث بالبادئة)"""
+    words = SEARCH_WORD_RE.findall(normalize_search_text(query).lower())
+    return [light_stem(word) for word in words[:SEARCH_MAX_TERMS]]
+
+def highlight_search_text(text, terms, width=SEARCH_SNIPPET_CHARS):
+    """
+    مقتطف HTML من النص الأصلي مع تمييز الكلمات المطابقة بـ <mark>
+    
+    المطابقة على النص المطبّع حرفاً بحرف مع الاحتفاظ بموضع كل حرف في الأصل،
+    فيظهر التشكيل والتاء المربوطة كما كتبها المعلم.
+    """
+    text = WHITESPACE_RE.sub(' ', SEARCH_TAG_RE.sub(' ', text or '')).strip()
+    chars, positions = [], []
+    for position, char in enumerate(text):
+        for normalized in char.translate(SEARCH_TRANSLATION).lower():
+            chars.append(normalized)
+            positions.append(position)
+    normalized = ''.join(chars)
+    
+    spans = []
+    for match in SEARCH_WORD_RE.finditer(normalized):
+        word, stem = match.group(), light_stem(match.group())
+        if any(word.startswith(term) or stem.startswith(term) for term in terms):
+            start, end = positions[match.start()], positions[match.end() - 1] + 1
+            # التشكيل بعد آخر حرف جزء من الكلمة
+            while end < len(text) and not text[end].translate(SEARCH_TRANSLATION):
+                end += 1
+            spans.append((start, end))
+    
+    start = max(0, spans[0][0] - width // 3) if spans else 0
+    if start:
+        start = text.find(' ', start) + 1 or start
+    end = min(len(text), start + width)
+    
+    parts = ['…'] if start else []
+    cursor = start
+    for span_start, span_end in spans:
+        if span_end <= cursor or span_start >= end:
+            continue
+        parts.append(str(escape(text[cursor:span_start])))
+        parts.append(f'<mark>{escape(text[span_start:span_end])}</mark>')
+        cursor = span_end
+    parts.append(str(escape(text[cursor:end])))
+    if end < len(text):
+        parts.append('…')
+    return ''.join(parts)
+
+def search_content(query, user, kinds=None, page=1, per_page=SEARCH_PAGE_SIZE):
+    """
+    البحث في الدروس والفقرات والأسئلة والتمارين مرتبة بـ bm25
+    
+    الطالب يرى الدروس المنشورة فقط، والمعلم يرى دروسه أيضاً. النشر يُقرأ من
+    جدول الدروس عند البحث، فلا يحتاج تغييره إلى إعادة فهرسة.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+    
+    match = ' '.join(f'"{term}"*' for term in terms)
+    visible = Lesson.is_published == True
+    if user.is_teacher():
+        visible = db.or_(visible, Lesson.teacher_id == user.id)
+    
+    # الترتيب أولاً بالمعرفات فقط، ثم قراءة نصوص الصفحة المطلوبة وحدها،
+    # حتى لا تمر نصوص كل المطابقات بالفرز عندما تكون الكلمة شائعة
+    ranked = db.select(search_table.c.rowid).select_from(search_table)\
+        .join(Lesson, Lesson.id == search_table.c.lesson_id)\
+        .where(db.text('search_index MATCH :match').bindparams(match=match), visible)\
+        .order_by(db.text('bm25(search_index, 0, 0, 0, 0, 0, 0, 5.0, 1.0)'))\
+        .limit(per_page + 1).offset((page - 1) * per_page)
+    if kinds:
+        ranked = ranked.where(search_table.c.kind.in_(kinds))
+    rowids = db.session.scalars(ranked).all()
+    if not rowids:
+        return [], False
+    
+    positions = {rowid: position for position, rowid in enumerate(rowids[:per_page])}
+    rows = db.session.execute(db.select(
+        search_table.c.rowid, search_table.c.kind, search_table.c.item_id,
+        search_table.c.lesson_id, search_table.c.section_id, search_table.c.title,
+        search_table.c.body, Lesson.title.label('lesson_title'), Lesson.teacher_id,
+        Section.title.label('section_title')
+    ).select_from(search_table)
+     .join(Lesson, Lesson.id == search_table.c.lesson_id)
+     .outerjoin(Section, Section.id == search_table.c.section_id)
+     .where(search_table.c.rowid.in_(positions))).all()
+    rows.sort(key=lambda row: positions[row.rowid])
+    
+    results = []
+    for row in rows:
+        if row.kind == 'lesson':
+            url = url_for('edit_lesson' if row.teacher_id == user.id else 'view_lesson',
+                          lesson_id=row.lesson_id)
+        else:
+            url = url_for('edit_section' if row.teacher_id == user.id else 'view_section',
+                          section_id=row.section_id)
+        results.append({
+            'kind': row.kind,
+            'id': row.item_id,
+            'lesson_id': row.lesson_id,
+            'lesson_title': row.lesson_title,
+            'section_id': row.section_id,
+            'section_title': row.section_title,
+            'title': row.title or row.section_title or row.lesson_title,
+            'title_highlight': highlight_search_text(row.title, terms) if row.title else None,
+            'highlight': highlight_search_text(row.body, terms),
+            'url': url,
+        })
+    return results, len(rowids) > per_page
+
+@cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """إعادة بناء فهرس البحث من جداول المحتوى"""
+    started = time.perf_counter()
+    count = rebuild_search_index()
+    db.session.commit()
+    print(f'✅ تمت فهرسة {count} عنصر في {time.perf_counter() - started:.2f} ثانية')
+
+# =============================================================================
+# محرك الإحصائيات
+# =============================================================================
+
+def level_distribution(section_ids):
+    """عدد الطلاب في كل مستوى ومتوسط نسبتهم لكل فقرة من جدول التقدم: section_id -> صف"""
+    return {row.section_id: row for row in db.session.execute(
+        db.select(
+            StudentSectionProgress.section_id,
+            db.func.count().label('students'),
+            db.func.sum(db.case((StudentSectionProgress.level == 1, 1), else_=0))
+                .label('advanced_students'),
+            db.func.sum(db.case((StudentSectionProgress.level == 2, 1), else_=0))
+                .label('basic_students'),
+            db.func.avg(StudentSectionProgress.earned_points * 100.0 /
+                        db.func.nullif(StudentSectionProgress.possible_points, 0))
+                .label('average_percentage')
+        )
+        .where(StudentSectionProgress.section_id.in_(section_ids))
+        .group_by(StudentSectionProgress.section_id)
+    )}
+
+def refresh_level_distribution(section_ids):
+    """
+    إعادة حساب توزيع المستويات في صفوف الإحصائيات الموجودة للفقرات المعطاة
+    (بعد تغير المستويات دون نتائج جديدة، كالمعايرة). لا يُثبت التغيير.
+    """
+    existing = db.session.scalars(
+        db.select(SectionStatsRollup.section_id)
+        .where(SectionStatsRollup.section_id.in_(section_ids))
+    ).all()
+    if not existing:
+        return
+    
+    levels = level_distribution(existing)
+    now = datetime.utcnow()
+    db.session.execute(db.update(SectionStatsRollup), [
+        {'section_id': section_id,
+         'students': levels[section_id].students,
+         'advanced_students': levels[section_id].advanced_students,
+         'basic_students': levels[section_id].basic_students,
+         'average_percentage': levels[section_id].average_percentage,
+         'updated_at': now}
+        for section_id in existing if section_id in levels
+    ])
+
+def result_totals(*criteria):
+    """محاولات الأسئلة التشخيصية والتمارين (الكلية والصحيحة) لكل فقرة من النتائج المطابقة"""
+    section_id = db.func.coalesce(Diagnostic.section_id, Exercise.section_id,
+                                  Reminder.section_id).label('section_id')
+    is_diagnostic = Result.diagnostic_id.isnot(None)
+    return db.session.execute(
+        db.select(
+            section_id,
+            db.func.count(Result.diagnostic_id).label('diagnostic_attempts'),
+            db.func.sum(db.case((is_diagnostic & Result.is_correct, 1), else_=0))
+                .label('diagnostic_correct'),
+            db.func.count(Result.exercise_id).label('exercise_attempts'),
+            db.func.sum(db.case((~is_diagnostic & Result.is_correct, 1), else_=0))
+                .label('exercise_correct')
+        )
+        .select_from(Result)
+        .outerjoin(Diagnostic, Result.diagnostic_id == Diagnostic.id)
+        .outerjoin(Exercise, Result.exercise_id == Exercise.id)
+        .outerjoin(Reminder, Exercise.reminder_id == Reminder.id)
+        .where(*criteria)
+        .group_by(section_id)
+    ).all()
+
+def rebuild_section_rollup(section_id):
+    """
+    إعادة حساب محاولات فقرة في الجدول المجمع بعد حذف سؤال أو تذكير أو تمرين منها
+    
+    تُعد من جديد نتائج ما بقي من محتوى الفقرة حتى آخر نتيجة عالجها التحديث، فلا
+    تبقى محاولات المحتوى المحذوف في الأرقام ولا تُحسب نتائج لم يصلها التحديث بعد.
+    لا يثبت التغيير.
+    """
+    row = db.session.get(SectionStatsRollup, section_id)
+    if row is None:
+        return
+    state = db.session.get(StatsRollupState, 1)
+    exercises = (db.select(Exercise.id)
+                 .outerjoin(Reminder, Exercise.reminder_id == Reminder.id)
+                 .where(db.or_(Exercise.section_id == section_id,
+                               Reminder.section_id == section_id)))
+    totals = next(iter(result_totals(
+        Result.id <= (state.last_result_id if state else 0),
+        db.or_(Result.diagnostic_id.in_(db.select(Diagnostic.id)
+                                        .where(Diagnostic.section_id == section_id)),
+               Result.exercise_id.in_(exercises))
+    )), None)
+    for column in ('diagnostic_attempts', 'diagnostic_correct',
+                   'exercise_attempts', 'exercise_correct'):
+        setattr(row, column, getattr(totals, column) if totals else 0)
+    row.updated_at = datetime.utcnow()
+
+def refresh_statistics():
+    """
+    تحديث الإحصائيات المجمعة بالنتائج التي أضيفت منذ آخر تحديث
+    
+    تُجمَّع النتائج الجديدة فقط (Result.id > last_result_id) باستعلام GROUP BY
+    واحد وتضاف إلى صفوف الفقرات، ثم يعاد حساب توزيع المستويات ومتوسط النسبة
+    للفقرات المتأثرة فقط من جدول تقدم الطلاب. تكلفة التحديث تتبع عدد النتائج
+    الجديدة لا حجم الجدول.
+    """
+    state = db.session.get(StatsRollupState, 1)
+    if state is None:
+        state = StatsRollupState(id=1, last_result_id=0)
+        db.session.add(state)
+        db.session.flush()
+    
+    start = state.last_result_id
+    end = db.session.scalar(db.select(db.func.max(Result.id))) or 0
+    if end <= start:
+        return 0
+    
+    # حجز نطاق النتائج؛ إن سبقنا تحديث متزامن نتركه له
+    claimed = db.session.execute(
+        db.update(StatsRollupState)
+        .where(StatsRollupState.id == 1, StatsRollupState.last_result_id == start)
+        .values(last_result_id=end, refreshed_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        return 0
+    
+    deltas = result_totals(Result.id > start, Result.id <= end)
+    
+    touched = [row.section_id for row in deltas if row.section_id is not None]
+    current = {row.section_id: row for row in db.session.execute(
+        db.select(SectionStatsRollup).where(SectionStatsRollup.section_id.in_(touched))
+    ).scalars()}
+    
+    levels = level_distribution(touched)
+    
+    # الكتابة بعبارتين مجمعتين (إدراج وتحديث بالمفتاح الأساسي) مهما كان عدد الفقرات
+    inserts, updates = [], []
+    now = datetime.utcnow()
+    for row in deltas:
+        if row.section_id is None:
+            continue  # نتائج أسئلة أو تمارين محذوفة
+        old = current.get(row.section_id)
+        level = levels.get(row.section_id) or old
+        values = {'section_id': row.section_id, 'updated_at': now}
+        for column in ('diagnostic_attempts', 'diagnostic_correct',
+                       'exercise_attempts', 'exercise_correct'):
+            values[column] = getattr(row, column) + (getattr(old, column) if old else 0)
+        for column in ('students', 'advanced_students', 'basic_students'):
+            values[column] = getattr(level, column) if level else 0
+        values['average_percentage'] = level.average_percentage if level else None
+        (updates if old else inserts).append(values)
+    
+    if inserts:
+        db.session.execute(db.insert(SectionStatsRollup), inserts)
+    if updates:
+        db.session.execute(db.update(SectionStatsRollup), updates)
+    
+    db.session.commit()
+    return end - start
+
+def section_statistics(teacher_id):
+    """إحصائيات كل فقرة من دروس المعلم مقروءة من الجدول المجمع"""
+    return db.session.execute(
+        db.select(
+            Section.id, Section.title, Section.lesson_id,
+            Lesson.title.label('lesson_title'),
+            db.func.coalesce(SectionStatsRollup.diagnostic_attempts, 0).label('diagnostic_attempts'),
+            db.func.coalesce(SectionStatsRollup.diagnostic_correct, 0).label('diagnostic_correct'),
+            db.func.coalesce(SectionStatsRollup.exercise_attempts, 0).label('exercise_attempts'),
+            db.func.coalesce(SectionStatsRollup.exercise_correct, 0).label('exercise_correct'),
+            db.func.coalesce(SectionStatsRollup.students, 0).label('students'),
+            db.func.coalesce(SectionStatsRollup.advanced_students, 0).label('advanced_students'),
+            db.func.coalesce(SectionStatsRollup.basic_students, 0).label('basic_students'),
+            SectionStatsRollup.average_percentage
+        )
+        .join(Lesson, Section.lesson_id == Lesson.id)
+        .outerjoin(SectionStatsRollup, SectionStatsRollup.section_id == Section.id)
+        .where(Lesson.teacher_id == teacher_id)
+        .order_by(Lesson.order, Section.order)
+    ).all()
+
+def lesson_statistics(teacher_id):
+    """إحصائيات كل درس من دروس المعلم مجمعة من صفوف فقراته"""
+    rollup = SectionStatsRollup
+    return db.session.execute(
+        db.select(
+            Lesson.id, Lesson.title,
+            db.func.count(Section.id).label('sections'),
+            db.func.coalesce(db.func.sum(rollup.diagnostic_attempts + rollup.exercise_attempts), 0)
+                .label('attempts'),
+            db.func.coalesce(db.func.sum(rollup.diagnostic_correct + rollup.exercise_correct), 0)
+                .label('correct'),
+            db.func.coalesce(db.func.sum(rollup.advanced_students), 0).label('advanced_students'),
+            db.func.coalesce(db.func.sum(rollup.basic_students), 0).label('basic_students'),
+            # متوسط موزون بعدد الطلاب في كل فقرة
+            (db.func.sum(rollup.average_percentage * rollup.students) /
+             db.func.nullif(db.func.sum(db.case((rollup.average_percentage.isnot(None),
+                                                 rollup.students), else_=0)), 0))
+                .label('average_percentage')
+        )
+        .outerjoin(Section, Section.lesson_id == Lesson.id)
+        .outerjoin(rollup, rollup.section_id == Section.id)
+        .where(Lesson.teacher_id == teacher_id)
+        .group_by(Lesson.id, Lesson.title)
+        .order_by(Lesson.order)
+    ).all()
+
+@cli.command('refresh-stats')
+def refresh_stats_command():
+    """
+    تحديث الإحصائيات المجمعة، يُشغَّل دورياً (cron مثلاً): صفحة الإحصائيات
+    تقرأ الجدول المجمع فقط ولا تكتب فيه
+    """
+    print(f'✅ تمت معالجة {refresh_statistics()} نتيجة جديدة')
+
+@template_filter('ratio')
+def ratio_filter(part, whole):
+    if not whole:
+        return '-'
+    return f'{part / whole * 100:.1f}%'
+
+# =============================================================================
+# نموذج الإتقان
+# =============================================================================
+
+def calibrate_mastery(iterations=50, prior_variance=1.0, tolerance=1e-4):
+    """
+    معايرة نموذج Rasch لكل الفقرات دفعة واحدة من نتائج التشخيص
+    
+    احتمال الإجابة الصحيحة = sigmoid(قدرة الطالب في الفقرة - صعوبة السؤال).
+    تُقدَّر القدرات ثم الصعوبات بالتناوب بخطوات نيوتن متجهة (bincount على كل
+    الإجابات) حتى تستقر، مع توزيع مسبق طبيعي يمنع القيم اللانهائية لمن أجاب
+    على الكل صحيحاً أو خطأً. تُوسَّط الصعوبات في كل فقرة حول الصفر، فيكون الإتقان
+    sigmoid(القدرة) هو احتمال الإجابة على سؤال متوسط الصعوبة.
+    
+    تُحفظ الصعوبة في Diagnostic والقدرة والإتقان والمستوى في
+    StudentSectionProgress، فيبقى اختيار المستوى عند الإجابة قراءة واحدة،
+    ويُعاد حساب توزيع المستويات في SectionStatsRollup للفقرات المعايَرة.
+    """
+    import numpy as np  # مطلوب لهذه المهمة فقط
+    
+    started = time.perf_counter()
+    rows = db.session.connection().execute(
+        db.select(Result.student_id, Diagnostic.section_id, Result.diagnostic_id, Result.is_correct)
+        .join(Diagnostic, Result.diagnostic_id == Diagnostic.id)
+    ).all()
+    if not rows:
+        return {'responses': 0}
+    
+    # fromiter على القيم مباشرة أسرع بكثير من np.array على كائنات Row
+    data = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64,
+                       count=len(rows) * 4).reshape(-1, 4)
+    student_ids, section_ids, item_ids = data[:, 0], data[:, 1], data[:, 2]
+    correct = data[:, 3].astype(np.float64)
+    
+    # فهارس متصلة: زوج (طالب، فقرة) لكل قدرة، وسؤال لكل صعوبة
+    pairs, pair_index = np.unique(np.stack([student_ids, section_ids], axis=1),
+                                  axis=0, return_inverse=True)
+    pair_index = pair_index.ravel()
+    items, item_first, item_index = np.unique(item_ids, return_index=True, return_inverse=True)
+    item_index = item_index.ravel()
+    sections, item_section = np.unique(section_ids[item_first], return_inverse=True)
+    pair_section = np.searchsorted(sections, pairs[:, 1])
+    
+    ability = np.zeros(len(pairs))
+    difficulty = np.zeros(len(items))
+    items_per_section = np.bincount(item_section, minlength=len(sections))
+    
+    def residuals():
+        p = 1 / (1 + np.exp(difficulty[item_index] - ability[pair_index]))
+        return correct - p, p * (1 - p)
+    
+    for iteration in range(1, iterations + 1):
+        previous_ability, previous_difficulty = ability.copy(), difficulty.copy()
+        
+        residual, information = residuals()
+        ability += (np.bincount(pair_index, residual, len(pairs)) - ability / prior_variance) / \
+                   (np.bincount(pair_index, information, len(pairs)) + 1 / prior_variance)
+        
+        residual, information = residuals()
+        difficulty -= (np.bincount(item_index, residual, len(items)) + difficulty / prior_variance) / \
+                      (np.bincount(item_index, information, len(items)) + 1 / prior_variance)
+        
+        shift = np.bincount(item_section, difficulty, len(sections)) / items_per_section
+        difficulty -= shift[item_section]
+        ability -= shift[pair_section]
+        
+        change = max(np.abs(ability - previous_ability).max(),
+                     np.abs(difficulty - previous_difficulty).max())
+        if change < tolerance:
+            break
+    
+    mastery = 1 / (1 + np.exp(-ability))
+    threshold = current_app.config['MASTERY_THRESHOLD']
+    
+    db.session.execute(db.update(Diagnostic), [
+        {'id': int(item), 'difficulty': float(value)}
+        for item, value in zip(items, difficulty)
+    ])
+    
+    progress = StudentSectionProgress.__table__
+    db.session.execute(
+        progress.update()
+        .where(progress.c.student_id == db.bindparam('b_student_id'),
+               progress.c.section_id == db.bindparam('b_section_id'))
+        .values(ability=db.bindparam('b_ability'), mastery=db.bindparam('b_mastery'),
+                level=db.bindparam('b_level')),
+        [
+            {'b_student_id': int(student_id), 'b_section_id': int(section_id),
+             'b_ability': float(a), 'b_mastery': float(m), 'b_level': 1 if m >= threshold else 2}
+            for (student_id, section_id), a, m in zip(pairs, ability, mastery)
+        ]
+    )
+    # المستويات تغيرت دون نتائج جديدة، فلن يلتقطها التحديث التدريجي للإحصائيات
+    refresh_level_distribution([int(section_id) for section_id in sections])
+    db.session.commit()
+    
+    return {
+        'responses': len(rows),
+        'items': len(items),
+        'student_sections': len(pairs),
+        'sections': len(sections),
+        'advanced': int((mastery >= threshold).sum()),
+        'iterations': iteration,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+@cli.command('calibrate-mastery')
+def calibrate_mastery_command():
+    """معايرة صعوبة الأسئلة وإتقان الطلاب (مناسب للتشغيل الدوري)"""
+    summary = calibrate_mastery()
+    print('✅ ' + '، '.join(f'{name}: {value}' for name, value in summary.items()))
+
+# =============================================================================
+# المسارات الرئيسية
+# =============================================================================
+
+@route('/')
+def index():
+    if current_user.is_authenticated:
+        return redirect(url_for('dashboard'))
+    return render_template('index.html')
+
+@route('/login', methods=['GET', 'POST'])
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for('dashboard'))
+    
+    if request.method == 'POST':
+        email = request.form.get('email', '').strip()
+        password = request.form.get('password', '')
+        
+        user = User.query.filter_by(email=email).first()
+        
+        try:
+            valid = user is not None and user.check_password(password)
+            rehash = valid and password_hasher.needs_rehash(user.password_hash)
+            if rehash:
+                # تحديث التجزئة بالخوارزمية والتكلفة الحالية دون إزعاج المستخدم
+                user.set_password(password)
+        except PasswordHasherBusy:
+            flash('⏳ الخادم مشغول حالياً، يرجى المحاولة بعد لحظات', 'warning')
+            return render_template('login.html'), 503
+        
+        if valid:
+            login_user(user)
+            flash(f'✅ مرحباً بعودتك، {user.name}!', 'success')
+            if rehash:
+                db.session.commit()
+                password_hasher.record_rehash()
+            return redirect(url_for('dashboard'))
+        else:
+            flash('❌ البريد الإلكتروني أو كلمة المرور غير صحيحة', 'danger')
+    
+    return render_template('login.html')
+
+@route('/register', methods=['GET', 'POST'])
+def register():
+    if current_user.is_authenticated:
+        return redirect(url_for('dashboard'))
+    
+    if request.method == 'POST':
         name = request.form.get('name', '').strip()
         email = request.form.get('email', '').strip().lower()
         password = request.form.get('password', '')
@@ -380,7 +2382,11 @@ def register():
             return redirect(url_for('register'))
         
         user = User(name=name, email=email, user_type=user_type)
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except PasswordHasherBusy:
+            flash('⏳ الخادم مشغول حالياً، يرجى المحاولة بعد لحظات', 'warning')
+            return render_template('register.html'), 503
         
         db.session.add(user)
         db.session.commit()
@@ -391,28 +2397,31 @@ def register():
     
     return render_template('register.html')
 
-@app.route('/logout')
+@route('/logout')
 @login_required
 def logout():
     logout_user()
     flash('👋 تم تسجيل الخروج بنجاح', 'info')
     return redirect(url_for('index'))
 
-@app.route('/dashboard')
+@route('/dashboard')
 @login_required
 def dashboard():
     if current_user.is_teacher():
-        lessons = Lesson.query.filter_by(teacher_id=current_user.id).order_by(Lesson.order).all()
+        lessons = lesson_rows(Lesson.teacher_id == current_user.id, order_by=[Lesson.order])
+        published_count = sum(1 for lesson in lessons if lesson.is_published)
         return render_template('teacher_dashboard.html', 
                              lessons=lessons, 
+                             published_count=published_count,
+                             draft_count=len(lessons) - published_count,
                              teacher=current_user)
     else:
-        lessons = Lesson.query.filter_by(is_published=True).order_by(Lesson.order).all()
+        lessons = lesson_rows(Lesson.is_published == True, order_by=[Lesson.order])
         return render_template('student_dashboard.html', 
                              lessons=lessons, 
                              student=current_user)
 
-@app.route('/lesson/<int:lesson_id>')
+@route('/lesson/<int:lesson_id>')
 @login_required
 def view_lesson(lesson_id):
     lesson = Lesson.query.get_or_404(lesson_id)
@@ -423,50 +2432,41 @@ def view_lesson(lesson_id):
     
     return render_template('lesson.html', lesson=lesson)
 
-@app.route('/section/<int:section_id>')
+@route('/section/<int:section_id>')
 @login_required
 def view_section(section_id):
-    section = Section.query.get_or_404(section_id)
+    section = Section.query.options(joinedload(Section.lesson))\
+                .filter_by(id=section_id).first_or_404()
     
     if not section.lesson.is_published and not current_user.is_teacher():
         flash('⏳ هذا الدرس غير متاح حالياً', 'warning')
         return redirect(url_for('dashboard'))
     
-    diagnostics_data = [diagnostic_to_dict(d) for d in section.diagnostics]
-    
-    main_exercises = [exercise_to_dict(ex) for ex in section.exercises if ex.level == 0]
-    advanced_exercises = [exercise_to_dict(ex) for ex in section.exercises if ex.level == 1]
-    basic_exercises = [exercise_to_dict(ex) for ex in section.exercises if ex.level == 2]
+    progress = StudentSectionProgress.query.filter_by(
+        student_id=current_user.id,
+        section_id=section.id
+    ).first()
     
-    diagnostic_result = None
-    if section.diagnostics:
-        diagnostic = section.diagnostics[0]
-        diagnostic_result = Result.query.filter_by(
-            student_id=current_user.id,
-            diagnostic_id=diagnostic.id
-        ).first()
+    bundle = build_section_bundle(section.id, section_version(section.content_version,
+                                                              section.created_at), progress)
     
     return render_template('section.html', 
                          section=section,
-                         diagnostics_data=diagnostics_data,
-                         main_exercises=main_exercises,
-                         advanced_exercises=advanced_exercises,
-                         basic_exercises=basic_exercises,
-                         diagnostic_result=diagnostic_result)
+                         bundle=bundle)
 
 # =============================================================================
 # مسارات المعلمين
 # =============================================================================
 
-@app.route('/teacher/lessons')
+@route('/teacher/lessons')
 @login_required
 @teacher_required
 def teacher_lessons():
-    lessons = Lesson.query.filter_by(teacher_id=current_user.id)\
-               .order_by(Lesson.order.desc()).all()
+    lessons = lesson_rows(Lesson.teacher_id == current_user.id,
+                          order_by=[Lesson.order.desc()])
     return render_template('teacher/lessons.html', lessons=lessons)
 
-@app.route('/teacher/lesson/new', methods=['GET', 'POST'])
+@route('/teacher/lesson/new', methods=['GET', 'POST'])
 @login_required
 @teacher_required
 def create_lesson():
@@ -497,11 +2497,21 @@ def create_lesson():
     
     return render_template('teacher/create_lesson.html')
 
-@app.route('/teacher/lesson/<int:lesson_id>/edit', methods=['GET', 'POST'])
+@route('/teacher/lesson/<int:lesson_id>/edit', methods=['GET', 'POST'])
 @login_required
 @teacher_required
 def edit_lesson(lesson_id):
-    lesson = Lesson.query.get_or_404(lesson_id)
+    query = Lesson.query
+    if request.method == 'GET':
+        # القالب يعرض عدد الأسئلة والتذكيرات والتمارين لكل فقرة
+        query = query.options(
+            selectinload(Lesson.sections).options(
+                selectinload(Section.diagnostics),
+                selectinload(Section.reminders),
+                selectinload(Section.exercises)
+            )
+        )
+    lesson = query.filter_by(id=lesson_id).first_or_404()
     
     if lesson.teacher_id != current_user.id:
         flash('🚫 ليس لديك صلاحية لتعديل هذا الدرس', 'danger')
@@ -520,7 +2530,7 @@ def edit_lesson(lesson_id):
     
     return render_template('teacher/edit_lesson.html', lesson=lesson)
 
-@app.route('/teacher/lesson/<int:lesson_id>/delete', methods=['POST'])
+@route('/teacher/lesson/<int:lesson_id>/delete', methods=['POST'])
 @login_required
 @teacher_required
 def delete_lesson(lesson_id):
@@ -529,12 +2539,13 @@ def delete_lesson(lesson_id):
     if lesson.teacher_id != current_user.id:
         return jsonify({'success': False, 'message': 'ليس لديك صلاحية'})
     
-    db.session.delete(lesson)
+    delete_section_tree(db.session.scalars(
+        db.select(Section.id).where(Section.lesson_id == lesson.id)).all(), lesson_id=lesson.id)
     db.session.commit()
     
     return jsonify({'success': True, 'message': 'تم حذف الدرس بنجاح'})
 
-@app.route('/teacher/lesson/<int:lesson_id>/section/new', methods=['GET', 'POST'])
+@route('/teacher/lesson/<int:lesson_id>/section/new', methods=['GET', 'POST'])
 @login_required
 @teacher_required
 def create_section(lesson_id):
@@ -569,7 +2580,7 @@ def create_section(lesson_id):
     
     return render_template('teacher/create_section.html', lesson=lesson)
 
-@app.route('/teacher/section/<int:section_id>/edit', methods=['GET', 'POST'])
+@route('/teacher/section/<int:section_id>/edit', methods=['GET', 'POST'])
 @login_required
 @teacher_required
 def edit_section(section_id):
@@ -604,6 +2615,7 @@ def edit_section(section_id):
             section.content = request.form.get('content', '').strip()
             section.order = request.form.get('order', 0, type=int)
             
+            bump_section_version(section.id)
             db.session.commit()
             flash('✅ تم تحديث الفقرة بنجاح', 'success')
         
@@ -617,8 +2629,7 @@ def handle_new_diagnostic(section_id):
     """معالجة إضافة سؤال تشخيصي جديد"""
     section = Section.query.get_or_404(section_id)
     
-    question_type = request.form.get('question_type', 'single_choice')
-    errors = validate_diagnostic_form(request.form, question_type)
+    fields, errors = diagnostic_fields(request.form)
     
     if errors:
         for error in errors:
@@ -626,81 +2637,10 @@ def handle_new_diagnostic(section_id):
         return redirect(url_for('edit_section', section_id=section_id))
     
     try:
-        # معالجة حسب نوع السؤال
-        question = request.form.get('question', '').strip()
-        explanation = request.form.get('explanation', '').strip()
-        points = request.form.get('points', 10, type=int)
-        
-        if question_type == 'single_choice':
-            # جمع الخيارات
-            options = []
-            for i in range(1, 7):  # حتى 6 خيارات
-                option = request.form.get(f'option{i}', '').strip()
-                if option:
-                    options.append(option)
-            
-            correct_answer = request.form.get('correct_answer_single', '').strip()
-            
-            if not correct_answer or correct_answer not in options:
-                flash('⚠️ الإجابة الصحيحة غير صالحة', 'warning')
-                return redirect(url_for('edit_section', section_id=section_id))
-            
-            diagnostic = Diagnostic(
-                question=question,
-                question_type=question_type,
-                options=json.dumps(options),
-                correct_answer=correct_answer,
-                explanation=explanation,
-                points=points,
-                section_id=section_id
-            )
-            
-        elif question_type == 'multiple_choice':
-            # جمع الخيارات والإجابات الصحيحة
-            options = []
-            correct_answers = []
-            
-            for i in range(1, 7):
-                option = request.form.get(f'option{i}', '').strip()
-                if option:
-                    options.append(option)
-                    # التحقق إذا كان هذا الخيار صحيحاً
-                    is_correct = request.form.get(f'correct{i}', 'off') == 'on'
-                    if is_correct:
-                        correct_answers.append(option)
-            
-            if not correct_answers:
-                flash('⚠️ يجب اختيار إجابة صحيحة واحدة على الأقل', 'warning')
-                return redirect(url_for('edit_section', section_id=section_id))
-            
-            diagnostic = Diagnostic(
-                question=question,
-                question_type=question_type,
-                options=json.dumps(options),
-                correct_answer=json.dumps(correct_answers),
-                explanation=explanation,
-                points=points,
-                section_id=section_id
-            )
-            
-        elif question_type == 'fill_blank':
-            correct_answer = request.form.get('correct_answer_fill', '').strip()
-            
-            diagnostic = Diagnostic(
-                question=question,
-                question_type=question_type,
-                options=json.dumps([]),  # لا توجد خيارات
-                correct_answer=correct_answer,
-                explanation=explanation,
-                points=points,
-                section_id=section_id
-            )
-        
-        else:
-            flash('❌ نوع السؤال غير صالح', 'danger')
-            return redirect(url_for('edit_section', section_id=section_id))
+        diagnostic = Diagnostic(section_id=section_id, **fields)
         
         db.session.add(diagnostic)
+        bump_section_version(section_id)
         db.session.commit()
         
         flash('✅ تم إضافة السؤال التشخيصي بنجاح', 'success')
@@ -711,7 +2651,7 @@ def handle_new_diagnostic(section_id):
     
     return redirect(url_for('edit_section', section_id=section_id))
 
-@app.route('/teacher/section/<int:section_id>/diagnostic/new', methods=['GET', 'POST'])
+@route('/teacher/section/<int:section_id>/diagnostic/new', methods=['GET', 'POST'])
 @login_required
 @teacher_required
 def create_diagnostic(section_id):
@@ -719,7 +2659,7 @@ def create_diagnostic(section_id):
     section = Section.query.get_or_404(section_id)
     return redirect(url_for('edit_section', section_id=section_id))
 
-@app.route('/teacher/section/<int:section_id>/reminder/new', methods=['GET', 'POST'])
+@route('/teacher/section/<int:section_id>/reminder/new', methods=['GET', 'POST'])
 @login_required
 @teacher_required
 def create_reminder(section_id):
@@ -747,6 +2687,7 @@ def create_reminder(section_id):
         )
         
         db.session.add(reminder)
+        bump_section_version(section_id)
         db.session.commit()
         
         flash('✅ تم إنشاء التذكير بنجاح', 'success')
@@ -754,7 +2695,7 @@ def create_reminder(section_id):
     
     return render_template('teacher/create_reminder.html', section=section)
 
-@app.route('/teacher/section/<int:section_id>/exercise/new', methods=['GET', 'POST'])
+@route('/teacher/section/<int:section_id>/exercise/new', methods=['GET', 'POST'])
 @login_required
 @teacher_required
 def create_exercise(section_id):
@@ -788,6 +2729,7 @@ def create_exercise(section_id):
         )
         
         db.session.add(exercise)
+        bump_section_version(section_id)
         db.session.commit()
         
         flash('✅ تم إنشاء التمرين بنجاح', 'success')
@@ -795,40 +2737,668 @@ def create_exercise(section_id):
     
     return render_template('teacher/create_exercise.html', section=section)
 
-@app.route('/teacher/statistics')
+@route('/teacher/statistics')
 @login_required
 @teacher_required
 def teacher_statistics():
-    total_lessons = Lesson.query.filter_by(teacher_id=current_user.id).count()
-    published_lessons = Lesson.query.filter_by(teacher_id=current_user.id, 
-                                              is_published=True).count()
+    totals = db.session.execute(
+        db.select(db.func.count(Lesson.id).label('total'),
+                  db.func.sum(db.case((Lesson.is_published == True, 1), else_=0)).label('published'))
+        .where(Lesson.teacher_id == current_user.id)
+    ).one()
+    total_lessons = totals.total
+    published_lessons = totals.published or 0
     total_students = User.query.filter_by(user_type='student').count()
     
+    recent_lessons = lesson_rows(Lesson.teacher_id == current_user.id,
+                                 order_by=[Lesson.id.desc()], limit=5)
+    
     return render_template('teacher/statistics.html',
                          total_lessons=total_lessons,
                          published_lessons=published_lessons,
-                         total_students=total_students)
+                         total_students=total_students,
+                         recent_lessons=recent_lessons,
+                         lesson_stats=lesson_statistics(current_user.id),
+                         section_stats=section_statistics(current_user.id))
+
+# =============================================================================
+# تصدير النتائج
+# =============================================================================
+
+EXPORT_COLUMNS = ['result_id', 'timestamp', 'student_id', 'student_name', 'student_email',
+                  'section_id', 'section_title', 'item_type', 'item_id', 'question',
+                  'answer', 'is_correct', 'score']
+EXPORT_BATCH_SIZE = 1000
+
+def lesson_results_queries(lesson_id):
+    """
+    استعلامات نتائج الدرس (التشخيص ثم التمارين ثم تمارين التذكيرات) بنفس الأعمدة
+    
+    دون ORDER BY حتى يبدأ SQLite بإرجاع الصفوف فوراً عبر فهارس
+    section_id و diagnostic_id/exercise_id بدلاً من فرز كل النتائج أولاً.
+    """
+    common = (Result.id.label('result_id'), Result.timestamp, User.id.label('student_id'),
+              User.name.label('student_name'), User.email.label('student_email'),
+              Section.id.label('section_id'), Section.title.label('section_title'))
+    tail = (Result.answer, Result.is_correct, Result.score)
+    
+    def query(item_type, item, question):
+        return db.select(
+            *common, db.literal(item_type).label('item_type'), item.id.label('item_id'),
+            question.label('question'), *tail
+        ).select_from(Section).where(Section.lesson_id == lesson_id)
+    
+    diagnostics = query('diagnostic', Diagnostic, Diagnostic.question)\
+        .join(Diagnostic, Diagnostic.section_id == Section.id)\
+        .join(Result, Result.diagnostic_id == Diagnostic.id)\
+        .join(User, User.id == Result.student_id)
+    
+    exercises = query('exercise', Exercise, Exercise.content)\
+        .join(Exercise, Exercise.section_id == Section.id)\
+        .join(Result, Result.exercise_id == Exercise.id)\
+        .join(User, User.id == Result.student_id)
+    
+    # تمارين التذكيرات مرتبطة بالفقرة عبر التذكير فقط
+    reminder_exercises = query('exercise', Exercise, Exercise.content)\
+        .join(Reminder, Reminder.section_id == Section.id)\
+        .join(Exercise, db.and_(Exercise.reminder_id == Reminder.id, Exercise.section_id.is_(None)))\
+        .join(Result, Result.exercise_id == Exercise.id)\
+        .join(User, User.id == Result.student_id)
+    
+    return diagnostics, exercises, reminder_exercises
+
+def iter_lesson_results(lesson_id):
+    """صفوف النتائج على دفعات من المؤشر دون تحميلها كلها في الذاكرة"""
+    for query in lesson_results_queries(lesson_id):
+        result = db.session.execute(query, execution_options={'yield_per': EXPORT_BATCH_SIZE})
+        for partition in result.partitions():
+            yield partition
+
+# بدايات الخلايا التي ينفذها Excel و LibreOffice كصيغة (حقن الصيغ في CSV)
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def csv_safe(value):
+    """نص يبدأ بمحرف صيغة يُسبق بـ ' ليُعرض نصاً كما كتبه الطالب أو المعلم"""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def results_csv(lesson_id):
+    # BOM ليعرض Excel النص العربي بشكل صحيح
+    buffer = io.StringIO()
+    buffer.write('\ufeff')
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    
+    for partition in iter_lesson_results(lesson_id):
+        writer.writerows([csv_safe(value) for value in row] for row in partition)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    
+    yield buffer.getvalue()
+
+def results_ndjson(lesson_id):
+    for partition in iter_lesson_results(lesson_id):
+        lines = []
+        for row in partition:
+            item = dict(zip(EXPORT_COLUMNS, row))
+            item['timestamp'] = item['timestamp'].isoformat() if item['timestamp'] else None
+            lines.append(json.dumps(item, ensure_ascii=False))
+        yield '\n'.join(lines) + '\n'
+
+@route('/teacher/lesson/<int:lesson_id>/results.<any(csv, ndjson):fmt>')
+@login_required
+@teacher_required
+def export_lesson_results(lesson_id, fmt):
+    """تصدير نتائج الطلاب في الدرس كبث مستمر بذاكرة ثابتة"""
+    lesson = Lesson.query.get_or_404(lesson_id)
+    
+    if lesson.teacher_id != current_user.id:
+        flash('🚫 ليس لديك صلاحية لتصدير نتائج هذا الدرس', 'danger')
+        return redirect(url_for('teacher_lessons'))
+    
+    if fmt == 'csv':
+        body, content_type = results_csv(lesson.id), 'text/csv; charset=utf-8'
+    else:
+        body, content_type = results_ndjson(lesson.id), 'application/x-ndjson; charset=utf-8'
+    
+    return Response(stream_with_context(body), content_type=content_type, headers={
+        'Content-Disposition': f'attachment; filename=lesson-{lesson.id}-results.{fmt}',
+        'X-Accel-Buffering': 'no',
+    })
+
+# =============================================================================
+# استيراد المحتوى
+# =============================================================================
+
+IMPORT_CSV_COLUMNS = ['type', 'title', 'content', 'question_type', 'options', 'correct_answer',
+                      'explanation', 'points', 'level', 'reminder_type']
+IMPORT_MAX_ERRORS = 20
+
+def import_text(item, key):
+    value = item.get(key)
+    return '' if value is None else str(value).strip()
+
+def import_int(item, key, default, allowed, label, errors, where):
+    """قراءة عدد صحيح من عنصر مستورد مع التحقق من قيمته"""
+    value = item.get(key)
+    if value is None or value == '':
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        value = None
+    if value is None or (allowed and value not in allowed):
+        errors.append(f'{where}: {label} غير صالح')
+        return default
+    return value
+
+def diagnostic_form(item):
+    """عرض سؤال مستورد كنموذج المعلم حتى يمر بنفس قواعد التحقق"""
+    question_type = import_text(item, 'question_type') or 'single_choice'
+    options = item.get('options') or []
+    correct = item.get('correct_answer')
+    form = {
+        'question': import_text(item, 'question'),
+        'question_type': question_type,
+        'explanation': import_text(item, 'explanation'),
+        'points': import_text(item, 'points') or '10',
+    }
+    
+    for i, option in enumerate(options[:6], 1):
+        form[f'option{i}'] = str(option)
+    
+    if question_type == 'multiple_choice':
+        correct = [str(answer) for answer in correct or []] if isinstance(correct, list) else [str(correct or '')]
+        for i, option in enumerate(options[:6], 1):
+            if str(option) in correct:
+                form[f'correct{i}'] = 'on'
+    elif question_type == 'fill_blank':
+        form['correct_answer_fill'] = '' if correct is None else str(correct)
+    else:
+        form['correct_answer_single'] = '' if correct is None else str(correct).strip()
+    
+    return MultiDict(form)
+
+def import_list(item, key, errors, where):
+    """قائمة عناصر من عنصر مستورد، وإن لم تكن قائمة يُسجل خطأ وتُعاد قائمة فارغة"""
+    value = item.get(key) or []
+    if not isinstance(value, list):
+        errors.append(f'{where}: {key} يجب أن تكون قائمة')
+        return []
+    return value
+
+def exercise_fields(item, errors, where):
+    if not isinstance(item, dict):
+        errors.append(f'{where}: صيغة غير صالحة')
+        return None
+    content = import_text(item, 'content')
+    correct_answer = import_text(item, 'correct_answer')
+    if not content or not correct_answer:
+        errors.append(f'{where}: نص التمرين والإجابة الصحيحة مطلوبان')
+    return {
+        'title': import_text(item, 'title'),
+        'content': content,
+        'level': import_int(item, 'level', 0, (0, 1, 2), 'المستوى', errors, where),
+        'correct_answer': correct_answer,
+        'explanation': import_text(item, 'explanation'),
+        'points': import_int(item, 'points', 10, None, 'عدد النقاط', errors, where),
+    }
+
+def validate_lesson_tree(tree):
+    """
+    التحقق من شجرة درس مستوردة بقواعد نماذج المعلم نفسها
+    
+    يعيد (قيم الدرس، الفقرات، الأخطاء). كل فقرة قاموس فيه أعمدتها وأسئلتها
+    وتذكيراتها (مع تمارينها) وتمارينها، وتُجمع الأخطاء كلها مع موضعها.
+    """
+    errors = []
+    if not isinstance(tree, dict):
+        return None, [], ['صيغة الملف غير صالحة: يجب أن يكون درساً واحداً']
+    
+    lesson = {
+        'title': import_text(tree, 'title'),
+        'description': import_text(tree, 'description'),
+        'level_id': import_int(tree, 'level_id', 1, (1, 2, 3), 'المستوى', errors, 'الدرس'),
+    }
+    if not lesson['title']:
+        errors.append('الدرس: عنوان الدرس مطلوب')
+    
+    items = tree.get('sections') or []
+    if not isinstance(items, list):
+        return lesson, [], errors + ['الدرس: sections يجب أن تكون قائمة']
+    
+    sections = []
+    for s, item in enumerate(items, 1):
+        where = f'الفقرة {s}'
+        if not isinstance(item, dict):
+            errors.append(f'{where}: صيغة غير صالحة')
+            continue
+        
+        fields = {'title': import_text(item, 'title'), 'content': import_text(item, 'content'),
+                  'order': s}
+        errors.extend(f'{where}: {error}' for error in validate_section_form(fields))
+        section = {'fields': fields, 'diagnostics': [], 'reminders': [], 'exercises': []}
+        
+        for d, question in enumerate(import_list(item, 'diagnostics', errors, where), 1):
+            question_where = f'{where}، السؤال {d}'
+            if not isinstance(question, dict):
+                errors.append(f'{question_where}: صيغة غير صالحة')
+                continue
+            options = question.get('options') or []
+            if not isinstance(options, list) or len(options) > 6:
+                errors.append(f'{question_where}: الخيارات يجب أن تكون قائمة من 6 عناصر على الأكثر')
+                continue
+            values, question_errors = diagnostic_fields(diagnostic_form(question))
+            errors.extend(f'{question_where}: {error}' for error in question_errors)
+            if values:
+                section['diagnostics'].append(values)
+        
+        for r, reminder in enumerate(import_list(item, 'reminders', errors, where), 1):
+            reminder_where = f'{where}، التذكير {r}'
+            if not isinstance(reminder, dict):
+                errors.append(f'{reminder_where}: صيغة غير صالحة')
+                continue
+            values = {
+                'reminder_type': import_int(reminder, 'reminder_type', None, (1, 2),
+                                            'نوع التذكير', errors, reminder_where),
+                'title': import_text(reminder, 'title'),
+                'content': import_text(reminder, 'content'),
+            }
+            if values['reminder_type'] is None and reminder.get('reminder_type') in (None, ''):
+                errors.append(f'{reminder_where}: نوع التذكير مطلوب')
+            if not values['content']:
+                errors.append(f'{reminder_where}: محتوى التذكير مطلوب')
+            exercises = [
+                exercise_fields(exercise, errors, f'{reminder_where}، التمرين {e}')
+                for e, exercise in enumerate(
+                    import_list(reminder, 'exercises', errors, reminder_where), 1)
+            ]
+            section['reminders'].append((values, [exercise for exercise in exercises if exercise]))
+        
+        for e, exercise in enumerate(import_list(item, 'exercises', errors, where), 1):
+            values = exercise_fields(exercise, errors, f'{where}، التمرين {e}')
+            if values:
+                section['exercises'].append(values)
+        
+        sections.append(section)
+    
+    return lesson, sections, errors
+
+def lesson_tree_from_csv(text):
+    """
+    تحويل ملف CSV إلى شجرة درس بنفس صيغة JSON
+    
+    كل سطر عنصر نوعه في العمود type: lesson أو section أو diagnostic أو reminder
+    أو exercise، والعناصر تتبع آخر فقرة قبلها. نص السؤال في العمود content،
+    والخيارات والإجابات الصحيحة المتعددة مفصولة بـ |، والتمرين الذي له
+    reminder_type يتبع آخر تذكير من هذا النوع في الفقرة.
+    """
+    tree = {'sections': []}
+    errors = []
+    reader = csv.DictReader(io.StringIO(text))
+    missing = [column for column in ('type', 'title', 'content') if column not in (reader.fieldnames or [])]
+    if missing:
+        return tree, [f'أعمدة CSV ناقصة: {", ".join(missing)}']
+    
+    section = None
+    for line, row in enumerate(reader, 2):
+        kind = (row.get('type') or '').strip()
+        item = {key: value for key, value in row.items() if key in IMPORT_CSV_COLUMNS and value not in (None, '')}
+        
+        if kind == 'lesson':
+            tree.update(title=item.get('title'), description=item.get('content'),
+                        level_id=item.get('level'))
+            continue
+        if kind == 'section':
+            section = {'title': item.get('title'), 'content': item.get('content'),
+                       'diagnostics': [], 'reminders': [], 'exercises': []}
+            tree['sections'].append(section)
+            continue
+        if section is None:
+            errors.append(f'السطر {line}: يجب أن يسبقه سطر فقرة (section)')
+            continue
+        
+        if kind == 'diagnostic':
+            item['question'] = item.pop('content', '')
+            item['options'] = [o.strip() for o in item.get('options', '').split('|') if o.strip()]
+            if item.get('question_type') == 'multiple_choice':
+                item['correct_answer'] = [a.strip() for a in item.get('correct_answer', '').split('|')]
+            section['diagnostics'].append(item)
+        elif kind == 'reminder':
+            item['exercises'] = []
+            section['reminders'].append(item)
+        elif kind == 'exercise' and item.get('reminder_type'):
+            reminder = next((r for r in reversed(section['reminders'])
+                             if r.get('reminder_type') == item['reminder_type']), None)
+            if reminder is None:
+                errors.append(f'السطر {line}: لا يوجد تذكير من النوع {item["reminder_type"]} قبله')
+                continue
+            reminder['exercises'].append(item)
+        elif kind == 'exercise':
+            section['exercises'].append(item)
+        else:
+            errors.append(f'السطر {line}: نوع غير معروف "{kind}"')
+    
+    return tree, errors
+
+def parse_lesson_import(filename, data):
+    """قراءة ملف الاستيراد (JSON أو CSV حسب امتداده) وإرجاع (الشجرة، الأخطاء)"""
+    try:
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return None, ['يجب أن يكون الملف بترميز UTF-8']
+    
+    if filename.lower().endswith('.csv'):
+        return lesson_tree_from_csv(text)
+    try:
+        return json.loads(text), []
+    except json.JSONDecodeError as e:
+        return None, [f'ملف JSON غير صالح: {e}']
+
+def insert_lesson_tree(teacher_id, lesson, sections):
+    """
+    إدراج درس كامل بإدراجات جماعية داخل المعاملة الحالية (دون حفظ)
+    
+    عدد الاستعلامات ثابت مهما كان عدد العناصر. SQLite لا يضمن ترتيب RETURNING
+    في الإدراج الجماعي، لذا تُقرأ معرفات الفقرات والتذكيرات بعده مرتبة بالمعرف:
+    الدرس جديد فلا يتبعه غيرها، و executemany يعطي الصفوف معرفات متزايدة بترتيبها.
+    """
+    next_order = db.session.scalar(
+        db.select(db.func.count(Lesson.id)).where(Lesson.teacher_id == teacher_id)) + 1
+    lesson_id = db.session.scalar(
+        db.insert(Lesson).values(teacher_id=teacher_id, order=next_order, **lesson).returning(Lesson.id))
+    
+    counts = {'sections': len(sections), 'diagnostics': 0, 'reminders': 0, 'exercises': 0}
+    if not sections:
+        return lesson_id, counts
+    
+    # الإدراج الجماعي لا يمر بأحداث ORM، لذا تُحسب نسختا المحتوى هنا
+    section_rows = []
+    for section in sections:
+        content_html, content_text = render_section_content(section['fields']['content'])
+        section_rows.append(dict(section['fields'], lesson_id=lesson_id,
+                                 content_html=content_html, content_text=content_text))
+    db.session.execute(db.insert(Section), section_rows)
+    section_ids = db.session.scalars(
+        db.select(Section.id).where(Section.lesson_id == lesson_id).order_by(Section.id)).all()
+    
+    diagnostics, reminders, reminder_exercises, exercises = [], [], [], []
+    for section_id, section in zip(section_ids, sections):
+        diagnostics.extend(dict(values, section_id=section_id) for values in section['diagnostics'])
+        exercises.extend(dict(values, section_id=section_id, reminder_id=None)
+                         for values in section['exercises'])
+        for values, children in section['reminders']:
+            reminders.append(dict(values, section_id=section_id))
+            reminder_exercises.append(children)
+    
+    if reminders:
+        db.session.execute(db.insert(Reminder), reminders)
+        reminder_ids = db.session.scalars(
+            db.select(Reminder.id).join(Section).where(Section.lesson_id == lesson_id)
+            .order_by(Reminder.id)).all()
+        # تمارين التذكيرات لا ترتبط بالفقرة مباشرة
+        for reminder_id, children in zip(reminder_ids, reminder_exercises):
+            exercises.extend(dict(values, section_id=None, reminder_id=reminder_id) for values in children)
+    
+    if diagnostics:
+        db.session.execute(db.insert(Diagnostic), diagnostics)
+    if exercises:
+        db.session.execute(db.insert(Exercise), exercises)
+    
+    counts.update(diagnostics=len(diagnostics), reminders=len(reminders), exercises=len(exercises))
+    return lesson_id, counts
+
+def import_lesson_tree(tree, teacher_id, errors=()):
+    """
+    التحقق من الشجرة ثم إدراجها، ويعيد (معرف الدرس، الأعداد، الأخطاء)
+    
+    errors أخطاء قراءة الملف، وتُعرض مع أخطاء التحقق بدلاً من التوقف عندها.
+    """
+    lesson, sections, tree_errors = validate_lesson_tree(tree)
+    errors = list(errors) + tree_errors
+    if errors:
+        return None, None, errors
+    lesson_id, counts = insert_lesson_tree(teacher_id, lesson, sections)
+    index_new_lesson(lesson_id)
+    return lesson_id, counts, []
+
+@route('/teacher/lesson/import', methods=['GET', 'POST'])
+@login_required
+@teacher_required
+def import_lesson():
+    """استيراد درس كامل من ملف JSON أو CSV، أو من جسم طلب JSON"""
+    if request.method == 'GET':
+        return render_template('teacher/import_lesson.html', csv_columns=IMPORT_CSV_COLUMNS)
+    
+    if request.is_json:
+        tree = request.get_json(silent=True)
+        errors = [] if tree is not None else ['ملف JSON غير صالح']
+    else:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('⚠️ يرجى اختيار ملف', 'warning')
+            return redirect(url_for('import_lesson'))
+        tree, errors = parse_lesson_import(upload.filename, upload.read())
+    
+    if tree is not None:
+        lesson_id, counts, errors = import_lesson_tree(tree, current_user.id, errors)
+    
+    if errors:
+        db.session.rollback()
+        if request.is_json:
+            return jsonify({'success': False, 'errors': errors}), 400
+        for error in errors[:IMPORT_MAX_ERRORS]:
+            flash(f'⚠️ {error}', 'warning')
+        if len(errors) > IMPORT_MAX_ERRORS:
+            flash(f'⚠️ و{len(errors) - IMPORT_MAX_ERRORS} أخطاء أخرى', 'warning')
+        return redirect(url_for('import_lesson'))
+    
+    db.session.commit()
+    
+    if request.is_json:
+        return jsonify({'success': True, 'lesson_id': lesson_id, 'counts': counts})
+    flash(f'✅ تم استيراد الدرس: {counts["sections"]} فقرة، {counts["diagnostics"]} سؤال، '
+          f'{counts["reminders"]} تذكير، {counts["exercises"]} تمرين', 'success')
+    return redirect(url_for('edit_lesson', lesson_id=lesson_id))
+
+@cli.command('import-lesson')
+@click.argument('path')
+@click.option('--teacher', 'email', required=True, help='بريد المعلم صاحب الدرس')
+def import_lesson_command(path, email):
+    """استيراد درس كامل من ملف JSON أو CSV"""
+    teacher = db.session.scalar(db.select(User).where(User.email == email, User.user_type == 'teacher'))
+    if teacher is None:
+        print(f'❌ لا يوجد معلم بالبريد {email}')
+        sys.exit(1)
+    
+    with open(path, 'rb') as f:
+        tree, errors = parse_lesson_import(path, f.read())
+    
+    started = time.perf_counter()
+    if tree is not None:
+        lesson_id, counts, errors = import_lesson_tree(tree, teacher.id, errors)
+    if errors:
+        db.session.rollback()
+        for error in errors:
+            print(f'❌ {error}')
+        sys.exit(1)
+    
+    db.session.commit()
+    print(f'✅ تم استيراد الدرس {lesson_id} في {time.perf_counter() - started:.2f} ثانية: '
+          + '، '.join(f'{name}: {value}' for name, value in counts.items()))
+
+# =============================================================================
+# نسخ الدروس
+# =============================================================================
+
+CLONE_TITLE_SUFFIX = ' (نسخة)'
+
+def id_map(model, parent, owner_column, old_owner, new_owner):
+    """
+    ربط المعرفات القديمة بالجديدة بعد INSERT ... SELECT مرتب بالمعرف
+    
+    الصفوف المنسوخة تُدرج بترتيب معرفاتها الأصلية فتأخذ معرفات متزايدة بنفس
+    الترتيب، لذا يكفي ترتيب الطرفين بالمعرف ومطابقتهما.
+    """
+    query = db.select(model.id, owner_column).select_from(model)
+    if parent is not None:
+        query = query.join(parent)
+    rows = db.session.execute(
+        query.where(owner_column.in_((old_owner, new_owner))).order_by(model.id)).all()
+    old_ids = [row.id for row in rows if row[1] == old_owner]
+    new_ids = [row.id for row in rows if row[1] == new_owner]
+    return dict(zip(old_ids, new_ids))
+
+def remapped(column, mapping):
+    """تعبير CASE يحول المعرف القديم إلى الجديد داخل SELECT"""
+    return db.case(mapping, value=column)
+
+def clone_lesson_tree(lesson, teacher_id):
+    """
+    نسخ درس وكل فقراته وأسئلته وتذكيراته وتمارينه داخل المعاملة الحالية (دون حفظ)
+    
+    كل جدول يُنسخ بجملة INSERT ... SELECT واحدة دون تحميل الصفوف، والمعرفات
+    الجديدة للفقرات والتذكيرات تُربط بالقديمة ثم تُستبدل بتعبير CASE في
+    section_id و reminder_id للجداول التابعة. النسخة مسودة غير منشورة.
+    """
+    next_order = db.session.scalar(
+        db.select(db.func.count(Lesson.id)).where(Lesson.teacher_id == teacher_id)) + 1
+    now = datetime.utcnow()
+    title = lesson.title[:200 - len(CLONE_TITLE_SUFFIX)] + CLONE_TITLE_SUFFIX
+    new_lesson_id = db.session.scalar(db.insert(Lesson).values(
+        title=title, description=lesson.description, level_id=lesson.level_id,
+        order=next_order, teacher_id=teacher_id, is_published=False,
+        created_at=now, updated_at=now
+    ).returning(Lesson.id))
+    
+    db.session.execute(db.insert(Section).from_select(
+        ['title', 'content', 'content_html', 'content_text', 'lesson_id', 'order',
+         'content_version', 'created_at'],
+        db.select(Section.title, Section.content, Section.content_html, Section.content_text,
+                  db.literal(new_lesson_id), Section.order, db.literal(1), db.literal(now))
+        .where(Section.lesson_id == lesson.id).order_by(Section.id)))
+    sections = id_map(Section, None, Section.lesson_id, lesson.id, new_lesson_id)
+    if not sections:
+        return new_lesson_id
+    
+    db.session.execute(db.insert(Reminder).from_select(
+        ['reminder_type', 'title', 'content', 'section_id'],
+        db.select(Reminder.reminder_type, Reminder.title, Reminder.content,
+                  remapped(Reminder.section_id, sections))
+        .where(Reminder.section_id.in_(sections)).order_by(Reminder.id)))
+    reminders = id_map(Reminder, Section, Section.lesson_id, lesson.id, new_lesson_id)
+    
+    db.session.execute(db.insert(Diagnostic).from_select(
+        ['question', 'question_type', 'options', 'correct_answer', 'explanation', 'points',
+         'section_id', 'difficulty'],
+        db.select(Diagnostic.question, Diagnostic.question_type, Diagnostic.options,
+                  Diagnostic.correct_answer, Diagnostic.explanation, Diagnostic.points,
+                  remapped(Diagnostic.section_id, sections), Diagnostic.difficulty)
+        .where(Diagnostic.section_id.in_(sections))))
+    
+    exercise_columns = ['title', 'content', 'level', 'section_id', 'reminder_id',
+                        'correct_answer', 'explanation', 'points']
+    
+    def copy_exercises(section_id, reminder_id, *criteria):
+        db.session.execute(db.insert(Exercise).from_select(exercise_columns, db.select(
+            Exercise.title, Exercise.content, Exercise.level, section_id, reminder_id,
+            Exercise.correct_answer, Exercise.explanation, Exercise.points
+        ).where(*criteria)))
+    
+    # تمارين الفقرة (وقد ترتبط بتذكير أيضاً)، ثم تمارين التذكيرات غير المرتبطة بالفقرة
+    copy_exercises(remapped(Exercise.section_id, sections),
+                   remapped(Exercise.reminder_id, reminders) if reminders else db.null(),
+                   Exercise.section_id.in_(sections))
+    if reminders:
+        copy_exercises(db.null(), remapped(Exercise.reminder_id, reminders),
+                       Exercise.section_id.is_(None), Exercise.reminder_id.in_(reminders))
+    
+    return new_lesson_id
+
+@route('/teacher/lesson/<int:lesson_id>/clone', methods=['POST'])
+@login_required
+@teacher_required
+def clone_lesson(lesson_id):
+    lesson = db.session.execute(
+        db.select(Lesson.id, Lesson.title, Lesson.description, Lesson.level_id, Lesson.teacher_id)
+        .where(Lesson.id == lesson_id)).first()
+    if lesson is None:
+        abort(404)
+    
+    if lesson.teacher_id != current_user.id:
+        flash('🚫 ليس لديك صلاحية لنسخ هذا الدرس', 'danger')
+        return redirect(url_for('teacher_lessons'))
+    
+    new_lesson_id = clone_lesson_tree(lesson, current_user.id)
+    index_new_lesson(new_lesson_id)
+    db.session.commit()
+    
+    flash('✅ تم نسخ الدرس بنجاح، النسخة غير منشورة', 'success')
+    return redirect(url_for('edit_lesson', lesson_id=new_lesson_id))
 
 # =============================================================================
 # مسارات الحذف
 # =============================================================================
 
-@app.route('/teacher/exercise/<int:exercise_id>/delete', methods=['POST'])
+def delete_section_tree(section_ids, lesson_id=None):
+    """
+    حذف الفقرات مع أسئلتها وتذكيراتها وتمارينها وتقدم الطلاب وإحصائياتها،
+    ومع lesson_id يُحذف الدرس نفسه أيضاً
+    
+    عبارة DELETE واحدة لكل جدول بدلاً من تحميل كل صف وحذفه عبر cascade،
+    وعبارة واحدة للفهرس، فيبقى عدد الاستعلامات ثابتاً مهما كان حجم الدرس.
+    لا يُثبت التغيير.
+    """
+    if not section_ids and lesson_id is None:
+        return
+    
+    def delete(model, *criteria, returning=None):
+        statement = db.delete(model).where(*criteria)
+        if returning is not None:
+            statement = statement.returning(returning)
+        return db.session.execute(statement.execution_options(synchronize_session=False))
+    
+    reminder_ids = db.select(Reminder.id).where(Reminder.section_id.in_(section_ids))
+    exercise_ids = delete(Exercise, db.or_(Exercise.section_id.in_(section_ids),
+                                           Exercise.reminder_id.in_(reminder_ids)),
+                          returning=Exercise.id).scalars().all()
+    diagnostic_ids = delete(Diagnostic, Diagnostic.section_id.in_(section_ids),
+                            returning=Diagnostic.id).scalars().all()
+    delete(Reminder, Reminder.section_id.in_(section_ids))
+    delete(StudentSectionProgress, StudentSectionProgress.section_id.in_(section_ids))
+    delete(SectionStatsRollup, SectionStatsRollup.section_id.in_(section_ids))
+    delete(Section, Section.id.in_(section_ids))
+    forget_deleted_sections(section_ids)
+    if lesson_id is not None:
+        delete(Lesson, Lesson.id == lesson_id)
+    unindex_search_items({'lesson': [lesson_id] if lesson_id is not None else [],
+                          'section': section_ids, 'diagnostic': diagnostic_ids,
+                          'exercise': exercise_ids})
+
+@route('/teacher/exercise/<int:exercise_id>/delete', methods=['POST'])
 @login_required
 @teacher_required
 def delete_exercise(exercise_id):
-    exercise = Exercise.query.get_or_404(exercise_id)
-    section = exercise.section
+    # تمارين التذكيرات مرتبطة بالفقرة عبر التذكير فقط
+    exercise = Exercise.query.options(
+        joinedload(Exercise.section).joinedload(Section.lesson),
+        joinedload(Exercise.reminder).joinedload(Reminder.section).joinedload(Section.lesson)
+    ).filter_by(id=exercise_id).first_or_404()
+    section = exercise.section or exercise.reminder.section
     
     if section.lesson.teacher_id != current_user.id:
         return jsonify({'success': False, 'message': 'ليس لديك صلاحية'})
     
     db.session.delete(exercise)
+    bump_section_version(section.id)
+    rebuild_section_rollup(section.id)
     db.session.commit()
     
     return jsonify({'success': True, 'message': 'تم حذف التمرين بنجاح'})
 
-@app.route('/teacher/diagnostic/<int:diagnostic_id>/delete', methods=['POST'])
+@route('/teacher/diagnostic/<int:diagnostic_id>/delete', methods=['POST'])
 @login_required
 @teacher_required
 def delete_diagnostic(diagnostic_id):
@@ -839,36 +3409,42 @@ def delete_diagnostic(diagnostic_id):
         return jsonify({'success': False, 'message': 'ليس لديك صلاحية'})
     
     db.session.delete(diagnostic)
+    bump_section_version(section.id)
+    rebuild_section_rollup(section.id)
     db.session.commit()
     
     return jsonify({'success': True, 'message': 'تم حذف الاختبار التشخيصي بنجاح'})
 
-@app.route('/teacher/reminder/<int:reminder_id>/delete', methods=['POST'])
+@route('/teacher/reminder/<int:reminder_id>/delete', methods=['POST'])
 @login_required
 @teacher_required
 def delete_reminder(reminder_id):
-    reminder = Reminder.query.get_or_404(reminder_id)
+    reminder = Reminder.query.options(joinedload(Reminder.section).joinedload(Section.lesson))\
+                .filter_by(id=reminder_id).first_or_404()
     section = reminder.section
     
     if section.lesson.teacher_id != current_user.id:
         return jsonify({'success': False, 'message': 'ليس لديك صلاحية'})
     
     db.session.delete(reminder)
+    bump_section_version(section.id)
+    rebuild_section_rollup(section.id)
     db.session.commit()
     
     return jsonify({'success': True, 'message': 'تم حذف التذكير بنجاح'})
 
-@app.route('/teacher/section/<int:section_id>/delete', methods=['POST'])
+@route('/teacher/section/<int:section_id>/delete', methods=['POST'])
 @login_required
 @teacher_required
 def delete_section(section_id):
-    section = Section.query.get_or_404(section_id)
+    section = Section.query.options(joinedload(Section.lesson))\
+                .filter_by(id=section_id).first_or_404()
     lesson = section.lesson
     
     if lesson.teacher_id != current_user.id:
         return jsonify({'success': False, 'message': 'ليس لديك صلاحية'})
     
-    db.session.delete(section)
+    delete_section_tree([section.id])
     db.session.commit()
     
     return jsonify({'success': True, 'message': 'تم حذف الفقرة بنجاح'})
@@ -877,104 +3453,155 @@ def delete_section(section_id):
 # واجهات API
 # =============================================================================
 
-@app.route('/api/diagnostic/<int:diagnostic_id>', methods=['POST'])
+@route('/api/diagnostic/<int:diagnostic_id>', methods=['POST'])
 @login_required
 def submit_diagnostic(diagnostic_id):
     """تقديم إجابة الاختبار التشخيصي مع حساب النسبة المئوية"""
     diagnostic = Diagnostic.query.get_or_404(diagnostic_id)
-    data = request.get_json()
+    data = request.get_json(silent=True)
     
-    if not data or 'answer' not in data:
+    if not isinstance(data, dict) or 'answer' not in data:
         return jsonify({'success': False, 'message': 'بيانات غير صالحة'}), 400
     
     user_answer = data['answer']
     is_correct = False
     score = 0
     
-    # التحقق من الإجابة حسب نوع السؤال
-    if diagnostic.question_type == 'single_choice':
-        is_correct = user_answer == diagnostic.correct_answer
-        score = diagnostic.points if is_correct else 0
-        
-    elif diagnostic.question_type == 'multiple_choice':
-        try:
-            correct_answers = json.loads(diagnostic.correct_answer)
-            user_answers = user_answer if isinstance(user_answer, list) else [user_answer]
-            
-            is_correct = set(user_answers) == set(correct_answers)
-            score = diagnostic.points if is_correct else 0
-            
-        except (json.JSONDecodeError, TypeError):
-            is_correct = False
-            score = 0
-            
-    elif diagnostic.question_type == 'fill_blank':
-        correct_answers = [a.strip() for a in diagnostic.correct_answer.split(',')]
-        is_correct = user_answer.strip() in correct_answers
-        score = diagnostic.points if is_correct else 0
+    # التحقق من الإجابة عبر المفتاح المترجم
+    is_correct = get_diagnostic_key(diagnostic).matches(user_answer)
+    score = diagnostic.points if is_correct else 0
     
-    # حفظ النتيجة
-    result = Result(
-        student_id=current_user.id,
-        diagnostic_id=diagnostic_id,
-        is_correct=is_correct,
-        answer=str(user_answer),
-        score=score
-    )
+    # حفظ النتيجة وتحديث تقدم الطالب في نفس المعاملة
+    row = {
+        'student_id': current_user.id,
+        'diagnostic_id': diagnostic_id,
+        'is_correct': is_correct,
+        'answer': str(user_answer),
+        'score': score,
+        'timestamp': datetime.utcnow()
+    }
+    progress_key = (current_user.id, diagnostic.section_id)
+    progress_delta = (score, diagnostic.points or 10, 1)
     
-    db.session.add(result)
-    db.session.commit()
+    responses = [(is_correct, diagnostic.difficulty)]
     
-    # حساب النسبة المئوية لجميع الأسئلة في الفقرة
-    section = diagnostic.section
-    all_results = Result.query.filter_by(
-        student_id=current_user.id,
-        diagnostic_id__in=[d.id for d in section.diagnostics]
-    ).all()
-    
-    total_possible = sum(d.points if d.points else 10 for d in section.diagnostics)
-    total_earned = sum(r.score for r in all_results)
-    percentage = (total_earned / total_possible * 100) if total_possible > 0 else 0
+    if result_writer.enqueue(row, progress_key, progress_delta):
+        progress = result_writer.progress_snapshot(*progress_key, responses=responses)
+    else:
+        db.session.add(Result(**row))
+        progress = progress_to_dict(record_section_progress(*progress_key, *progress_delta,
+                                                            responses=responses))
+        db.session.commit()
     
-    # تحديد المستوى بناءً على النسبة المئوية
-    level = 1 if percentage >= 80 else 2
+    section = diagnostic.section
     
     return jsonify({
         'success': True,
         'correct': is_correct,
         'score': score,
-        'percentage': round(percentage, 2),
-        'level': level,
+        'percentage': progress['percentage'],
+        'level': progress['level'],
         'question_type': diagnostic.question_type,
         'explanation': diagnostic.explanation or '',
         'correct_answers': diagnostic.get_correct_answers_list(),
         'total_questions': len(section.diagnostics),
-        'total_score': total_earned,
-        'max_score': total_possible
+        'total_score': progress['earned_points'],
+        'max_score': progress['possible_points']
+    })
+
+@route('/api/section/<int:section_id>/diagnostic/batch', methods=['POST'])
+@login_required
+def submit_diagnostic_batch(section_id):
+    """تقديم جميع إجابات التشخيص دفعة واحدة وحفظها في معاملة واحدة"""
+    section = Section.query.get_or_404(section_id)
+    data = request.get_json(silent=True)
+    
+    if not isinstance(data, dict) or not isinstance(data.get('answers'), dict):
+        return jsonify({'success': False, 'message': 'بيانات غير صالحة'}), 400
+    
+    answers = {str(key): value for key, value in data['answers'].items()}
+    diagnostics = section.diagnostics
+    
+    verdicts = {}
+    percentage = calculate_percentage_score(diagnostics, answers, verdicts)
+    
+    if not verdicts:
+        return jsonify({'success': False, 'message': 'لم يتم تقديم أي إجابة'}), 400
+    
+    rows = []
+    results = []
+    total_earned = 0
+    timestamp = datetime.utcnow()
+    
+    for diagnostic in diagnostics:
+        if diagnostic.id not in verdicts:
+            continue
+        
+        is_correct = verdicts[diagnostic.id]
+        score = (diagnostic.points or 10) if is_correct else 0
+        total_earned += score
+        
+        rows.append({
+            'student_id': current_user.id,
+            'diagnostic_id': diagnostic.id,
+            'is_correct': is_correct,
+            'answer': str(answers[str(diagnostic.id)]),
+            'score': score,
+            'timestamp': timestamp
+        })
+        results.append({
+            'diagnostic_id': diagnostic.id,
+            'correct': is_correct,
+            'score': score,
+            'explanation': diagnostic.explanation or '',
+            'correct_answers': diagnostic.get_correct_answers_list()
+        })
+    
+    # إدراج جميع النتائج وتحديث التقدم بمعاملة واحدة وتثبيت واحد
+    db.session.execute(db.insert(Result), rows)
+    progress = progress_to_dict(record_section_progress(
+        current_user.id, section_id, total_earned,
+        sum(d.points or 10 for d in diagnostics if d.id in verdicts),
+        attempts=len(rows),
+        responses=[(verdicts[d.id], d.difficulty) for d in diagnostics if d.id in verdicts]))
+    db.session.commit()
+    
+    return jsonify({
+        'success': True,
+        'results': results,
+        'percentage': progress['percentage'],
+        'level': progress['level'],
+        'attempt_percentage': percentage,
+        'correct_count': sum(1 for r in results if r['correct']),
+        'total_questions': len(diagnostics),
+        'total_score': progress['earned_points'],
+        'max_score': progress['possible_points']
     })
 
-@app.route('/api/exercise/<int:exercise_id>', methods=['POST'])
+@route('/api/exercise/<int:exercise_id>', methods=['POST'])
 @login_required
 def submit_exercise(exercise_id):
     exercise = Exercise.query.get_or_404(exercise_id)
-    data = request.get_json()
+    data = request.get_json(silent=True)
     
-    if not data or 'answer' not in data:
+    if not isinstance(data, dict) or 'answer' not in data:
         return jsonify({'success': False, 'message': 'بيانات غير صالحة'}), 400
     
-    is_correct = data['answer'] == exercise.correct_answer
+    is_correct = get_exercise_key(exercise).matches(data['answer'])
     score = exercise.points if is_correct else 0
     
-    result = Result(
-        student_id=current_user.id,
-        exercise_id=exercise_id,
-        is_correct=is_correct,
-        answer=data['answer'],
-        score=score
-    )
+    row = {
+        'student_id': current_user.id,
+        'exercise_id': exercise_id,
+        'is_correct': is_correct,
+        'answer': str(data['answer']),
+        'score': score,
+        'timestamp': datetime.utcnow()
+    }
     
-    db.session.add(result)
-    db.session.commit()
+    if not result_writer.enqueue(row):
+        db.session.add(Result(**row))
+        db.session.commit()
     
     return jsonify({
         'success': True,
@@ -983,228 +3610,391 @@ def submit_exercise(exercise_id):
         'explanation': exercise.explanation or ''
     })
 
-@app.route('/api/section/<int:section_id>/reminders/<int:level>')
+@route('/api/section/<int:section_id>/bundle')
 @login_required
-def get_reminders(section_id, level):
-    reminders = Reminder.query.filter_by(
-        section_id=section_id,
-        reminder_type=level
-    ).all()
+def get_section_bundle(section_id):
+    """كل ما تحتاجه صفحة الفقرة التكيفية في استجابة واحدة"""
+    row = db.session.execute(
+        db.select(Section.content_version, Section.created_at, Lesson.is_published)
+        .join(Lesson, Section.lesson_id == Lesson.id)
+        .where(Section.id == section_id)
+    ).first()
+    
+    if row is None:
+        return jsonify({'success': False, 'message': 'الفقرة غير موجودة'}), 404
     
-    reminders_data = [reminder_to_dict(reminder) for reminder in reminders]
+    if not row.is_published and not current_user.is_teacher():
+        return jsonify({'success': False, 'message': 'هذا الدرس غير متاح حالياً'}), 403
     
-    return jsonify(reminders_data)
+    progress = StudentSectionProgress.query.filter_by(
+        student_id=current_user.id,
+        section_id=section_id
+    ).first()
+    
+    version = section_version(row.content_version, row.created_at)
+    response = jsonify(build_section_bundle(section_id, version, progress))
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
 
-@app.route('/api/section/<int:section_id>/exercises/<int:level>')
+@route('/api/section/<int:section_id>/reminders/<int:level>')
+@login_required
+def get_reminders(section_id, level):
+    version = get_section_version(section_id)
+    if version is None:
+        return jsonify([])
+    
+    return versioned_json(
+        f'section-{section_id}-v{version}-reminders-{level}',
+        lambda: get_section_payload(section_id, version)['reminders'].get(level, [])
+    )
+
+@route('/api/section/<int:section_id>/exercises/<int:level>')
 @login_required
 def get_exercises(section_id, level):
-    exercises = Exercise.query.filter_by(
-        section_id=section_id,
-        level=level
-    ).all()
+    version = get_section_version(section_id)
+    if version is None:
+        return jsonify([])
+    
+    return versioned_json(
+        f'section-{section_id}-v{version}-exercises-{level}',
+        lambda: get_section_payload(section_id, version)['exercises'].get(level, [])
+    )
+
+@route('/api/search')
+@login_required
+def search():
+    """البحث النصي: ?q=...&kind=lesson,section,diagnostic,exercise&page=1&per_page=20"""
+    if not search_enabled():
+        abort(404)
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'message': 'نص البحث مطلوب'}), 400
     
-    exercises_data = [exercise_to_dict(exercise) for exercise in exercises]
+    kinds = [kind for kind in request.args.get('kind', '').split(',') if kind in SEARCH_KINDS]
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(max(1, request.args.get('per_page', SEARCH_PAGE_SIZE, type=int)),
+                   SEARCH_MAX_PAGE_SIZE)
     
-    return jsonify(exercises_data)
+    results, has_more = search_content(query, current_user, kinds, page, per_page)
+    return jsonify({
+        'success': True,
+        'query': query,
+        'page': page,
+        'per_page': per_page,
+        'has_more': has_more,
+        'results': results,
+    })
+
+@route('/metrics')
+def metrics():
+    """مقاييس العملية الحالية لخادم Prometheus"""
+    if not current_app.config.get('METRICS_ENABLED'):
+        abort(404)
+    return request_metrics.render() + password_hasher.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
 # =============================================================================
 # تهيئة قاعدة البيانات
 # =============================================================================
 
-# =============================================================================
-# تهيئة قاعدة البيانات - نسخة محدثة
-# =============================================================================
+def ensure_schema():
+    """
+    التحقق من إصدار المخطط باستعلام واحد عند بدء التشغيل
+    
+    القاعدة الجديدة تُنشأ بـ create_all وتُختم بآخر ترحيل، والقاعدة الأقدم من
+    SCHEMA_VERSION تُرحَّل بـ Alembic (migrations/)، ولا يُحذف أي جدول أبداً.
+    البيانات التجريبية والإحصاءات في أوامر منفصلة: flask seed و flask db-stats
+    """
+    try:
+        stamp = db.session.get(SchemaVersion, 1)
+    except OperationalError:
+        # قاعدة بيانات جديدة: جدول الإصدار غير موجود
+        db.session.rollback()
+        stamp = None
+    
+    if stamp is not None and stamp.version == SCHEMA_VERSION:
+        return stamp
+    
+    db.session.rollback()
+    if db.inspect(db.engine).has_table(User.__tablename__):
+        upgrade_migrations()
+        render_missing_section_content()
+        rebuild_search_index()
+        stamp = db.session.get(SchemaVersion, 1)
+    else:
+        db.create_all()
+        stamp_migrations()
+    
+    if stamp is None:
+        stamp = SchemaVersion(id=1, version=SCHEMA_VERSION)
+        db.session.add(stamp)
+    else:
+        stamp.version = SCHEMA_VERSION
+    db.session.commit()
+    
+    return stamp
 
-def init_database():
-    """تهيئة قاعدة البيانات وإنشاء بيانات تجريبية"""
+def seed_demo_data():
+    """إنشاء بيانات تجريبية (معلم ودرس وفقرة) إن لم تكن موجودة"""
     print("\n" + "=" * 60)
-    print("🗃️  جارٍ تهيئة قاعدة البيانات...")
+    print("🗃️  جارٍ إضافة البيانات التجريبية...")
     print("=" * 60)
     
-    with app.app_context():
-        # 1. إنشاء جميع الجداول (سيتم إنشاء الأعمدة الجديدة تلقائياً)
-        db.create_all()
-        print("✅ تم إنشاء/تحديث جداول قاعدة البيانات")
-        
-        # 2. التحقق من وجود عمود points في جدول diagnostics
-        try:
-            # محاولة استعلام للتأكد من وجود العمود
-            test_diag = Diagnostic.query.first()
-            print("✅ جدول التشخيصات يحتوي على عمود النقاط")
-        except Exception as e:
-            print(f"⚠️ تحذير: {e}")
-            print("🔄 جارٍ تحديث جدول التشخيصات...")
-            
-            # إذا فشل الاستعلام، نحتاج إلى تحديث الجدول يدوياً
-            try:
-                # هذا سيعيد إنشاء الجدول
-                db.drop_all()
-                db.create_all()
-                print("✅ تم إعادة إنشاء جميع الجداول")
-            except Exception as e2:
-                print(f"❌ خطأ في إعادة إنشاء الجداول: {e2}")
-        
-        # 3. التحقق من وجود المعلم الرئيسي
-        teacher = User.query.filter_by(email='teacher@example.com').first()
-        if not teacher:
-            teacher = User(
-                name='المعلم الإداري',
-                email='teacher@example.com',
-                user_type='teacher'
+    # 1. التحقق من وجود المعلم الرئيسي
+    teacher = User.query.filter_by(email='teacher@example.com').first()
+    if not teacher:
+        teacher = User(
+            name='المعلم الإداري',
+            email='teacher@example.com',
+            user_type='teacher'
+        )
+        teacher.set_password('teacher123')
+        db.session.add(teacher)
+        db.session.commit()
+        print("✅ تم إنشاء المعلم الرئيسي")
+    else:
+        print("📌 المعلم الرئيسي موجود مسبقاً")
+    
+    # 2. التحقق من وجود درس تجريبي
+    lesson = Lesson.query.filter_by(title='مقدمة في الرياضيات').first()
+    if not lesson:
+        lesson = Lesson(
+            title='مقدمة في الرياضيات',
+            description='تعلم أساسيات العمليات الحسابية',
+            level_id=1,
+            order=1,
+            teacher_id=teacher.id,
+            is_published=True
+        )
+        db.session.add(lesson)
+        db.session.commit()
+        print("✅ تم إنشاء درس تجريبي")
+    else:
+        print("📌 الدرس التجريبي موجود مسبقاً")
+    
+    # 3. التحقق من وجود فقرة تجريبية
+    section = Section.query.filter_by(title='الجمع والطرح').first()
+    if not section:
+        if lesson and lesson.id:
+            section = Section(
+                title='الجمع والطرح',
+                content='<h3>مرحباً بك في درس الرياضيات</h3><p>سنتعلم معاً أساسيات الجمع والطرح.</p>',
+                lesson_id=lesson.id,
+                order=1
             )
-            teacher.set_password('teacher123')
-            db.session.add(teacher)
+            db.session.add(section)
             db.session.commit()
-            print("✅ تم إنشاء المعلم الرئيسي")
-        else:
-            print("📌 المعلم الرئيسي موجود مسبقاً")
-        
-        # 4. التحقق من وجود درس تجريبي
-        lesson = Lesson.query.filter_by(title='مقدمة في الرياضيات').first()
-        if not lesson:
-            lesson = Lesson(
-                title='مقدمة في الرياضيات',
-                description='تعلم أساسيات العمليات الحسابية',
-                level_id=1,
-                order=1,
-                teacher_id=teacher.id,
-                is_published=True
+            print("✅ تم إنشاء فقرة تجريبية")
+    else:
+        print("📌 الفقرة التجريبية موجودة مسبقاً")
+    
+    # 4. التحقق من وجود اختبار تشخيصي تجريبي (بعد التأكد من وجود section)
+    if section and section.id:
+        diagnostic = Diagnostic.query.filter_by(question='ما هو ناتج 5 + 3؟').first()
+        if not diagnostic:
+            diagnostic = Diagnostic(
+                question='ما هو ناتج 5 + 3؟',
+                question_type='single_choice',
+                options=json.dumps(['6', '7', '8', '9']),
+                correct_answer='8',
+                explanation='5 + 3 = 8',
+                points=10,  # إضافة النقاط
+                section_id=section.id
             )
-            db.session.add(lesson)
-            db.session.commit()
-            print("✅ تم إنشاء درس تجريبي")
+            db.session.add(diagnostic)
+            print("✅ تم إنشاء اختبار تشخيصي تجريبي")
         else:
-            print("📌 الدرس التجريبي موجود مسبقاً")
-        
-        # 5. التحقق من وجود فقرة تجريبية
-        section = Section.query.filter_by(title='الجمع والطرح').first()
-        if not section:
-            if lesson and lesson.id:
-                section = Section(
-                    title='الجمع والطرح',
-                    content='<h3>مرحباً بك في درس الرياضيات</h3><p>سنتعلم معاً أساسيات الجمع والطرح.</p>',
-                    lesson_id=lesson.id,
-                    order=1
-                )
-                db.session.add(section)
-                db.session.commit()
-                print("✅ تم إنشاء فقرة تجريبية")
-        else:
-            print("📌 الفقرة التجريبية موجودة مسبقاً")
-        
-        # 6. التحقق من وجود اختبار تشخيصي تجريبي (بعد التأكد من وجود section)
-        if section and section.id:
-            diagnostic = Diagnostic.query.filter_by(question='ما هو ناتج 5 + 3؟').first()
-            if not diagnostic:
-                diagnostic = Diagnostic(
-                    question='ما هو ناتج 5 + 3؟',
-                    question_type='single_choice',
-                    options=json.dumps(['6', '7', '8', '9']),
-                    correct_answer='8',
-                    explanation='5 + 3 = 8',
-                    points=10,  # إضافة النقاط
-                    section_id=section.id
-                )
-                db.session.add(diagnostic)
-                print("✅ تم إنشاء اختبار تشخيصي تجريبي")
-            else:
-                print("📌 الاختبار التشخيصي التجريبي موجود مسبقاً")
-                
-                # تحديث الاختبار الحالي لإضافة النقاط إذا لم تكن موجودة
-                if not diagnostic.points:
-                    diagnostic.points = 10
-                    db.session.commit()
-                    print("✅ تم تحديث الاختبار التشخيصي بإضافة النقاط")
-        
-        # 7. التحقق من وجود تذكيرات تجريبية
-        if section and section.id:
-            reminder1 = Reminder.query.filter_by(
-                section_id=section.id, 
-                reminder_type=1
-            ).first()
+            print("📌 الاختبار التشخيصي التجريبي موجود مسبقاً")
             
-            if not reminder1:
-                reminder1 = Reminder(
-                    reminder_type=1,
-                    title='مراجعة سريعة للجمع',
-                    content='الجمع هو عملية تجميع كميتين أو أكثر للحصول على كمية أكبر.',
-                    section_id=section.id
+            # تحديث الاختبار الحالي لإضافة النقاط إذا لم تكن موجودة
+            if not diagnostic.points:
+                diagnostic.points = 10
+                db.session.commit()
+                print("✅ تم تحديث الاختبار التشخيصي بإضافة النقاط")
+    
+    # 5. التحقق من وجود تذكيرات تجريبية
+    if section and section.id:
+        reminder1 = Reminder.query.filter_by(
+            section_id=section.id, 
+            reminder_type=1
+        ).first()
+        
+        if not reminder1:
+            reminder1 = Reminder(
+                reminder_type=1,
+                title='مراجعة سريعة للجمع',
+                content='الجمع هو عملية تجميع كميتين أو أكثر للحصول على كمية أكبر.',
+                section_id=section.id
+            )
+            db.session.add(reminder1)
+            print("✅ تم إنشاء تذكير مستوى متقدم")
+        
+        reminder2 = Reminder.query.filter_by(
+            section_id=section.id, 
+            reminder_type=2
+        ).first()
+        
+        if not reminder2:
+            reminder2 = Reminder(
+                reminder_type=2,
+                title='شرح مفصل للجمع',
+                content='لتعلم الجمع: ابدأ بالعدد الأول، ثم أضف العدد الثاني عداً.',
+                section_id=section.id
+            )
+            db.session.add(reminder2)
+            print("✅ تم إنشاء تذكير مستوى أساسي")
+    
+    # 6. التحقق من وجود تمارين تجريبية
+    if section and section.id:
+        exercises_count = Exercise.query.filter_by(section_id=section.id).count()
+        if exercises_count == 0:
+            exercises = [
+                Exercise(
+                    title='تمرين أساسي',
+                    content='ما هو ناتج 4 + 2؟',
+                    level=0,
+                    section_id=section.id,
+                    correct_answer='6',
+                    explanation='4 + 2 = 6',
+                    points=10
+                ),
+                Exercise(
+                    title='تمرين متقدم',
+                    content='ما هو ناتج 12 + 15؟',
+                    level=1,
+                    section_id=section.id,
+                    correct_answer='27',
+                    explanation='12 + 15 = 27',
+                    points=10
+                ),
+                Exercise(
+                    title='تمرين علاجي',
+                    content='ما هو ناتج 1 + 1؟',
+                    level=2,
+                    section_id=section.id,
+                    correct_answer='2',
+                    explanation='1 + 1 = 2',
+                    points=10
                 )
-                db.session.add(reminder1)
-                print("✅ تم إنشاء تذكير مستوى متقدم")
+            ]
             
-            reminder2 = Reminder.query.filter_by(
-                section_id=section.id, 
-                reminder_type=2
-            ).first()
+            for exercise in exercises:
+                db.session.add(exercise)
             
-            if not reminder2:
-                reminder2 = Reminder(
-                    reminder_type=2,
-                    title='شرح مفصل للجمع',
-                    content='لتعلم الجمع: ابدأ بالعدد الأول، ثم أضف العدد الثاني عداً.',
-                    section_id=section.id
-                )
-                db.session.add(reminder2)
-                print("✅ تم إنشاء تذكير مستوى أساسي")
-        
-        # 8. التحقق من وجود تمارين تجريبية
-        if section and section.id:
-            exercises_count = Exercise.query.filter_by(section_id=section.id).count()
-            if exercises_count == 0:
-                exercises = [
-                    Exercise(
-                        title='تمرين أساسي',
-                        content='ما هو ناتج 4 + 2؟',
-                        level=0,
-                        section_id=section.id,
-                        correct_answer='6',
-                        explanation='4 + 2 = 6',
-                        points=10
-                    ),
-                    Exercise(
-                        title='تمرين متقدم',
-                        content='ما هو ناتج 12 + 15؟',
-                        level=1,
-                        section_id=section.id,
-                        correct_answer='27',
-                        explanation='12 + 15 = 27',
-                        points=10
-                    ),
-                    Exercise(
-                        title='تمرين علاجي',
-                        content='ما هو ناتج 1 + 1؟',
-                        level=2,
-                        section_id=section.id,
-                        correct_answer='2',
-                        explanation='1 + 1 = 2',
-                        points=10
-                    )
-                ]
-                
-                for exercise in exercises:
-                    db.session.add(exercise)
-                
-                print("✅ تم إنشاء تمارين تجريبية")
-        
-        try:
-            db.session.commit()
-            print("✅ تم حفظ جميع البيانات في قاعدة البيانات")
-        except Exception as e:
-            print(f"❌ خطأ في حفظ البيانات: {e}")
-            db.session.rollback()
-        
-        # 9. عرض ملخص قاعدة البيانات
-        print("\n📊 ملخص قاعدة البيانات:")
-        print(f"   👨‍🏫 المعلمون: {User.query.filter_by(user_type='teacher').count()}")
-        print(f"   👨‍🎓 الطلاب: {User.query.filter_by(user_type='student').count()}")
-        print(f"   📚 الدروس: {Lesson.query.count()}")
-        print(f"   📝 الفقرات: {Section.query.count()}")
-        print(f"   ❓ الاختبارات التشخيصية: {Diagnostic.query.count()}")
-        print(f"   💡 التذكيرات: {Reminder.query.count()}")
-        print(f"   📝 التمارين: {Exercise.query.count()}")
-        
-        print("\n🎉 قاعدة البيانات جاهزة للاستخدام!")
+            print("✅ تم إنشاء تمارين تجريبية")
+    
+    db.session.get(SchemaVersion, 1).seeded = True
+    
+    try:
+        db.session.commit()
+        print("✅ تم حفظ جميع البيانات في قاعدة البيانات")
+    except Exception as e:
+        print(f"❌ خطأ في حفظ البيانات: {e}")
+        db.session.rollback()
+
+def print_database_summary():
+    """عرض عدد السجلات في كل جدول"""
+    print("\n📊 ملخص قاعدة البيانات:")
+    print(f"   👨‍🏫 المعلمون: {User.query.filter_by(user_type='teacher').count()}")
+    print(f"   👨‍🎓 الطلاب: {User.query.filter_by(user_type='student').count()}")
+    print(f"   📚 الدروس: {Lesson.query.count()}")
+    print(f"   📝 الفقرات: {Section.query.count()}")
+    print(f"   ❓ الاختبارات التشخيصية: {Diagnostic.query.count()}")
+    print(f"   💡 التذكيرات: {Reminder.query.count()}")
+    print(f"   📝 التمارين: {Exercise.query.count()}")
+
+@cli.command('seed')
+def seed_command():
+    """إضافة البيانات التجريبية"""
+    seed_demo_data()
+    print("\n🎉 قاعدة البيانات جاهزة للاستخدام!")
+
+@cli.command('db-stats')
+def db_stats_command():
+    """عرض ملخص قاعدة البيانات"""
+    print_database_summary()
+
+def hot_queries():
+    """
+    أشكال الاستعلامات الأكثر تنفيذاً في المسارات، بقيم ممثلة
+    
+    تطابق ما تنفذه المسارات فعلاً (بنفس الترتيب)، و tests/test_query_plans.py
+    يفحص خطط الاستعلامات الملتقطة من المسارات نفسها.
+    """
+    return {
+        'dashboard (student)': lesson_rows_query(Lesson.is_published == True,
+                                                 order_by=[Lesson.order]),
+        'dashboard (teacher)': lesson_rows_query(Lesson.teacher_id == 1, order_by=[Lesson.order]),
+        'teacher_lessons': lesson_rows_query(Lesson.teacher_id == 1,
+                                             order_by=[Lesson.order.desc()]),
+        'view_lesson': db.select(Section).where(Section.lesson_id == 1).order_by(Section.order),
+        'view_section / submit_diagnostic': db.select(StudentSectionProgress).where(
+            StudentSectionProgress.student_id == 1, StudentSectionProgress.section_id == 1),
+        'section tree: diagnostics': db.select(Diagnostic).where(Diagnostic.section_id.in_([1, 2])),
+        'section tree: exercises': db.select(Exercise).where(Exercise.section_id.in_([1, 2])),
+        'section tree: reminders': db.select(Reminder).where(Reminder.section_id.in_([1, 2])),
+        'section tree: reminder exercises': db.select(Exercise).where(
+            Exercise.reminder_id.in_([1, 2])),
+    }
+
+# الجداول التي تمر بها المسارات الساخنة
+HOT_TABLES = {'lessons', 'sections', 'diagnostics', 'reminders', 'exercises', 'results',
+              'student_section_progress'}
+
+def plan_problems(details):
+    """
+    أسطر خطة EXPLAIN QUERY PLAN المرفوضة: مسح جدول ساخن (SCAN، ولو عبر فهرس
+    كامل) بدلاً من البحث فيه، أو فرز في جدول مؤقت (USE TEMP B-TREE)
+    """
+    return [
+        detail for detail in details
+        if 'TEMP B-TREE' in detail or
+        (detail.startswith('SCAN ') and detail.split()[1] in HOT_TABLES)
+    ]
+
+def explain_query_plans():
+    """تنفيذ EXPLAIN QUERY PLAN على الاستعلامات الساخنة: قائمة (الاسم، أسطر الخطة، المرفوض منها)"""
+    report = []
+    for name, query in hot_queries().items():
+        sql = str(query.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        rows = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')).all()
+        details = [row[-1] for row in rows]
+        report.append((name, details, plan_problems(details)))
+    return report
+
+@cli.command('check-query-plans')
+def check_query_plans_command():
+    """التأكد من أن الاستعلامات الساخنة تستخدم الفهارس (رمز خروج 1 عند المسح أو الفرز المؤقت)"""
+    failed = False
+    for name, details, problems in explain_query_plans():
+        print(f"{'❌' if problems else '✅'} {name}")
+        for detail in details:
+            print(f"   {'!' if detail in problems else ' '} {detail}")
+        failed = failed or bool(problems)
+    if failed:
+        sys.exit(1)
+
+@cli.command('check-query-budgets')
+def check_query_budgets_command():
+    """
+    التأكد من أن لكل نقطة نهاية حداً في ملف حدود الاستعلامات
+    (بقاء كل نقطة نهاية ضمن حدها يفحصه tests/test_query_budgets.py)
+    """
+    budgets = load_query_budgets(current_app.config['QUERY_BUDGET_FILE'])
+    endpoints = {rule.endpoint for rule in current_app.url_map.iter_rules()}
+    missing = sorted(endpoints - set(budgets))
+    unknown = sorted(set(budgets) - endpoints)
+    for endpoint in missing:
+        print(f'❌ لا يوجد حد لـ {endpoint}')
+    for endpoint in unknown:
+        print(f'⚠️  حد لنقطة نهاية غير موجودة: {endpoint}')
+    if missing:
+        sys.exit(1)
+    print(f'✅ {len(endpoints)} نقطة نهاية لها حدود')
+
+# التطبيق المبني من إعدادات APP_ENV: نقطة الدخول لخوادم WSGI ولأوامر flask
+app = create_app()
+
 # =============================================================================
 # نقطة الدخول الرئيسية
 # =============================================================================
@@ -1215,8 +4005,10 @@ if __name__ == '__main__':
         os.makedirs(app.config['UPLOAD_FOLDER'])
         print(f"📁 تم إنشاء مجلد التحميلات: {app.config['UPLOAD_FOLDER']}")
     
-    # تهيئة قاعدة البيانات
-    init_database()
+    # البيانات التجريبية لخادم التطوير فقط، مرة واحدة لكل قاعدة بيانات
+    with app.app_context():
+        if not db.session.get(SchemaVersion, 1).seeded:
+            seed_demo_data()
     
     # معلومات التشغيل
     print("\n" + "=" * 70)
@@ -1239,7 +4031,7 @@ if __name__ == '__main__':
     # تشغيل التطبيق
     try:
         app.run(
-            debug=True,
+            debug=app.config.get('DEBUG', False),
             host='0.0.0.0',
             port=5000,
             threaded=True
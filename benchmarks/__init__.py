@@ -0,0 +1,3 @@
+# =============================================================================
+# benchmarks - قياس أداء نظام التعلم التكيفي
+# =============================================================================
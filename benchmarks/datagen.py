@@ -0,0 +1,216 @@
+# =============================================================================
+# benchmarks/datagen.py - مولد بيانات تجريبية حتمي بأحجام قابلة للضبط
+# =============================================================================
+#
+# نفس البذرة ونفس الأحجام تعطي نفس قاعدة البيانات دائماً، لذا يمكن مقارنة
+# التشغيلات المختلفة. يجب أن تكون القاعدة فارغة:
+#
+#     python -m benchmarks.datagen --database sqlite:///bench.db \
+#         --students 10000 --results 1000000
+#
+
+import os
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+DEFAULTS = {
+    'teachers': 10,
+    'lessons': 10,       # لكل معلم
+    'sections': 5,       # لكل درس
+    'diagnostics': 5,    # لكل فقرة
+    'exercises': 6,      # لكل فقرة (موزعة على المستويات 0 و 1 و 2)
+    'students': 10000,
+    'results': 1000000,
+}
+
+PASSWORD = 'benchmark'
+CHUNK_SIZE = 10000
+BASE_TIME = datetime(2024, 1, 1)
+
+
+def load_app(database):
+    """
+    استيراد التطبيق بعد توجيهه إلى قاعدة بيانات القياس
+
+    الإعدادات تُقرأ من متغيرات البيئة عند الاستيراد، لذا يجب ضبطها قبله.
+    """
+    os.environ['DATABASE_URL'] = database
+    os.environ.setdefault('APP_ENV', 'production')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    import app as application
+    return application
+
+
+def insert_chunks(db, table, rows):
+    """إدراج الصفوف على دفعات بـ executemany"""
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(table.insert(), rows[start:start + CHUNK_SIZE])
+
+
+def generate(application, seed=42, **sizes):
+    """توليد البيانات في القاعدة الحالية وإرجاع عدد الصفوف لكل جدول"""
+    sizes = {**DEFAULTS, **sizes}
+    rng = random.Random(seed)
+    db = application.db
+    User, Lesson, Section = application.User, application.Lesson, application.Section
+    Diagnostic, Reminder, Exercise = application.Diagnostic, application.Reminder, application.Exercise
+    Result, Progress = application.Result, application.StudentSectionProgress
+
+    if db.session.scalar(db.select(db.func.count(User.id))):
+        raise SystemExit('❌ قاعدة البيانات ليست فارغة')
+
+    # تجزئة واحدة مشتركة: تكلفة التجزئة لكل مستخدم تتجاوز وقت التوليد كله
+    password_hash = generate_password_hash(PASSWORD)
+
+    users, lessons, sections, diagnostics, reminders, exercises = [], [], [], [], [], []
+    diagnostic_keys = []   # (id, section_id, points, correct, options)
+    exercise_keys = []     # (id, section_id, points, correct)
+
+    for t in range(1, sizes['teachers'] + 1):
+        users.append({'id': t, 'name': f'معلم {t}', 'email': f'teacher{t}@bench.local',
+                      'password_hash': password_hash, 'user_type': 'teacher', 'level': 1,
+                      'created_at': BASE_TIME})
+
+    for s in range(1, sizes['students'] + 1):
+        user_id = sizes['teachers'] + s
+        users.append({'id': user_id, 'name': f'طالب {s}', 'email': f'student{s}@bench.local',
+                      'password_hash': password_hash, 'user_type': 'student',
+                      'level': rng.choice((1, 2)), 'created_at': BASE_TIME})
+
+    for teacher_id in range(1, sizes['teachers'] + 1):
+        for order in range(1, sizes['lessons'] + 1):
+            lesson_id = len(lessons) + 1
+            lessons.append({'id': lesson_id, 'title': f'درس {lesson_id}',
+                            'description': f'وصف الدرس {lesson_id}', 'level_id': 1,
+                            'order': order, 'teacher_id': teacher_id,
+                            'is_published': rng.random() < 0.8,
+                            'created_at': BASE_TIME, 'updated_at': BASE_TIME})
+
+            for section_order in range(1, sizes['sections'] + 1):
+                section_id = len(sections) + 1
+                content = f'<p>محتوى الفقرة {section_id}</p>' * 20
+                content_html, content_text = application.render_section_content(content)
+                sections.append({'id': section_id, 'title': f'فقرة {section_id}',
+                                 'content': content, 'content_html': content_html,
+                                 'content_text': content_text,
+                                 'lesson_id': lesson_id, 'order': section_order,
+                                 'content_version': 1, 'created_at': BASE_TIME})
+
+                for _ in range(sizes['diagnostics']):
+                    diagnostic_id = len(diagnostics) + 1
+                    a, b = rng.randint(1, 50), rng.randint(1, 50)
+                    correct = str(a + b)
+                    options = [correct] + [str(a + b + d) for d in rng.sample((-2, -1, 1, 2), 3)]
+                    rng.shuffle(options)
+                    points = rng.choice((5, 10, 20))
+                    diagnostics.append({'id': diagnostic_id, 'question': f'ما هو ناتج {a} + {b}؟',
+                                        'question_type': 'single_choice',
+                                        'options': json.dumps(options), 'correct_answer': correct,
+                                        'explanation': f'{a} + {b} = {correct}', 'points': points,
+                                        'section_id': section_id})
+                    diagnostic_keys.append((diagnostic_id, section_id, points, correct, options))
+
+                for reminder_type in (1, 2):
+                    reminders.append({'id': len(reminders) + 1, 'reminder_type': reminder_type,
+                                      'title': f'تذكير {reminder_type}',
+                                      'content': f'تذكير للفقرة {section_id}',
+                                      'section_id': section_id})
+
+                for e in range(sizes['exercises']):
+                    exercise_id = len(exercises) + 1
+                    a, b = rng.randint(1, 99), rng.randint(1, 99)
+                    correct = str(a + b)
+                    exercises.append({'id': exercise_id, 'title': f'تمرين {exercise_id}',
+                                      'content': f'ما هو ناتج {a} + {b}؟', 'level': e % 3,
+                                      'section_id': section_id, 'correct_answer': correct,
+                                      'explanation': f'{a} + {b} = {correct}', 'points': 10})
+                    exercise_keys.append((exercise_id, section_id, 10, correct))
+
+    for table, rows in ((User, users), (Lesson, lessons), (Section, sections),
+                        (Diagnostic, diagnostics), (Reminder, reminders), (Exercise, exercises)):
+        insert_chunks(db, table.__table__, rows)
+
+    # النتائج: 30% تشخيص و70% تمارين، ويُجمع تقدم كل طالب في نفس المرور
+    progress = {}
+    student_ids = range(sizes['teachers'] + 1, sizes['teachers'] + sizes['students'] + 1)
+    batch = []
+    for result_id in range(1, sizes['results'] + 1):
+        student_id = rng.choice(student_ids)
+        is_correct = rng.random() < 0.7
+        row = {'id': result_id, 'student_id': student_id, 'exercise_id': None,
+               'diagnostic_id': None, 'is_correct': is_correct,
+               'timestamp': BASE_TIME + timedelta(seconds=result_id)}
+
+        if rng.random() < 0.3:
+            diagnostic_id, section_id, points, correct, options = rng.choice(diagnostic_keys)
+            score = points if is_correct else 0
+            row.update(diagnostic_id=diagnostic_id, score=score,
+                       answer=correct if is_correct else rng.choice([o for o in options if o != correct]))
+            totals = progress.setdefault((student_id, section_id), [0, 0, 0])
+            totals[0] += score
+            totals[1] += points
+            totals[2] += 1
+        else:
+            exercise_id, section_id, points, correct = rng.choice(exercise_keys)
+            row.update(exercise_id=exercise_id, score=points if is_correct else 0,
+                       answer=correct if is_correct else '0')
+
+        batch.append(row)
+        if len(batch) == CHUNK_SIZE:
+            db.session.execute(Result.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Result.__table__.insert(), batch)
+
+    progress_rows = [
+        {'student_id': student_id, 'section_id': section_id, 'earned_points': earned,
+         'possible_points': possible, 'attempts': attempts,
+         'level': application.level_for_percentage(earned / possible * 100),
+         'updated_at': BASE_TIME}
+        for (student_id, section_id), (earned, possible, attempts) in sorted(progress.items())
+    ]
+    insert_chunks(db, Progress.__table__, progress_rows)
+    # الإدراج المباشر لا يمر بأحداث ORM التي تحدّث فهرس البحث
+    search_items = application.rebuild_search_index()
+
+    db.session.get(application.SchemaVersion, 1).seeded = True
+    db.session.commit()
+
+    return {
+        'users': len(users),
+        'lessons': len(lessons),
+        'sections': len(sections),
+        'diagnostics': len(diagnostics),
+        'reminders': len(reminders),
+        'exercises': len(exercises),
+        'results': sizes['results'],
+        'student_section_progress': len(progress_rows),
+        'search_index': search_items,
+    }
+
+
+def add_size_arguments(parser):
+    parser.add_argument('--seed', type=int, default=42)
+    for name, default in DEFAULTS.items():
+        parser.add_argument(f'--{name}', type=int, default=default)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='توليد بيانات القياس')
+    parser.add_argument('--database', default='sqlite:///bench.db')
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    application = load_app(args.database)
+    sizes = {name: getattr(args, name) for name in DEFAULTS}
+    with application.app.app_context():
+        counts = generate(application, seed=args.seed, **sizes)
+    print(json.dumps(counts, indent=2))
+
+
+if __name__ == '__main__':
+    main()
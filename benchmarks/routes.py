@@ -0,0 +1,200 @@
+# =============================================================================
+# benchmarks/routes.py - قياس زمن الاستجابة وعدد الاستعلامات لكل مسار
+# =============================================================================
+#
+# يولد البيانات (إن كانت القاعدة فارغة) ثم يستدعي كل مسار عبر عميل الاختبار
+# في Flask، ويطبع تقريراً بصيغة JSON لمقارنة التشغيلات:
+#
+#     python -m benchmarks.routes --database sqlite:///bench.db \
+#         --students 10000 --results 1000000 --requests 500 --output run.json
+#
+
+import json
+import time
+import random
+import argparse
+
+from sqlalchemy import event
+
+from benchmarks.datagen import DEFAULTS, load_app, generate, add_size_arguments
+
+
+def percentile(sorted_values, p):
+    """النسبة المئوية بطريقة أقرب رتبة"""
+    if not sorted_values:
+        return None
+    index = max(0, int(round(p / 100 * len(sorted_values))) - 1)
+    return sorted_values[index]
+
+
+def build_scenarios(application, rng):
+    """
+    المسارات المقاسة: (الاسم، نوع المستخدم، دالة تعيد (الطريقة، الرابط، JSON))
+
+    المعرفات تُختار عشوائياً من البيانات الموجودة بمولد حتمي.
+    """
+    db = application.db
+    Lesson, Section = application.Lesson, application.Section
+    Diagnostic, Exercise = application.Diagnostic, application.Exercise
+
+    lesson_ids = db.session.scalars(
+        db.select(Lesson.id).where(Lesson.is_published == True)).all()
+    section_ids = db.session.scalars(
+        db.select(Section.id).join(Lesson).where(Lesson.is_published == True)).all()
+    diagnostics = db.session.execute(
+        db.select(Diagnostic.id, Diagnostic.section_id, Diagnostic.correct_answer)
+        .join(Section).join(Lesson).where(Lesson.is_published == True)).all()
+    exercise_ids = db.session.scalars(db.select(Exercise.id)).all()
+
+    by_section = {}
+    for diagnostic in diagnostics:
+        by_section.setdefault(diagnostic.section_id, []).append(diagnostic)
+    batch_sections = sorted(by_section)
+
+    def answer(diagnostic):
+        return diagnostic.correct_answer if rng.random() < 0.7 else '0'
+
+    def submit_diagnostic():
+        diagnostic = rng.choice(diagnostics)
+        return 'post', f'/api/diagnostic/{diagnostic.id}', {'answer': answer(diagnostic)}
+
+    def submit_diagnostic_batch():
+        section_id = rng.choice(batch_sections)
+        answers = {str(d.id): answer(d) for d in by_section[section_id]}
+        return 'post', f'/api/section/{section_id}/diagnostic/batch', {'answers': answers}
+
+    return [
+        ('dashboard', 'student', lambda: ('get', '/dashboard', None)),
+        ('view_lesson', 'student', lambda: ('get', f'/lesson/{rng.choice(lesson_ids)}', None)),
+        ('view_section', 'student', lambda: ('get', f'/section/{rng.choice(section_ids)}', None)),
+        ('submit_diagnostic', 'student', submit_diagnostic),
+        ('submit_diagnostic_batch', 'student', submit_diagnostic_batch),
+        ('submit_exercise', 'student', lambda: (
+            'post', f'/api/exercise/{rng.choice(exercise_ids)}', {'answer': str(rng.randint(2, 198))})),
+        ('get_section_bundle', 'student', lambda: (
+            'get', f'/api/section/{rng.choice(section_ids)}/bundle', None)),
+        ('get_reminders', 'student', lambda: (
+            'get', f'/api/section/{rng.choice(section_ids)}/reminders/{rng.choice((1, 2))}', None)),
+        ('get_exercises', 'student', lambda: (
+            'get', f'/api/section/{rng.choice(section_ids)}/exercises/{rng.choice((0, 1, 2))}', None)),
+        ('teacher_dashboard', 'teacher', lambda: ('get', '/dashboard', None)),
+        ('teacher_lessons', 'teacher', lambda: ('get', '/teacher/lessons', None)),
+        ('teacher_statistics', 'teacher', lambda: ('get', '/teacher/statistics', None)),
+    ]
+
+
+def run(application, requests, warmup, seed, only=None):
+    """تشغيل السيناريوهات وإرجاع نتائج كل مسار"""
+    app, db, User = application.app, application.db, application.User
+    rng = random.Random(seed)
+
+    with app.app_context():
+        user_ids = {
+            'student': db.session.scalars(db.select(User.id).where(User.user_type == 'student')).all(),
+            'teacher': db.session.scalars(db.select(User.id).where(User.user_type == 'teacher')).all(),
+        }
+        scenarios = build_scenarios(application, rng)
+        engine = db.engine
+        db.session.remove()
+
+    queries = [0]
+
+    def count_query(*args):
+        queries[0] += 1
+
+    event.listen(engine, 'before_cursor_execute', count_query)
+    report = []
+
+    try:
+        for name, user_type, make_request in scenarios:
+            if only and name not in only:
+                continue
+
+            client = app.test_client()
+            latencies, query_counts, statuses = [], [], {}
+
+            for i in range(warmup + requests):
+                # كل طلب بمستخدم مختلف حتى لا تقيس الذاكرة المؤقتة مستخدماً واحداً
+                with client.session_transaction() as session:
+                    session['_user_id'] = str(rng.choice(user_ids[user_type]))
+                    session['_fresh'] = True
+
+                method, url, payload = make_request()
+                queries[0] = 0
+                started = time.perf_counter()
+                response = getattr(client, method)(url, json=payload)
+                elapsed = time.perf_counter() - started
+
+                if i < warmup:
+                    continue
+                latencies.append(elapsed * 1000)
+                query_counts.append(queries[0])
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+            total_seconds = sum(latencies) / 1000
+            latencies.sort()
+            query_counts.sort()
+            report.append({
+                'route': name,
+                'requests': requests,
+                'throughput_rps': round(requests / total_seconds, 1) if total_seconds else None,
+                'latency_ms': {
+                    'p50': round(percentile(latencies, 50), 3),
+                    'p95': round(percentile(latencies, 95), 3),
+                    'p99': round(percentile(latencies, 99), 3),
+                    'max': round(latencies[-1], 3),
+                },
+                'queries': {
+                    'mean': round(sum(query_counts) / len(query_counts), 2),
+                    'p50': percentile(query_counts, 50),
+                    'max': query_counts[-1],
+                },
+                'status': {str(code): count for code, count in sorted(statuses.items())},
+            })
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_query)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='قياس أداء مسارات التطبيق')
+    parser.add_argument('--database', default='sqlite:///bench.db')
+    parser.add_argument('--requests', type=int, default=200, help='عدد الطلبات المقاسة لكل مسار')
+    parser.add_argument('--warmup', type=int, default=20, help='طلبات تمهيدية غير محسوبة')
+    parser.add_argument('--route', action='append', help='قياس مسار محدد فقط (يمكن تكراره)')
+    parser.add_argument('--output', help='حفظ التقرير في ملف بدلاً من طباعته')
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    application = load_app(args.database)
+    sizes = {name: getattr(args, name) for name in DEFAULTS}
+
+    with application.app.app_context():
+        db, User = application.db, application.User
+        if not db.session.scalar(db.select(db.func.count(User.id))):
+            started = time.perf_counter()
+            generate(application, seed=args.seed, **sizes)
+            print(f'🗃️  تم توليد البيانات في {time.perf_counter() - started:.1f} ثانية')
+        db.session.remove()
+
+    report = {
+        'database': args.database,
+        'seed': args.seed,
+        'sizes': sizes,
+        'requests': args.requests,
+        'warmup': args.warmup,
+        'routes': run(application, args.requests, args.warmup, args.seed, args.route),
+    }
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f'✅ تم حفظ التقرير في {args.output}')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
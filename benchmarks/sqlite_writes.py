@@ -0,0 +1,82 @@
+# =============================================================================
+# benchmarks/sqlite_writes.py - معدل كتابة النتائج قبل وبعد إعدادات SQLite
+# =============================================================================
+#
+# يحاكي الطلب submit_exercise: عدة خيوط، كل منها يدرج نتيجة واحدة ويثبتها.
+# يُشغَّل مرة بإعدادات SQLite الافتراضية ومرة بإعدادات Config.SQLITE_PRAGMAS:
+#
+#     python -m benchmarks.sqlite_writes --threads 8 --writes 500
+#
+
+import os
+import json
+import time
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.exc import OperationalError
+
+from config import Config
+from app import db, Result, sqlite_pragma_listener
+
+
+def run_profile(name, pragmas, threads, writes):
+    """تشغيل الكتابات المتزامنة على قاعدة بيانات جديدة وإرجاع النتائج"""
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}",
+                               pool_size=threads)
+        if pragmas:
+            event.listen(engine, 'connect', sqlite_pragma_listener(pragmas))
+        db.metadata.create_all(engine)
+
+        errors = []
+        statement = insert(Result)
+
+        def worker(student_id):
+            for i in range(writes):
+                row = {'student_id': student_id, 'exercise_id': 1, 'is_correct': i % 2 == 0,
+                       'answer': str(i), 'score': 10, 'timestamp': datetime.utcnow()}
+                try:
+                    with engine.begin() as connection:
+                        connection.execute(statement, row)
+                except OperationalError as e:
+                    errors.append(str(e.orig))
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        engine.dispose()
+
+    committed = threads * writes - len(errors)
+    return {
+        'profile': name,
+        'threads': threads,
+        'committed': committed,
+        'locked_errors': len(errors),
+        'seconds': round(elapsed, 3),
+        'writes_per_sec': round(committed / elapsed, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='معدل كتابة النتائج في SQLite')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=500, help='عدد الكتابات لكل خيط')
+    args = parser.parse_args()
+
+    results = [
+        run_profile('default', {}, args.threads, args.writes),
+        run_profile('tuned', Config.SQLITE_PRAGMAS, args.threads, args.writes),
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
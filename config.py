@@ -6,4 +6,98 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///adaptive_learning.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # مجمع الاتصالات لكل عملية عاملة
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': 30,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+    }
+
+    # إعدادات SQLite التي تُطبق على كل اتصال جديد بقاعدة البيانات
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',        # القراءة لا تنتظر الكتابة
+        'synchronous': 'NORMAL',      # fsync عند نقاط التفتيش فقط (آمن مع WAL)
+        'busy_timeout': 5000,         # انتظار القفل بدلاً من "database is locked"
+        'cache_size': -64000,         # 64MB لكل اتصال
+        'mmap_size': 268435456,       # 256MB
+        'temp_store': 'MEMORY',
+    }
+
+    # القوالب والملفات الثابتة
+    TEMPLATES_AUTO_RELOAD = False
+    SEND_FILE_MAX_AGE_DEFAULT = 43200  # 12 ساعة
+    UPLOAD_FOLDER = 'static/uploads'
+    MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5MB
+
+    # الكتابة المؤجلة للنتائج (معطلة افتراضياً)
+    RESULT_WRITE_BEHIND = os.environ.get('RESULT_WRITE_BEHIND') == '1'
+    RESULT_FLUSH_INTERVAL_MS = 200
+    RESULT_FLUSH_MAX_ROWS = 500
+    RESULT_QUEUE_SIZE = 10000
+
+    # عدد الفقرات المحفوظة في ذاكرة المحتوى المؤقتة لكل عملية
+    SECTION_CACHE_SIZE = 256
+    # مدة الاعتماد على رقم إصدار الفقرة المحفوظ محلياً (بالثواني) قبل إعادة قراءته
+    SECTION_VERSION_TTL = 5
+    # عدد مفاتيح الإجابات المترجمة المحفوظة لكل عملية
+    ANSWER_KEY_CACHE_SIZE = 4096
+
+    # تجزئة كلمات المرور: طريقة Werkzeug وتكلفتها، وتُعاد التجزئة عند الدخول إذا تغيرت
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 4))
+    PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT', 64))
+    PASSWORD_HASH_TIMEOUT = 10  # ثوانٍ
+
+    # احتمال الإجابة الصحيحة على سؤال متوسط الصعوبة المطلوب للمستوى المتقدم
+    MASTERY_THRESHOLD = 0.8
+
+    # هوية المستخدمين المحفوظة لكل عملية (بدلاً من استعلام في كل طلب)
+    PRINCIPAL_CACHE_SIZE = 4096
+    PRINCIPAL_CACHE_TTL = 60
+
+    # مقاييس الطلبات في /metrics بصيغة Prometheus (بلا مصادقة، فتُفعَّل صراحة
+    # بـ METRICS_ENABLED=1 حين يكون المسار محجوباً عن العموم)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED') == '1'
+    METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+    # تسجيل الطلبات الأبطأ من هذه القيمة (بالملي ثانية) مع استعلاماتها، 0 للتعطيل
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 0))
+
+    # حدود عدد الاستعلامات لكل نقطة نهاية: off | log | raise
+    QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'off')
+    QUERY_BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'query_budgets.json')
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    TEMPLATES_AUTO_RELOAD = True
+    SEND_FILE_MAX_AGE_DEFAULT = 0
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+    QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'log')
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+
+
+class ProductionConfig(Config):
+    # يجب أن يكون المفتاح واحداً في جميع العمليات العاملة، لذا لا يُقبل الافتراضي
+    SECRET_KEY = os.environ.get('SECRET_KEY')
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or 'sqlite://'
+    # قاعدة البيانات في الذاكرة تستخدم اتصالاً واحداً مشتركاً
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    WTF_CSRF_ENABLED = False
+    QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'raise')
+    # تكلفة منخفضة لتسريع الاختبارات
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+
+
+config_by_name = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+}
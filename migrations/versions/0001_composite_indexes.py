@@ -0,0 +1,114 @@
+"""composite indexes for the hot query shapes
+
+Brings databases created by the old init_database() (create_all without
+migrations) up to the current schema, then adds the composite indexes.
+Every step checks the live schema first, so it is safe on databases that
+were already created with db.create_all().
+
+Revision ID: 0001_composite_indexes
+Revises:
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_composite_indexes'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_results_student_diagnostic', 'results', ['student_id', 'diagnostic_id']),
+    ('ix_exercises_section_level', 'exercises', ['section_id', 'level']),
+    ('ix_reminders_section_type', 'reminders', ['section_id', 'reminder_type']),
+    ('ix_lessons_published_order', 'lessons', ['is_published', 'order']),
+    ('ix_lessons_teacher_order', 'lessons', ['teacher_id', 'order']),
+]
+
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+
+def _create_missing_tables(inspector):
+    tables = set(inspector.get_table_names())
+
+    if 'student_section_progress' not in tables:
+        op.create_table(
+            'student_section_progress',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('student_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('section_id', sa.Integer(), sa.ForeignKey('sections.id'), nullable=False),
+            sa.Column('earned_points', sa.Integer(), nullable=False),
+            sa.Column('possible_points', sa.Integer(), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('level', sa.Integer()),
+            sa.Column('updated_at', sa.DateTime()),
+            sa.UniqueConstraint('student_id', 'section_id', name='uq_progress_student_section'),
+        )
+        op.create_index('ix_student_section_progress_section_id',
+                        'student_section_progress', ['section_id'])
+
+    if 'section_stats_rollup' not in tables:
+        op.create_table(
+            'section_stats_rollup',
+            sa.Column('section_id', sa.Integer(), sa.ForeignKey('sections.id'), primary_key=True),
+            sa.Column('diagnostic_attempts', sa.Integer(), nullable=False),
+            sa.Column('diagnostic_correct', sa.Integer(), nullable=False),
+            sa.Column('exercise_attempts', sa.Integer(), nullable=False),
+            sa.Column('exercise_correct', sa.Integer(), nullable=False),
+            sa.Column('students', sa.Integer(), nullable=False),
+            sa.Column('advanced_students', sa.Integer(), nullable=False),
+            sa.Column('basic_students', sa.Integer(), nullable=False),
+            sa.Column('average_percentage', sa.Float()),
+            sa.Column('updated_at', sa.DateTime()),
+        )
+
+    if 'schema_version' not in tables:
+        op.create_table(
+            'schema_version',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('version', sa.Integer(), nullable=False),
+            sa.Column('seeded', sa.Boolean(), nullable=False),
+            sa.Column('updated_at', sa.DateTime()),
+        )
+
+    if 'stats_rollup_state' not in tables:
+        op.create_table(
+            'stats_rollup_state',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('last_result_id', sa.Integer(), nullable=False),
+            sa.Column('refreshed_at', sa.DateTime()),
+        )
+
+
+def upgrade():
+    inspector = _inspector()
+
+    # نتائج التشخيص لا ترتبط بتمرين
+    exercise_id = next(c for c in inspector.get_columns('results') if c['name'] == 'exercise_id')
+    if not exercise_id['nullable']:
+        with op.batch_alter_table('results') as batch_op:
+            batch_op.alter_column('exercise_id', existing_type=sa.Integer(), nullable=True)
+
+    if 'content_version' not in {c['name'] for c in inspector.get_columns('sections')}:
+        with op.batch_alter_table('sections') as batch_op:
+            batch_op.add_column(sa.Column('content_version', sa.Integer(),
+                                          nullable=False, server_default='1'))
+
+    _create_missing_tables(inspector)
+
+    inspector = _inspector()
+    for name, table, columns in INDEXES:
+        existing = {index['name'] for index in inspector.get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
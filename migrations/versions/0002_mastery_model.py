@@ -0,0 +1,40 @@
+"""mastery model parameters
+
+Adds the Rasch item difficulty to diagnostics and the per-section ability
+and mastery to student progress. Filled by `flask calibrate-mastery`.
+
+Revision ID: 0002_mastery_model
+Revises: 0001_composite_indexes
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_mastery_model'
+down_revision = '0001_composite_indexes'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = [
+    ('diagnostics', 'difficulty'),
+    ('student_section_progress', 'ability'),
+    ('student_section_progress', 'mastery'),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table, column in COLUMNS:
+        if column not in {c['name'] for c in inspector.get_columns(table)}:
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.add_column(sa.Column(column, sa.Float(), nullable=True))
+
+
+def downgrade():
+    for table, column in reversed(COLUMNS):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column(column)
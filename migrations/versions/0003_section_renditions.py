@@ -0,0 +1,38 @@
+"""sanitized html and plain-text renditions of section content
+
+Adds sections.content_html and sections.content_text. Existing rows are
+left NULL here and rendered by the application on its next start
+(render_missing_section_content), so the sanitizer lives in one place.
+
+Revision ID: 0003_section_renditions
+Revises: 0002_mastery_model
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_section_renditions'
+down_revision = '0002_mastery_model'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = ['content_html', 'content_text']
+
+
+def upgrade():
+    existing = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('sections')}
+    missing = [column for column in COLUMNS if column not in existing]
+    if missing:
+        with op.batch_alter_table('sections') as batch_op:
+            for column in missing:
+                batch_op.add_column(sa.Column(column, sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('sections') as batch_op:
+        for column in reversed(COLUMNS):
+            batch_op.drop_column(column)
@@ -0,0 +1,35 @@
+"""full-text search index
+
+Creates the FTS5 table behind /api/search. It is filled by the
+application on its next start (rebuild_search_index), because the
+indexed columns are normalized by a Python function registered on each
+SQLite connection.
+
+Revision ID: 0004_search_index
+Revises: 0003_section_renditions
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_search_index'
+down_revision = '0003_section_renditions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "kind UNINDEXED, item_id UNINDEXED, lesson_id UNINDEXED, section_id UNINDEXED, "
+        "title UNINDEXED, body UNINDEXED, title_norm, body_norm, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+
+
+def downgrade():
+    op.execute('DROP TABLE IF EXISTS search_index')
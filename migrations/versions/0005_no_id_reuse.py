@@ -0,0 +1,46 @@
+"""never reuse section content ids
+
+Rebuilds sections, diagnostics, reminders and exercises as SQLite
+AUTOINCREMENT tables, so the id of a deleted row is never handed to a new
+one. Section payload cache keys and ETags are built from these ids.
+Other databases already use sequences that do not reuse ids.
+
+Revision ID: 0005_no_id_reuse
+Revises: 0004_search_index
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_no_id_reuse'
+down_revision = '0004_search_index'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ['sections', 'diagnostics', 'reminders', 'exercises']
+
+
+def rebuild(autoincrement):
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    for name in TABLES:
+        sql = bind.execute(sa.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                           {'name': name}).scalar() or ''
+        if ('AUTOINCREMENT' in sql.upper()) == autoincrement:
+            continue
+        with op.batch_alter_table(name, recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': autoincrement}):
+            pass
+
+
+def upgrade():
+    rebuild(True)
+
+
+def downgrade():
+    rebuild(False)
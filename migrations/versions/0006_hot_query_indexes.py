@@ -0,0 +1,37 @@
+"""replace the unused results index with one for ordered lesson sections
+
+Drops ix_results_student_diagnostic: per-student section scores are read
+from student_section_progress, so no query filters results by student and
+diagnostic any more. Adds ix_sections_lesson_order so a lesson's sections
+are read in order without a temporary sort.
+
+Revision ID: 0006_hot_query_indexes
+Revises: 0005_no_id_reuse
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_hot_query_indexes'
+down_revision = '0005_no_id_reuse'
+branch_labels = None
+depends_on = None
+
+
+def _indexes(table):
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    if 'ix_results_student_diagnostic' in _indexes('results'):
+        op.drop_index('ix_results_student_diagnostic', table_name='results')
+    if 'ix_sections_lesson_order' not in _indexes('sections'):
+        op.create_index('ix_sections_lesson_order', 'sections', ['lesson_id', 'order'])
+
+
+def downgrade():
+    op.drop_index('ix_sections_lesson_order', table_name='sections')
+    op.create_index('ix_results_student_diagnostic', 'results', ['student_id', 'diagnostic_id'])
@@ -0,0 +1,37 @@
+"""drop the composite reminder and exercise indexes no query uses
+
+ix_reminders_section_type and ix_exercises_section_level were added for
+per-type and per-level filtering, but every route reads a section's reminders
+and exercises whole (the section tree cache) through the single-column
+section_id indexes. The composite indexes only cost writes.
+
+Revision ID: 0007_drop_unused_indexes
+Revises: 0006_hot_query_indexes
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_drop_unused_indexes'
+down_revision = '0006_hot_query_indexes'
+branch_labels = None
+depends_on = None
+
+
+def _indexes(table):
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    if 'ix_reminders_section_type' in _indexes('reminders'):
+        op.drop_index('ix_reminders_section_type', table_name='reminders')
+    if 'ix_exercises_section_level' in _indexes('exercises'):
+        op.drop_index('ix_exercises_section_level', table_name='exercises')
+
+
+def downgrade():
+    op.create_index('ix_exercises_section_level', 'exercises', ['section_id', 'level'])
+    op.create_index('ix_reminders_section_type', 'reminders', ['section_id', 'reminder_type'])
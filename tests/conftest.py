@@ -0,0 +1,111 @@
+# =============================================================================
+# tests/conftest.py - تطبيق مستقل لكل اختبار وأدوات عد الاستعلامات
+# =============================================================================
+#
+#     python -m pytest -q
+#
+# كل اختبار يبني تطبيقه بـ create_app('testing') بقاعدة بيانات في الذاكرة،
+# وتُعبأ عند الحاجة بمولد بيانات القياس (benchmarks/datagen.py) بأحجام صغيرة.
+#
+
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# التطبيق على مستوى الوحدة يُبنى عند الاستيراد، فيجب أن يكون بإعدادات الاختبار
+os.environ['APP_ENV'] = 'testing'
+
+import app as application
+from benchmarks.datagen import generate
+
+
+@pytest.fixture
+def make_app():
+    """
+    بناء تطبيق اختبار، ومع الأحجام يُعبأ ببيانات datagen وتُنشر كل دروسه
+
+    المعلمون لهم المعرفات الأولى ثم الطلاب، والدرس 1 وفقرته 1 للمعلم 1.
+    """
+    def build(**sizes):
+        app = application.create_app('testing')
+        if sizes:
+            with app.app_context():
+                generate(application, seed=1, **sizes)
+                db = application.db
+                db.session.execute(db.update(application.Lesson).values(is_published=True))
+                db.session.commit()
+        return app
+    return build
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def course(app):
+    """
+    محتوى صغير معروف في تطبيق الاختبار: معلم وطالب ودرس منشور بفقرة فيها
+    سؤال تشخيصي (الإجابة 8) وتمرين (الإجابة 6) وتذكير له تمرين (الإجابة OLD)
+    """
+    with app.app_context():
+        db = application.db
+        teacher = application.User(name='معلم', email='teacher@test.local',
+                                   password_hash='-', user_type='teacher')
+        student = application.User(name='طالب', email='student@test.local',
+                                   password_hash='-', user_type='student')
+        lesson = application.Lesson(title='الجمع', teacher=teacher, order=1, is_published=True)
+        section = application.Section(title='جمع الأعداد', content='<p>الجمع</p>',
+                                      lesson=lesson, order=1)
+        diagnostic = application.Diagnostic(
+            question='ما هو ناتج 5 + 3؟', question_type='single_choice',
+            options='["6", "7", "8"]', correct_answer='8', points=10, section=section)
+        exercise = application.Exercise(content='ما هو ناتج 4 + 2؟', level=0,
+                                        correct_answer='6', section=section)
+        reminder = application.Reminder(reminder_type=2, content='تذكير', section=section)
+        reminder_exercise = application.Exercise(content='تمرين التذكير', level=2,
+                                                 correct_answer='OLD', reminder=reminder)
+        db.session.add_all([teacher, student, lesson, section, diagnostic,
+                            exercise, reminder, reminder_exercise])
+        db.session.commit()
+
+        return SimpleNamespace(
+            teacher=teacher.id, student=student.id, lesson=lesson.id, section=section.id,
+            diagnostic=diagnostic.id, exercise=exercise.id, reminder=reminder.id,
+            reminder_exercise=reminder_exercise.id)
+
+
+@pytest.fixture
+def login():
+    """تسجيل دخول عميل الاختبار بمعرف المستخدم مباشرة (دون تجزئة كلمة المرور)"""
+    def log_in(client, user_id):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+    return log_in
+
+
+@pytest.fixture
+def capture_queries():
+    """capture(app, call) -> (نصوص الاستعلامات التي نفذها call() على محرك التطبيق، نتيجته)"""
+    def capture(app, call):
+        with app.app_context():
+            engine = application.db.engine
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            result = call()
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        return statements, result
+    return capture
@@ -0,0 +1,15 @@
+# =============================================================================
+# tests/test_content_sanitizer.py - تنقية محتوى الفقرات قبل العرض والبحث
+# =============================================================================
+
+import pytest
+
+import app as application
+
+
+@pytest.mark.parametrize('tag', ['script', 'style', 'iframe'])
+def test_self_closing_dropped_tag_keeps_the_content_after_it(tag):
+    section = application.Section(title='فقرة', content=f'<p>a</p><{tag}/><p>b</p>')
+
+    assert section.content_html == '<p>a</p><p>b</p>'
+    assert section.content_text == 'a b'
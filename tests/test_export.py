@@ -0,0 +1,22 @@
+# =============================================================================
+# tests/test_export.py - تصدير نتائج الدرس
+# =============================================================================
+
+import csv
+import io
+
+import pytest
+
+
+@pytest.mark.parametrize('answer', ['=HYPERLINK("http://x","y")', '+1+1', '-2+3', '@SUM(A1)'])
+def test_csv_cells_are_not_formulas(app, course, login, answer):
+    student = login(app.test_client(), course.student)
+    teacher = login(app.test_client(), course.teacher)
+    student.post(f'/api/exercise/{course.exercise}', json={'answer': answer})
+
+    csv_rows = list(csv.DictReader(io.StringIO(
+        teacher.get(f'/teacher/lesson/{course.lesson}/results.csv').get_data(as_text=True).lstrip('\ufeff'))))
+    assert [row['answer'] for row in csv_rows] == ["'" + answer]
+
+    ndjson = teacher.get(f'/teacher/lesson/{course.lesson}/results.ndjson').get_data(as_text=True)
+    assert answer.replace('"', '\\"') in ndjson
@@ -0,0 +1,52 @@
+# =============================================================================
+# tests/test_grading.py - التصحيح بمفاتيح الإجابات المترجمة
+# =============================================================================
+
+import app as application
+
+
+def add_exercise(app, section_id, correct_answer):
+    with app.app_context():
+        exercise = application.Exercise(content='تمرين جديد', level=0, section_id=section_id,
+                                        correct_answer=correct_answer)
+        application.db.session.add(exercise)
+        application.db.session.commit()
+        return exercise.id
+
+
+def test_exercises_deleted_with_their_reminder_do_not_grade_new_ones(app, course, login):
+    student = login(app.test_client(), course.student)
+    teacher = login(app.test_client(), course.teacher)
+    assert student.post(f'/api/exercise/{course.reminder_exercise}', json={'answer': 'OLD'}).json['correct']
+
+    assert teacher.post(f'/teacher/reminder/{course.reminder}/delete').json['success']
+    exercise_id = add_exercise(app, course.section, 'NEW')
+
+    assert student.post(f'/api/exercise/{exercise_id}', json={'answer': 'NEW'}).json['correct']
+    assert not student.post(f'/api/exercise/{exercise_id}', json={'answer': 'OLD'}).json['correct']
+
+
+def test_answer_changed_outside_this_process_is_graded_with_the_new_key(app, course, login):
+    """لا إبطال بالمعرف: تعديل الإجابة من عملية أخرى (أو مباشرة في القاعدة) يظهر فوراً"""
+    student = login(app.test_client(), course.student)
+    url = f'/api/diagnostic/{course.diagnostic}'
+    assert student.post(url, json={'answer': '8'}).json['correct']
+
+    with app.app_context():
+        db = application.db
+        db.session.execute(db.update(application.Diagnostic)
+                           .where(application.Diagnostic.id == course.diagnostic)
+                           .values(correct_answer='7'))
+        db.session.commit()
+
+    assert student.post(url, json={'answer': '7'}).json['correct']
+    assert not student.post(url, json={'answer': '8'}).json['correct']
+
+
+def test_answer_key_cache_is_bounded(app):
+    with app.app_context():
+        cache = application.LRUCache(3)
+        app.extensions['answer_keys'] = cache
+        for answer in range(10):
+            assert application.get_answer_key('single_choice', str(answer)).matches(str(answer))
+        assert len(cache._items) == 3
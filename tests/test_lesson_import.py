@@ -0,0 +1,32 @@
+# =============================================================================
+# tests/test_lesson_import.py - رفض ملفات الاستيراد التالفة برسائل لا بخطأ خادم
+# =============================================================================
+
+import pytest
+
+import app as application
+
+
+def section(**content):
+    return {'title': 'فقرة', 'content': 'نص', **content}
+
+
+@pytest.mark.parametrize('item, message', [
+    (section(exercises=['x']), 'الفقرة 1، التمرين 1: صيغة غير صالحة'),
+    (section(diagnostics=5), 'الفقرة 1: diagnostics يجب أن تكون قائمة'),
+    (section(reminders={'content': 'ت'}), 'الفقرة 1: reminders يجب أن تكون قائمة'),
+    (section(exercises='تمرين'), 'الفقرة 1: exercises يجب أن تكون قائمة'),
+    (section(reminders=[{'reminder_type': 1, 'content': 'ت', 'exercises': 3}]),
+     'الفقرة 1، التذكير 1: exercises يجب أن تكون قائمة'),
+    (section(reminders=[{'reminder_type': 1, 'content': 'ت', 'exercises': [None]}]),
+     'الفقرة 1، التذكير 1، التمرين 1: صيغة غير صالحة'),
+])
+def test_malformed_lesson_tree_is_rejected_with_messages(app, course, login, item, message):
+    teacher = login(app.test_client(), course.teacher)
+
+    response = teacher.post('/teacher/lesson/import', json={'title': 'درس', 'sections': [item]})
+
+    assert response.status_code == 400
+    assert message in response.json['errors']
+    with app.app_context():
+        assert application.Lesson.query.count() == 1
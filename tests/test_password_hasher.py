@@ -0,0 +1,28 @@
+# =============================================================================
+# tests/test_password_hasher.py - حدود مجمع تجزئة كلمات المرور
+# =============================================================================
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import app as application
+
+
+def test_timed_out_work_still_counts_until_it_finishes():
+    hasher = application.PasswordHasher(SimpleNamespace(config={
+        'PASSWORD_HASH_WORKERS': 1, 'PASSWORD_HASH_QUEUE_LIMIT': 0, 'PASSWORD_HASH_TIMEOUT': 0.05}))
+    release = threading.Event()
+
+    with pytest.raises(application.PasswordHasherBusy):
+        hasher._run('hash', release.wait)
+    # انتهت مهلة الانتظار لكن التجزئة ما زالت تشغل الخيط الوحيد
+    assert hasher.in_flight == 1
+    with pytest.raises(application.PasswordHasherBusy):
+        hasher._run('hash', release.wait)
+    assert hasher.counts['rejected'] == 1
+
+    release.set()
+    hasher.executor.shutdown(wait=True)
+    assert hasher.in_flight == 0
@@ -0,0 +1,26 @@
+# =============================================================================
+# tests/test_principal_cache.py - هوية المستخدم المحفوظة بعد تعديله
+# =============================================================================
+
+import app as application
+
+
+def test_principal_leaves_the_cache_only_when_the_change_commits(app, course, login):
+    student = login(app.test_client(), course.student)
+    assert student.get('/dashboard').status_code == 200
+    cache = app.extensions['principal_cache']
+    assert cache.get(course.student) is not None
+
+    with app.app_context():
+        db = application.db
+        db.session.get(application.User, course.student).name = 'اسم ملغى'
+        db.session.flush()
+        assert cache.get(course.student) is not None
+        db.session.rollback()
+        assert cache.get(course.student)[1].name == 'طالب'
+
+        db.session.get(application.User, course.student).name = 'اسم جديد'
+        db.session.commit()
+        assert cache.get(course.student) is None
+
+    assert 'اسم جديد' in student.get('/dashboard').get_data(as_text=True)
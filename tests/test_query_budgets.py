@@ -0,0 +1,116 @@
+# =============================================================================
+# tests/test_query_budgets.py - كل نقطة نهاية ضمن حدها في query_budgets.json
+# =============================================================================
+#
+# الطلبات تُنفذ بإعدادات الاختبار (QUERY_BUDGET_MODE=raise) وذاكرات العملية
+# المؤقتة فارغة قبل كل طلب، فيُقاس أسوأ حال: تحميل المستخدم وشجرة الفقرة.
+#
+
+import app as application
+from benchmarks.datagen import PASSWORD
+from tests.test_query_counts import SMALL
+
+LESSON_TREE = {
+    'title': 'درس مستورد',
+    'sections': [{
+        'title': f'فقرة {n}',
+        'content': '<p>نص</p>',
+        'diagnostics': [{'question': 'س', 'question_type': 'single_choice',
+                         'options': ['1', '2'], 'correct_answer': '2'}],
+        'reminders': [{'reminder_type': 1, 'content': 'تذكير',
+                       'exercises': [{'content': 'ت', 'correct_answer': '1'}]}],
+        'exercises': [{'content': 'تمرين', 'level': 0, 'correct_answer': '5'}],
+    } for n in range(3)],
+}
+
+
+def last_id(app, model, *criteria):
+    with app.app_context():
+        db = application.db
+        return db.session.scalar(db.select(db.func.max(model.id)).where(*criteria))
+
+
+def test_every_endpoint_stays_within_its_budget(make_app, login, capture_queries):
+    app = make_app(**SMALL)
+    app.config['METRICS_ENABLED'] = True
+    budgets = application.load_query_budgets(app.config['QUERY_BUDGET_FILE'])
+    student_id = SMALL['teachers'] + 1
+    anonymous = app.test_client()
+    teacher = login(app.test_client(), 1)
+    student = login(app.test_client(), student_id)
+    measured = {}
+
+    def hit(client, method, url, **kwargs):
+        for name in ('principal_cache', 'section_cache'):
+            app.extensions[name] = application.LRUCache(app.extensions[name].maxsize)
+        app.extensions['section_versions'] = {}
+
+        def call():
+            response = getattr(client, method)(url, **kwargs)
+            response.get_data()  # التصدير يستعلم أثناء البث
+            return response
+
+        statements, response = capture_queries(app, call)
+        assert response.status_code < 400, (url, response.status_code)
+        endpoint, _ = app.url_map.bind('localhost').match(url, method=method.upper())
+        measured[endpoint] = max(measured.get(endpoint, 0), len(statements))
+        return response
+
+    hit(anonymous, 'get', '/')
+    hit(anonymous, 'get', '/static/css/style.css')
+    hit(anonymous, 'get', '/metrics')
+    hit(anonymous, 'post', '/register', data={'name': 'طالب', 'email': 'new@test.local',
+                                              'password': 'p', 'user_type': 'student'})
+    hit(app.test_client(), 'post', '/login', data={'email': 'teacher1@bench.local',
+                                                   'password': PASSWORD})
+
+    for client in (teacher, student):
+        hit(client, 'get', '/dashboard')
+        hit(client, 'get', '/lesson/1')
+        hit(client, 'get', '/section/1')
+    hit(student, 'get', '/api/section/1/bundle')
+    hit(student, 'get', '/api/section/1/exercises/1')
+    hit(student, 'get', '/api/section/1/reminders/1')
+    hit(student, 'post', '/api/diagnostic/1', json={'answer': '1'})
+    hit(student, 'post', '/api/section/1/diagnostic/batch', json={'answers': {'1': '1', '2': '2'}})
+    hit(student, 'post', '/api/exercise/1', json={'answer': '1'})
+    hit(student, 'get', '/api/search', query_string={'q': 'فقرة'})
+
+    hit(teacher, 'get', '/teacher/lessons')
+    hit(teacher, 'get', '/teacher/statistics')
+    hit(teacher, 'get', '/teacher/lesson/1/results.csv')
+    hit(teacher, 'get', '/teacher/lesson/1/results.ndjson')
+    hit(teacher, 'post', '/teacher/lesson/new', data={'title': 'درس', 'description': 'وصف',
+                                                       'level_id': '1'})
+    hit(teacher, 'post', '/teacher/lesson/1/edit', data={'title': 'درس', 'description': 'وصف',
+                                                          'level_id': '1', 'order': '1',
+                                                          'is_published': 'on'})
+    hit(teacher, 'post', '/teacher/lesson/1/section/new', data={'title': 'فقرة', 'content': 'نص',
+                                                                 'order': '9'})
+    hit(teacher, 'post', '/teacher/section/1/edit', data={'title': 'فقرة', 'content': 'نص',
+                                                           'order': '1'})
+    hit(teacher, 'post', '/teacher/section/1/edit', data={
+        'form_type': 'new_diagnostic', 'question': 'س؟', 'question_type': 'single_choice',
+        'option1': 'أ', 'option2': 'ب', 'correct_answer_single': 'أ', 'points': '5'})
+    hit(teacher, 'get', '/teacher/section/1/diagnostic/new')
+    hit(teacher, 'post', '/teacher/section/1/reminder/new', data={'reminder_type': '1',
+                                                                   'title': 'ت', 'content': 'ت'})
+    hit(teacher, 'post', '/teacher/section/1/exercise/new', data={'title': 'ت', 'content': 'ت',
+                                                                   'level': '1',
+                                                                   'correct_answer': '1'})
+    imported = hit(teacher, 'post', '/teacher/lesson/import', json=LESSON_TREE).json['lesson_id']
+    hit(teacher, 'post', f'/teacher/lesson/{imported}/clone')
+
+    # الحذف بأثقل أشكاله: تذكير له تمارين وفقرة فيها كل أنواع المحتوى
+    Section, Reminder = application.Section, application.Reminder
+    section_id = last_id(app, Section, Section.lesson_id == imported)
+    hit(teacher, 'post', f'/teacher/exercise/{last_id(app, application.Exercise)}/delete')
+    hit(teacher, 'post', f'/teacher/diagnostic/{last_id(app, application.Diagnostic)}/delete')
+    hit(teacher, 'post', f'/teacher/reminder/{last_id(app, Reminder, Reminder.section_id == section_id)}/delete')
+    hit(teacher, 'post', f'/teacher/section/{section_id}/delete')
+    hit(teacher, 'post', f'/teacher/lesson/{imported}/delete')
+    hit(teacher, 'get', '/logout')
+
+    assert set(measured) == set(budgets) - {'_comment'}
+    assert {endpoint: count for endpoint, count in measured.items()
+            if count > budgets[endpoint]} == {}
@@ -0,0 +1,41 @@
+# =============================================================================
+# tests/test_query_counts.py - عدد الاستعلامات لا يتبع حجم المحتوى
+# =============================================================================
+
+import pytest
+
+SMALL = {'teachers': 1, 'lessons': 2, 'sections': 2, 'diagnostics': 2, 'exercises': 3,
+         'students': 2, 'results': 20}
+LARGE = {'teachers': 1, 'lessons': 8, 'sections': 6, 'diagnostics': 10, 'exercises': 12,
+         'students': 20, 'results': 2000}
+
+
+@pytest.mark.parametrize('user_type, url, expected', [
+    ('student', '/dashboard', 2),
+    ('teacher', '/dashboard', 2),
+    ('student', '/lesson/1', 3),
+    ('student', '/section/1', 8),
+    ('student', '/api/section/1/bundle', 8),
+])
+def test_query_count_is_constant(make_app, login, capture_queries, user_type, url, expected):
+    """نفس عدد الاستعلامات (بذاكرة مؤقتة باردة) مهما زاد عدد الدروس والأسئلة والتمارين والنتائج"""
+    counts = []
+    for sizes in (SMALL, LARGE):
+        app = make_app(**sizes)
+        client = login(app.test_client(), 1 if user_type == 'teacher' else sizes['teachers'] + 1)
+        statements, response = capture_queries(app, lambda: client.get(url))
+        assert response.status_code == 200
+        counts.append(len(statements))
+
+    assert counts == [expected, expected]
+
+
+def test_section_cache_serves_repeat_views(make_app, login, capture_queries):
+    """الزيارة الثانية للفقرة لا تعيد تحميل شجرة محتواها"""
+    app = make_app(**SMALL)
+    client = login(app.test_client(), SMALL['teachers'] + 1)
+    cold, _ = capture_queries(app, lambda: client.get('/section/1'))
+    warm, response = capture_queries(app, lambda: client.get('/section/1'))
+
+    assert response.status_code == 200
+    assert len(warm) < len(cold)
@@ -0,0 +1,71 @@
+# =============================================================================
+# tests/test_query_plans.py - خطط الاستعلامات الفعلية للمسارات الساخنة
+# =============================================================================
+
+import pytest
+from sqlalchemy import event
+
+import app as application
+from tests.test_query_counts import SMALL
+
+
+def explain_route(app, client, method, url, **kwargs):
+    """تنفيذ الطلب ثم EXPLAIN QUERY PLAN لكل SELECT نفذه بنفس معاملاته"""
+    with app.app_context():
+        engine = application.db.engine
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = getattr(client, method)(url, **kwargs)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+
+    connection = engine.raw_connection()
+    try:
+        return [(statement, [row[-1] for row in
+                             connection.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)])
+                for statement, parameters in statements]
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize('user_type, method, url, body', [
+    ('student', 'get', '/dashboard', None),
+    ('teacher', 'get', '/dashboard', None),
+    ('teacher', 'get', '/teacher/lessons', None),
+    ('student', 'get', '/lesson/1', None),
+    ('student', 'get', '/section/1', None),
+    ('student', 'get', '/api/section/1/bundle', None),
+    ('student', 'get', '/api/section/2/exercises/1', None),
+    ('student', 'get', '/api/section/3/reminders/1', None),
+    ('student', 'post', '/api/diagnostic/1', {'answer': '1'}),
+    ('student', 'post', '/api/section/1/diagnostic/batch', {'answers': {'1': '1'}}),
+    ('student', 'post', '/api/exercise/1', {'answer': '1'}),
+])
+def test_hot_routes_search_indexes_without_temporary_sorts(make_app, login, user_type, method,
+                                                           url, body):
+    app = make_app(**SMALL)
+    client = login(app.test_client(), 1 if user_type == 'teacher' else SMALL['teachers'] + 1)
+    plans = explain_route(app, client, method, url, **({'json': body} if body else {}))
+
+    assert plans
+    assert [(statement, application.plan_problems(details)) for statement, details in plans
+            if application.plan_problems(details)] == []
+
+
+def test_check_query_plans_fails_on_a_temporary_sort(app, monkeypatch):
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=['check-query-plans']).exit_code == 0
+
+    monkeypatch.setattr(application, 'hot_queries', lambda: {
+        'unindexed order': application.db.select(application.Lesson)
+        .order_by(application.Lesson.title)})
+    result = runner.invoke(args=['check-query-plans'])
+    assert result.exit_code == 1
+    assert 'TEMP B-TREE' in result.output
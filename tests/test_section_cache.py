@@ -0,0 +1,52 @@
+# =============================================================================
+# tests/test_section_cache.py - ذاكرة محتوى الفقرات بعد الحذف وإعادة الإنشاء
+# =============================================================================
+
+import app as application
+
+
+def recreate_section(app, course, teacher):
+    """حذف فقرة الدرس وإنشاء فقرة جديدة مكانها، وإرجاع معرفها"""
+    assert teacher.post(f'/teacher/section/{course.section}/delete').json['success']
+    teacher.post(f'/teacher/lesson/{course.lesson}/section/new',
+                 data={'title': 'فقرة جديدة', 'content': '<p>محتوى جديد</p>', 'order': '1'})
+    with app.app_context():
+        return application.Section.query.filter_by(lesson_id=course.lesson).one().id
+
+
+def test_deleted_section_leaves_the_cache_and_its_id_is_not_reused(app, course, login):
+    student = login(app.test_client(), course.student)
+    teacher = login(app.test_client(), course.teacher)
+    assert student.get(f'/section/{course.section}').status_code == 200
+    assert any(key[0] == course.section for key in app.extensions['section_cache']._items)
+
+    section_id = recreate_section(app, course, teacher)
+
+    assert section_id != course.section
+    assert not any(key[0] == course.section for key in app.extensions['section_cache']._items)
+    assert course.section not in app.extensions['section_versions']
+    assert 'محتوى جديد' in student.get(f'/section/{section_id}').get_data(as_text=True)
+
+
+def test_etag_of_a_deleted_section_does_not_match_a_new_one_with_its_id(app, course, login):
+    """حتى لو أُعيد المعرف نفسه (قاعدة أخرى أو إدراج صريح) لا يحصل العميل القديم على 304"""
+    student = login(app.test_client(), course.student)
+    teacher = login(app.test_client(), course.teacher)
+    url = f'/api/section/{course.section}/exercises/0'
+    etag = student.get(url).headers['ETag']
+    assert student.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    assert teacher.post(f'/teacher/section/{course.section}/delete').json['success']
+    with app.app_context():
+        db = application.db
+        section = application.Section(id=course.section, title='فقرة جديدة', content='<p>جديد</p>',
+                                       lesson_id=course.lesson, order=1)
+        db.session.add(section)
+        db.session.add(application.Exercise(content='تمرين جديد', level=0, correct_answer='1',
+                                            section=section))
+        db.session.commit()
+
+    response = student.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert [exercise['content'] for exercise in response.json] == ['تمرين جديد']
@@ -0,0 +1,74 @@
+# =============================================================================
+# tests/test_statistics.py - الإحصائيات المجمعة
+# =============================================================================
+
+import app as application
+from tests.test_query_counts import SMALL
+
+
+def rollup_levels(app):
+    with app.app_context():
+        db = application.db
+        rollup = application.SectionStatsRollup
+        progress = application.StudentSectionProgress
+        stored = db.session.execute(
+            db.select(rollup.section_id, rollup.advanced_students, rollup.basic_students)
+            .order_by(rollup.section_id)).all()
+        counted = db.session.execute(
+            db.select(progress.section_id,
+                      db.func.sum(db.case((progress.level == 1, 1), else_=0)),
+                      db.func.sum(db.case((progress.level == 2, 1), else_=0)))
+            .where(progress.section_id.in_([row.section_id for row in stored]))
+            .group_by(progress.section_id).order_by(progress.section_id)).all()
+        counted = {row[0]: tuple(row) for row in counted}
+        return [tuple(row) for row in stored], [counted.get(row[0], (row[0], 0, 0)) for row in stored]
+
+
+def test_statistics_page_does_not_write(make_app, login, capture_queries):
+    app = make_app(**SMALL)
+    client = login(app.test_client(), 1)
+    statements, response = capture_queries(app, lambda: client.get('/teacher/statistics'))
+
+    assert response.status_code == 200
+    assert not [s for s in statements if s.split(None, 1)[0].upper() in ('INSERT', 'UPDATE', 'DELETE')]
+
+
+def test_calibration_refreshes_rollup_levels(make_app):
+    app = make_app(**SMALL)
+    with app.app_context():
+        application.refresh_statistics()
+        db = application.db
+        # كل الطلاب في المستوى المتقدم قبل المعايرة، والجدول المجمع يعرف ذلك
+        db.session.execute(db.update(application.StudentSectionProgress).values(level=1))
+        application.refresh_level_distribution(
+            db.session.scalars(db.select(application.SectionStatsRollup.section_id)).all())
+        db.session.commit()
+        application.calibrate_mastery()
+
+    stored, counted = rollup_levels(app)
+    assert any(basic for _, _, basic in stored)
+    assert stored == counted
+
+
+def test_deleted_content_leaves_the_statistics(make_app, login):
+    app = make_app(**SMALL)
+    with app.app_context():
+        db = application.db
+        application.refresh_statistics()
+        diagnostic = db.session.scalar(
+            db.select(application.Diagnostic)
+            .join(application.Result, application.Result.diagnostic_id == application.Diagnostic.id)
+            .join(application.Section).join(application.Lesson)
+            .where(application.Lesson.teacher_id == 1).limit(1))
+        section_id, diagnostic_id = diagnostic.section_id, diagnostic.id
+        removed = db.session.scalar(db.select(db.func.count(application.Result.id))
+                                    .where(application.Result.diagnostic_id == diagnostic_id))
+        before = db.session.get(application.SectionStatsRollup, section_id).diagnostic_attempts
+
+    client = login(app.test_client(), 1)
+    assert client.post(f'/teacher/diagnostic/{diagnostic_id}/delete').json['success']
+    assert client.get('/teacher/statistics').status_code == 200
+
+    with app.app_context():
+        shown = {row.id: row for row in application.section_statistics(1)}
+        assert removed and shown[section_id].diagnostic_attempts == before - removed
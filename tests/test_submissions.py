@@ -0,0 +1,121 @@
+# =============================================================================
+# tests/test_submissions.py - التحقق من طلبات تقديم الإجابات
+# =============================================================================
+
+import json
+from datetime import datetime
+
+import pytest
+
+import app as application
+
+
+@pytest.mark.parametrize('body', [[], ['8'], 'x', 8, None])
+@pytest.mark.parametrize('url', [
+    '/api/diagnostic/{course.diagnostic}',
+    '/api/section/{course.section}/diagnostic/batch',
+    '/api/exercise/{course.exercise}',
+])
+def test_body_that_is_not_an_object_is_rejected(app, course, login, url, body):
+    student = login(app.test_client(), course.student)
+    response = student.post(url.format(course=course), json=body)
+
+    assert response.status_code == 400
+    assert response.json['success'] is False
+
+
+def test_progress_accumulates_over_all_attempts(app, course, login):
+    """الصف الأول يُنشأ بالعبارة نفسها التي تحدّثه، والنسبة على كل المحاولات"""
+    student = login(app.test_client(), course.student)
+    url = f'/api/diagnostic/{course.diagnostic}'
+    assert student.post(url, json={'answer': '8'}).json['percentage'] == 100
+    assert student.post(url, json={'answer': '6'}).json['percentage'] == 50
+
+    with app.app_context():
+        progress = application.StudentSectionProgress.query.one()
+        assert (progress.earned_points, progress.possible_points, progress.attempts) == (10, 20, 2)
+        assert progress.level is not None
+
+
+def test_rejected_row_is_quarantined_without_losing_its_batch(app, course, tmp_path):
+    app.config.update(RESULT_WRITE_BEHIND=True, RESULT_SPOOL_PATH=str(tmp_path / 'spool.jsonl'),
+                      RESULT_QUARANTINE_PATH=str(tmp_path / 'quarantine.jsonl'))
+    writer = application.ResultWriter(app)
+
+    def item(answer):
+        row = {'student_id': course.student, 'diagnostic_id': course.diagnostic, 'is_correct': True,
+               'answer': answer, 'score': 10, 'timestamp': datetime.utcnow()}
+        return row, (course.student, course.section), (10, 10, 1)
+
+    # صف لم يمر بـ enqueue فبقيت إجابته قائمة لا يقبلها الإدراج
+    writer._flush([item('8'), item(['8']), item('8')])
+
+    with app.app_context():
+        assert application.Result.query.count() == 2
+        assert application.StudentSectionProgress.query.one().attempts == 2
+    assert not (tmp_path / 'spool.jsonl').exists()
+    quarantined = [json.loads(line) for line in open(tmp_path / 'quarantine.jsonl', encoding='utf-8')]
+    assert [entry['row']['answer'] for entry in quarantined] == [['8']]
+
+
+def test_new_answers_move_a_calibrated_level(app, course, login):
+    """الإتقان المعاير لا يتجمد: كل إجابة تحدّث القدرة، والمستوى يتبع الإتقان"""
+    student = login(app.test_client(), course.student)
+    url = f'/api/diagnostic/{course.diagnostic}'
+    student.post(url, json={'answer': '6'})
+    with app.app_context():
+        db = application.db
+        db.session.execute(db.update(application.StudentSectionProgress)
+                           .values(ability=-3.0, mastery=0.05, level=2))
+        db.session.commit()
+
+    masteries = []
+    for _ in range(9):
+        response = student.post(url, json={'answer': '8'})
+        with app.app_context():
+            masteries.append(application.StudentSectionProgress.query.one().mastery)
+
+    assert masteries == sorted(masteries) and masteries[0] > 0.05
+    # 90% تكفي للمستوى المتقدم بالنسبة، لكن الإتقان لم يبلغ الحد بعد
+    assert response.json['percentage'] == 90
+    assert masteries[-1] < app.config['MASTERY_THRESHOLD']
+    assert response.json['level'] == 2
+
+
+def test_one_answer_takes_its_level_from_mastery(app, course, login):
+    student = login(app.test_client(), course.student)
+    with app.app_context():
+        db = application.db
+        db.session.add(application.StudentSectionProgress(
+            student_id=course.student, section_id=course.section, earned_points=20,
+            possible_points=30, attempts=3, ability=2.5, mastery=0.92, level=1))
+        db.session.execute(db.update(application.Diagnostic).values(difficulty=0.5))
+        db.session.commit()
+
+    response = student.post(f'/api/diagnostic/{course.diagnostic}', json={'answer': '6'})
+
+    assert response.json['percentage'] == 50  # المستوى الأساسي بالنسبة وحدها
+    assert response.json['level'] == 1
+    with app.app_context():
+        progress = application.StudentSectionProgress.query.one()
+        assert app.config['MASTERY_THRESHOLD'] <= progress.mastery < 0.92
+        assert progress.level == 1
+
+
+def test_written_behind_answers_update_mastery(app, course, tmp_path):
+    app.config.update(RESULT_WRITE_BEHIND=True, RESULT_SPOOL_PATH=str(tmp_path / 'spool.jsonl'))
+    writer = application.ResultWriter(app)
+    with app.app_context():
+        db = application.db
+        db.session.add(application.StudentSectionProgress(
+            student_id=course.student, section_id=course.section, earned_points=0,
+            possible_points=10, attempts=1, ability=0.0, mastery=0.5, level=2))
+        db.session.commit()
+
+    row = {'student_id': course.student, 'diagnostic_id': course.diagnostic, 'is_correct': True,
+           'answer': '8', 'score': 10, 'timestamp': datetime.utcnow()}
+    writer._flush([(row, (course.student, course.section), (10, 10, 1))])
+
+    with app.app_context():
+        progress = application.StudentSectionProgress.query.one()
+        assert progress.attempts == 2 and progress.mastery > 0.5